@@ -2,6 +2,8 @@ import chromadb
 from chromadb.config import Settings
 import numpy as np
 
+from chroma_metadata_index import MetadataIndex
+
 
 def get_client():
     """Создание клиента ChromaDB"""
@@ -126,10 +128,12 @@ def semantic_search_example():
     )
 
     # Поиск с фильтрацией
+    query_embedding = np.random.rand(512).tolist()
+    where = {"category": "electronics", "price": {"$lt": 1000}}
     results = collection.query(
-        query_embeddings=[np.random.rand(512).tolist()],
+        query_embeddings=[query_embedding],
         n_results=2,
-        where={"category": "electronics", "price": {"$lt": 1000}}
+        where=where
     )
 
     print("\nСемантический поиск с фильтрацией:")
@@ -138,6 +142,27 @@ def semantic_search_example():
         print(f"Metadata: {results['metadatas'][0][i]}")
         print(f"Distance: {results['distances'][0][i]}")
 
+    # Тот же поиск через локальный индекс метаданных: сначала считаем
+    # кандидатов по фильтру, затем ищем векторы только среди них
+    index = MetadataIndex(
+        ids=[f"prod_{i}" for i in range(len(products))],
+        embeddings=embeddings,
+        metadatas=[p["metadata"] for p in products],
+        documents=[p["text"] for p in products]
+    )
+    results = index.query(
+        query_embeddings=[query_embedding],
+        n_results=2,
+        where=where
+    )
+
+    print(f"\nПоиск через индекс метаданных "
+          f"(селективность {index.selectivity(where):.2f}):")
+    for i, doc in enumerate(results['documents'][0]):
+        print(f"Match {i + 1}: {doc}")
+        print(f"Metadata: {results['metadatas'][0][i]}")
+        print(f"Distance: {results['distances'][0][i]}")
+
 
 if __name__ == "__main__":
     text_search_example()
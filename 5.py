@@ -1,18 +1,132 @@
-from neo4j import GraphDatabase
+import argparse
+import time
+from contextlib import contextmanager
+
+import numpy as np
+from neo4j import GraphDatabase, READ_ACCESS, WRITE_ACCESS
+
+from graph_analytics import CSRGraph, benchmark as csr_benchmark
+from neo4j_bulk_loader import (
+    GraphBulkLoader, synthetic_friendships, synthetic_likes, synthetic_people,
+    synthetic_posts
+)
+from neo4j_recommendations import RecommendationService
+from neo4j_schema import profile_queries, setup_schema
+
+
+FRIENDS_OF_FRIENDS_QUERY = """
+MATCH (person:Person {name: 'Alice'})-[:FRIENDS]->(friend)-[:FRIENDS]->(friend_of_friend)
+WHERE friend_of_friend <> person
+RETURN DISTINCT friend_of_friend.name as name
+"""
+
+POPULAR_POSTS_QUERY = """
+MATCH (post:Post)<-[like:LIKED]-()
+WITH post, COUNT(like) as likes
+RETURN post.content as content, likes
+ORDER BY likes DESC
+"""
+
+PATH_BETWEEN_USERS_QUERY = """
+MATCH path = shortestPath((start:Person {name: 'Alice'})-[:FRIENDS*]-(end:Person {name: 'Charlie'}))
+RETURN [node IN nodes(path) | node.name] as path
+"""
+
+FRIEND_RECOMMENDATIONS_QUERY = """
+MATCH (person:Person {name: 'Alice'})-[:FRIENDS]->(friend)-[:FRIENDS]->(potential_friend)
+WHERE NOT (person)-[:FRIENDS]->(potential_friend)
+AND person <> potential_friend
+WITH potential_friend, COUNT(friend) as common_friends
+RETURN potential_friend.name as recommended_friend, common_friends
+ORDER BY common_friends DESC
+"""
+
+POST_RECOMMENDATIONS_QUERY = """
+MATCH (person:Person {name: 'Alice'})-[:FRIENDS]->(friend)-[:LIKED]->(post:Post)
+WHERE NOT (person)-[:LIKED]->(post)
+AND NOT (person)-[:POSTED]->(post)
+WITH post, COUNT(friend) as friend_likes
+RETURN post.content as content, friend_likes
+ORDER BY friend_likes DESC
+"""
+
+# Запросы проекта, которые профилируются для контроля регрессий
+PROJECT_QUERIES = {
+    'friends_of_friends': FRIENDS_OF_FRIENDS_QUERY,
+    'popular_posts': POPULAR_POSTS_QUERY,
+    'path_between_users': PATH_BETWEEN_USERS_QUERY,
+    'friend_recommendations': FRIEND_RECOMMENDATIONS_QUERY,
+    'post_recommendations': POST_RECOMMENDATIONS_QUERY,
+}
 
 
 class Neo4jConnection:
-    def __init__(self, uri, user, password):
-        self.driver = GraphDatabase.driver(uri, auth=(user, password))
+    def __init__(self, uri, user, password, database=None,
+                 max_connection_pool_size=100,
+                 connection_acquisition_timeout=60.0):
+        self.driver = GraphDatabase.driver(
+            uri,
+            auth=(user, password),
+            max_connection_pool_size=max_connection_pool_size,
+            connection_acquisition_timeout=connection_acquisition_timeout
+        )
+        self.database = database
 
     def close(self):
         self.driver.close()
 
     def run_query(self, query, parameters=None):
-        with self.driver.session() as session:
+        with self.driver.session(database=self.database) as session:
             result = session.run(query, parameters or {})
             return [record for record in result]
 
+    @contextmanager
+    def session(self, read_only=False):
+        """Сессия для серии запросов (одно соединение из пула)"""
+        access_mode = READ_ACCESS if read_only else WRITE_ACCESS
+        with self.driver.session(database=self.database,
+                                 default_access_mode=access_mode) as session:
+            yield session
+
+    @staticmethod
+    def _run_in_transaction(tx, query, parameters):
+        return list(tx.run(query, parameters))
+
+    def execute_read(self, query, parameters=None, session=None):
+        """Чтение в управляемой транзакции (маршрутизируется на читателей)"""
+        if session is not None:
+            return session.execute_read(self._run_in_transaction, query,
+                                        parameters or {})
+        with self.session(read_only=True) as session:
+            return session.execute_read(self._run_in_transaction, query,
+                                        parameters or {})
+
+    def execute_write(self, query, parameters=None, session=None):
+        """Запись в управляемой транзакции (с повтором при сбоях)"""
+        if session is not None:
+            return session.execute_write(self._run_in_transaction, query,
+                                         parameters or {})
+        with self.session() as session:
+            return session.execute_write(self._run_in_transaction, query,
+                                         parameters or {})
+
+    def run_queries(self, queries, read_only=True):
+        """Выполнение последовательности запросов в одной сессии
+
+        queries: список пар (query, parameters)
+        """
+        execute = self.execute_read if read_only else self.execute_write
+        with self.session(read_only=read_only) as session:
+            return [execute(query, parameters, session=session)
+                    for query, parameters in queries]
+
+    def stream_query(self, query, parameters=None, read_only=True):
+        """Ленивая выдача записей без построения списка"""
+        with self.session(read_only=read_only) as session:
+            result = session.run(query, parameters or {})
+            for record in result:
+                yield record
+
 
 def create_social_network_example(connection):
     """Пример создания социальной сети"""
@@ -49,37 +163,19 @@ def relationship_queries(connection):
     """Примеры запросов по отношениям"""
 
     # 1. Найти друзей друзей
-    friends_of_friends = """
-    MATCH (person:Person {name: 'Alice'})-[:FRIENDS]->(friend)-[:FRIENDS]->(friend_of_friend)
-    WHERE friend_of_friend <> person
-    RETURN DISTINCT friend_of_friend.name as name
-    """
-
-    result = connection.run_query(friends_of_friends)
+    result = connection.run_query(FRIENDS_OF_FRIENDS_QUERY)
     print("\nДрузья друзей Alice:")
     for record in result:
         print(record['name'])
 
     # 2. Найти самый популярный пост (по лайкам)
-    popular_posts = """
-    MATCH (post:Post)<-[like:LIKED]-()
-    WITH post, COUNT(like) as likes
-    RETURN post.content as content, likes
-    ORDER BY likes DESC
-    """
-
-    result = connection.run_query(popular_posts)
+    result = connection.run_query(POPULAR_POSTS_QUERY)
     print("\nПопулярные посты:")
     for record in result:
         print(f"Content: {record['content']}, Likes: {record['likes']}")
 
     # 3. Найти путь между пользователями
-    path_between_users = """
-    MATCH path = shortestPath((start:Person {name: 'Alice'})-[:FRIENDS*]-(end:Person {name: 'Charlie'}))
-    RETURN [node IN nodes(path) | node.name] as path
-    """
-
-    result = connection.run_query(path_between_users)
+    result = connection.run_query(PATH_BETWEEN_USERS_QUERY)
     print("\nКратчайший путь между Alice и Charlie:")
     for record in result:
         print(" -> ".join(record['path']))
@@ -89,32 +185,14 @@ def recommendations_example(connection):
     """Пример рекомендательной системы"""
 
     # Рекомендации друзей на основе общих связей
-    friend_recommendations = """
-    MATCH (person:Person {name: 'Alice'})-[:FRIENDS]->(friend)-[:FRIENDS]->(potential_friend)
-    WHERE NOT (person)-[:FRIENDS]->(potential_friend)
-    AND person <> potential_friend
-    WITH potential_friend, COUNT(friend) as common_friends
-    RETURN potential_friend.name as recommended_friend, common_friends
-    ORDER BY common_friends DESC
-    """
-
-    result = connection.run_query(friend_recommendations)
+    result = connection.run_query(FRIEND_RECOMMENDATIONS_QUERY)
     print("\nРекомендации друзей для Alice:")
     for record in result:
         print(f"Рекомендуется: {record['recommended_friend']}, "
               f"Общих друзей: {record['common_friends']}")
 
     # Рекомендации постов на основе лайков друзей
-    post_recommendations = """
-    MATCH (person:Person {name: 'Alice'})-[:FRIENDS]->(friend)-[:LIKED]->(post:Post)
-    WHERE NOT (person)-[:LIKED]->(post)
-    AND NOT (person)-[:POSTED]->(post)
-    WITH post, COUNT(friend) as friend_likes
-    RETURN post.content as content, friend_likes
-    ORDER BY friend_likes DESC
-    """
-
-    result = connection.run_query(post_recommendations)
+    result = connection.run_query(POST_RECOMMENDATIONS_QUERY)
     print("\nРекомендации постов для Alice:")
     for record in result:
         print(f"Пост: {record['content']}, "
@@ -149,10 +227,206 @@ def graph_algorithms_example(connection):
         for record in result:
             print(f"User: {record['name']}, Rank: {record['rank']:.4f}")
     except Exception as e:
-        print("Для работы с алгоритмами требуется плагин Graph Data Science")
-
-
-def main():
+        print("Плагин Graph Data Science недоступен, "
+              "считаем алгоритмы локально")
+        local_graph_algorithms_example(connection)
+
+
+def local_graph_algorithms_example(connection):
+    """Графовые алгоритмы без GDS на CSR-представлении подграфа FRIENDS"""
+    graph = CSRGraph.from_neo4j(connection)
+
+    ranks = graph.pagerank()
+    graph.write_pagerank(connection, ranks)
+    print("\nPageRank пользователей (локально):")
+    for i in np.argsort(-ranks)[:10]:
+        print(f"User: {graph.names[i]}, Rank: {ranks[i]:.4f}")
+
+    if 'Alice' in graph.index and 'Charlie' in graph.index:
+        path = graph.shortest_path('Alice', 'Charlie')
+        print("\nКратчайший путь между Alice и Charlie:")
+        print(" -> ".join(path) if path else "Путь не найден")
+
+        print("\nДрузья друзей Alice:", graph.friends_of_friends('Alice'))
+        for name, common in graph.recommend_friends('Alice'):
+            print(f"Рекомендуется: {name}, Общих друзей: {common}")
+
+
+def local_analytics_benchmark(connection, people=100000,
+                              friendships=1000000, samples=20):
+    """Сравнение Cypher-запросов и CSR-алгоритмов на синтетическом графе"""
+    loader = GraphBulkLoader(connection, workers=4)
+    loader.ensure_schema()
+    loader.load_people(synthetic_people(people))
+    loader.load_friendships(synthetic_friendships(people, friendships))
+
+    start = time.perf_counter()
+    graph = CSRGraph.from_neo4j(connection)
+    print(f"\nВыгрузка в CSR: {len(graph.targets)} ребер "
+          f"за {time.perf_counter() - start:.2f} сек")
+
+    cypher = {
+        'friends_of_friends': """
+            MATCH (person:Person {name: $name})-[:FRIENDS]->()
+                  -[:FRIENDS]->(fof)
+            WHERE fof <> person
+            RETURN DISTINCT fof.name as name
+        """,
+        'recommend_friends': """
+            MATCH (person:Person {name: $name})-[:FRIENDS]->(friend)
+                  -[:FRIENDS]->(candidate)
+            WHERE NOT (person)-[:FRIENDS]->(candidate)
+            AND person <> candidate
+            WITH candidate, COUNT(friend) as common_friends
+            RETURN candidate.name as name, common_friends
+            ORDER BY common_friends DESC
+            LIMIT 10
+        """,
+        'shortest_path': """
+            MATCH path = shortestPath((a:Person {name: $name})
+                  -[:FRIENDS*]-(b:Person {name: $other}))
+            RETURN [node IN nodes(path) | node.name] as path
+        """,
+    }
+    rng = np.random.default_rng(42)
+    picks = [f'person_{i}' for i in rng.integers(0, people, samples)]
+    # Те же узлы и пары, что и в Cypher-запросах ниже
+    local = csr_benchmark(graph, picks=picks)
+
+    print(f"{'Алгоритм':<22}{'Cypher, мс':>12}{'CSR, мс':>12}")
+    for name, query in cypher.items():
+        start = time.perf_counter()
+        with connection.session(read_only=True) as session:
+            for a, b in zip(picks, reversed(picks)):
+                connection.execute_read(query, {'name': a, 'other': b},
+                                        session=session)
+        elapsed = (time.perf_counter() - start) * 1000 / samples
+        print(f"{name:<22}{elapsed:>12.2f}{local[name]:>12.2f}")
+    print(f"{'pagerank (весь граф)':<22}{'-':>12}{local['pagerank']:>12.2f}")
+
+
+def bulk_load_example(connection, people=100000, friendships=1000000,
+                      batch_size=10000, workers=4):
+    """Пакетная загрузка большой социальной сети через UNWIND"""
+    loader = GraphBulkLoader(connection, batch_size=batch_size,
+                             workers=workers)
+    loader.ensure_schema()
+
+    stats = loader.load_people(synthetic_people(people))
+    print(f"\nЗагружено узлов: {stats['rows']} "
+          f"за {stats['seconds']:.2f} сек "
+          f"({stats['rows_per_sec']:.0f} узлов/сек)")
+
+    stats = loader.load_friendships(
+        synthetic_friendships(people, friendships))
+    print(f"Загружено ребер: {stats['rows']} "
+          f"за {stats['seconds']:.2f} сек "
+          f"({stats['rows_per_sec']:.0f} ребер/сек)")
+
+
+def recommendation_service_example(connection):
+    """Рекомендации через сервис с кэшем и инкрементальной инвалидацией"""
+    service = RecommendationService(connection, top_n=5)
+    service.precompute(['Alice', 'Bob', 'Charlie', 'David'])
+
+    print("\nРекомендации друзей для Alice (из кэша):")
+    for name, common in service.friend_recommendations('Alice'):
+        print(f"Рекомендуется: {name}, Общих друзей: {common}")
+
+    # Новая дружба сбрасывает кэш только для Alice и тех, кто дружит с ней
+    service.add_friendship('Alice', 'Charlie')
+    print("После добавления дружбы Alice -> Charlie:")
+    for name, common in service.friend_recommendations('Alice'):
+        print(f"Рекомендуется: {name}, Общих друзей: {common}")
+
+    # Возвращаем граф к исходному виду для следующих примеров
+    service.remove_friendship('Alice', 'Charlie')
+
+
+def _percentiles(latencies):
+    values = np.asarray(latencies) * 1000
+    return np.percentile(values, 50), np.percentile(values, 95)
+
+
+def recommendation_benchmark(connection, people=100000, friendships=1000000,
+                             posts=10000, likes=500000, samples=200):
+    """Задержка рекомендаций на графе со степенным распределением"""
+    loader = GraphBulkLoader(connection, workers=4)
+    loader.ensure_schema()
+    loader.load_people(synthetic_people(people))
+    loader.load_friendships(
+        synthetic_friendships(people, friendships, power_law=True))
+    loader.load_posts(synthetic_posts(people, posts))
+    loader.load_likes(synthetic_likes(people, posts, likes))
+
+    # Младшие person_i - супер-узлы, остальные выбираются случайно
+    rng = np.random.default_rng(42)
+    names = [f'person_{i}' for i in range(10)]
+    names += [f'person_{i}' for i in rng.integers(10, people, samples - 10)]
+    uncapped = FRIEND_RECOMMENDATIONS_QUERY.replace("'Alice'", "$name")
+
+    service = RecommendationService(connection, cache_size=samples)
+    results = {'Cypher без ограничений': [], 'Сервис, расчет': [],
+               'Сервис, кэш': []}
+    with connection.session(read_only=True) as session:
+        for name in names:
+            start = time.perf_counter()
+            connection.execute_read(uncapped, {'name': name},
+                                    session=session)
+            results['Cypher без ограничений'].append(
+                time.perf_counter() - start)
+    for name in names:
+        start = time.perf_counter()
+        service.get(name)
+        results['Сервис, расчет'].append(time.perf_counter() - start)
+    for name in names:
+        start = time.perf_counter()
+        service.get(name)
+        results['Сервис, кэш'].append(time.perf_counter() - start)
+
+    print(f"\n{'Путь':<26}{'p50, мс':>10}{'p95, мс':>10}")
+    for path, latencies in results.items():
+        p50, p95 = _percentiles(latencies)
+        print(f"{path:<26}{p50:>10.3f}{p95:>10.3f}")
+
+
+def session_benchmark(connection, queries=1000):
+    """Сравнение старого и нового пути для множества мелких запросов"""
+    query = "MATCH (p:Person {name: $name}) RETURN p.age as age"
+    names = ['Alice', 'Bob', 'Charlie', 'David']
+    params = [{'name': names[i % len(names)]} for i in range(queries)]
+
+    print(f"\nБенчмарк {queries} мелких запросов:")
+
+    start = time.perf_counter()
+    for p in params:
+        connection.run_query(query, p)
+    elapsed = time.perf_counter() - start
+    print(f"run_query (сессия на запрос): {queries / elapsed:.0f} запросов/сек")
+
+    start = time.perf_counter()
+    for p in params:
+        connection.execute_read(query, p)
+    elapsed = time.perf_counter() - start
+    print(f"execute_read (сессия на запрос): "
+          f"{queries / elapsed:.0f} запросов/сек")
+
+    start = time.perf_counter()
+    connection.run_queries([(query, p) for p in params])
+    elapsed = time.perf_counter() - start
+    print(f"run_queries (одна сессия): {queries / elapsed:.0f} запросов/сек")
+
+    start = time.perf_counter()
+    with connection.session(read_only=True) as session:
+        for p in params:
+            for _ in session.run(query, p):
+                pass
+    elapsed = time.perf_counter() - start
+    print(f"Одна сессия, auto-commit: {queries / elapsed:.0f} запросов/сек")
+
+
+def main(benchmarks=()):
+    """Примеры; benchmarks - бенчмарки на большом синтетическом графе"""
     # Подключение к Neo4j
     connection = Neo4jConnection(
         uri="bolt://localhost:7687",
@@ -164,15 +438,33 @@ def main():
         # Очистка базы данных
         connection.run_query("MATCH (n) DETACH DELETE n")
 
+        # Ограничения и индексы для якорных поисков по Person.name
+        setup_schema(connection)
+
         # Запуск примеров
         create_social_network_example(connection)
         relationship_queries(connection)
         recommendations_example(connection)
+        recommendation_service_example(connection)
         graph_algorithms_example(connection)
 
+        # Профилирование запросов проекта (db hits по операторам)
+        profile_queries(connection, PROJECT_QUERIES)
+        session_benchmark(connection)
+        bulk_load_example(connection, people=10000, friendships=50000)
+
+        if 'local_analytics' in benchmarks:
+            local_analytics_benchmark(connection)
+        if 'recommendations' in benchmarks:
+            recommendation_benchmark(connection)
+
     finally:
         connection.close()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--benchmark', action='append', default=[],
+                        choices=['local_analytics', 'recommendations'],
+                        help='бенчмарк после примеров, можно несколько')
+    main(parser.parse_args().benchmark)
\ No newline at end of file
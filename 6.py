@@ -1,26 +1,148 @@
+import argparse
+import time
+
 from clickhouse_driver import Client
-import numpy as np
-from datetime import datetime, timedelta
 
+from clickhouse_data import generate_blocks, load_table
+from clickhouse_ingest import (
+    ClickHousePool, IngestPipeline, benchmark as ingest_benchmark,
+    enable_deduplication
+)
+from clickhouse_query import benchmark as retrieval_benchmark, query_columns
+from clickhouse_rollups import (
+    RollupQueryLayer, backfill, benchmark as rollup_query_benchmark,
+    create_rollups, frozen_parts
+)
+
+
+HOURLY_ACTIVITY_QUERY = '''
+    SELECT 
+        toStartOfHour(timestamp) as hour,
+        count() as actions,
+        uniq(user_id) as unique_users,
+        avg(duration_ms) as avg_duration
+    FROM user_actions
+    WHERE timestamp >= toStartOfHour(now() - INTERVAL 24 HOUR)
+    GROUP BY hour
+    ORDER BY hour
+'''
+
+PLATFORM_COUNTRY_QUERY = '''
+    SELECT 
+        platform,
+        country,
+        count() as actions,
+        uniq(user_id) as users
+    FROM user_actions
+    GROUP BY platform, country
+    ORDER BY users DESC
+    LIMIT 10
+'''
+
+SERVICE_PERFORMANCE_QUERY = '''
+    SELECT 
+        service,
+        endpoint,
+        count() as requests,
+        avg(response_time_ms) as avg_response_time,
+        quantile(0.95)(response_time_ms) as p95_response_time,
+        sum(status_code = 500) as errors
+    FROM performance_metrics
+    GROUP BY service, endpoint
+    ORDER BY avg_response_time DESC
+    LIMIT 10
+'''
+
+RETENTION_QUERY = '''
+    WITH toDate(timestamp) as action_date
+    SELECT 
+        toDate(min(timestamp)) over (partition by user_id) as cohort_date,
+        dateDiff('day', cohort_date, action_date) as day_number,
+        count(distinct user_id) as active_users
+    FROM user_actions
+    GROUP BY action_date, user_id
+    HAVING day_number >= 0
+    ORDER BY cohort_date, day_number
+    LIMIT 10
+'''
+
+# Запросы дашбордов run_analytics
+ANALYTICS_QUERIES = {
+    'hourly_activity': HOURLY_ACTIVITY_QUERY,
+    'platform_country': PLATFORM_COUNTRY_QUERY,
+    'service_performance': SERVICE_PERFORMANCE_QUERY,
+    'retention': RETENTION_QUERY,
+}
+
+# Типичные фильтры, для которых нужны индексы пропуска и проекция
+FILTER_QUERIES = {
+    'country_action_filter': '''
+        SELECT platform, count() as actions
+        FROM user_actions
+        WHERE country = 'JP' AND action = 'submit'
+        GROUP BY platform
+    ''',
+    'user_lookup': '''
+        SELECT timestamp, action, page
+        FROM user_actions
+        WHERE user_id = 42
+        ORDER BY timestamp
+    ''',
+    'server_errors': '''
+        SELECT service, endpoint, count() as errors
+        FROM performance_metrics
+        WHERE status_code = 500
+        GROUP BY service, endpoint
+    ''',
+}
+
+
+def get_client(settings=None, compression=False, database='default'):
+    """Создание клиента ClickHouse
 
-def get_client():
-    """Создание клиента ClickHouse"""
-    return Client(host='localhost', port=9000)
+    settings={'use_numpy': True} включает NumPy-путь драйвера
+    (нужен clickhouse-driver[numpy]), compression='lz4' или 'zstd' -
+    сжатие блоков при передаче (нужен clickhouse-driver[lz4]/[zstd])
+    """
+    return Client(host='localhost', port=9000, database=database,
+                  settings=settings, compression=compression)
 
 
-def create_tables(client):
-    """Создание таблиц для аналитики"""
+def create_tables(client, low_cardinality=False, skip_indexes=False,
+                  user_projection=False):
+    """Создание таблиц для аналитики
+
+    low_cardinality - словарное кодирование строк с малым числом значений,
+    skip_indexes - индексы пропуска гранул для фильтров по country,
+    platform, action и user_id, user_projection - проекция, упорядоченная
+    по user_id, для когортного анализа и выборок по пользователю.
+    """
+    text = 'LowCardinality(String)' if low_cardinality else 'String'
+
+    user_actions_extra = ''
+    performance_extra = ''
+    if skip_indexes:
+        user_actions_extra += ''',
+            INDEX idx_country country TYPE set(100) GRANULARITY 4,
+            INDEX idx_platform platform TYPE set(100) GRANULARITY 4,
+            INDEX idx_action action TYPE set(100) GRANULARITY 4,
+            INDEX idx_user_id user_id TYPE bloom_filter(0.01) GRANULARITY 4'''
+        performance_extra += ''',
+            INDEX idx_status status_code TYPE set(100) GRANULARITY 4'''
+    if user_projection:
+        user_actions_extra += ''',
+            PROJECTION by_user (SELECT * ORDER BY user_id, timestamp)'''
 
     # Таблица для логов пользовательских действий
-    client.execute('''
+    client.execute(f'''
         CREATE TABLE IF NOT EXISTS user_actions (
             timestamp DateTime,
             user_id UInt32,
-            action String,
-            page String,
+            action {text},
+            page {text},
             duration_ms UInt32,
-            platform String,
-            country String
+            platform {text},
+            country {text}{user_actions_extra}
         )
         ENGINE = MergeTree()
         PARTITION BY toYYYYMM(timestamp)
@@ -28,15 +150,15 @@ def create_tables(client):
     ''')
 
     # Таблица для метрик производительности
-    client.execute('''
+    client.execute(f'''
         CREATE TABLE IF NOT EXISTS performance_metrics (
             timestamp DateTime,
-            service String,
-            endpoint String,
+            service {text},
+            endpoint {text},
             response_time_ms UInt32,
             status_code UInt16,
-            error_type String DEFAULT '',
-            data_size_bytes UInt32
+            error_type {text} DEFAULT '',
+            data_size_bytes UInt32{performance_extra}
         )
         ENGINE = MergeTree()
         PARTITION BY toYYYYMM(timestamp)
@@ -44,111 +166,76 @@ def create_tables(client):
     ''')
 
 
-def generate_sample_data(client):
-    """Генерация тестовых данных"""
-
-    # Генерация данных о действиях пользователей
-    now = datetime.now()
-    user_actions = []
-
-    actions = ['view', 'click', 'scroll', 'submit']
-    pages = ['/home', '/products', '/cart', '/checkout']
-    platforms = ['web', 'mobile', 'tablet']
-    countries = ['US', 'UK', 'DE', 'FR', 'JP']
-
-    for i in range(1000000):  # 1 миллион записей
-        timestamp = now - timedelta(
-            minutes=np.random.randint(0, 1440))  # За последние 24 часа
-        user_actions.append([
-            timestamp,
-            np.random.randint(1, 10001),  # user_id
-            np.random.choice(actions),
-            np.random.choice(pages),
-            np.random.randint(50, 5000),  # duration_ms
-            np.random.choice(platforms),
-            np.random.choice(countries)
-        ])
-
-    client.execute(
-        'INSERT INTO user_actions VALUES',
-        user_actions
-    )
-
-    # Генерация метрик производительности
-    performance_data = []
-    services = ['api', 'web', 'auth', 'payment']
-    endpoints = ['/users', '/orders', '/products', '/auth']
-
-    for i in range(500000):  # 500 тысяч записей
-        timestamp = now - timedelta(minutes=np.random.randint(0, 1440))
-        performance_data.append([
-            timestamp,
-            np.random.choice(services),
-            np.random.choice(endpoints),
-            np.random.randint(10, 1000),  # response_time_ms
-            np.random.choice([200, 200, 200, 404, 500]),  # status_code
-            '',  # error_type
-            np.random.randint(100, 10000)  # data_size_bytes
-        ])
-
-    client.execute(
-        'INSERT INTO performance_metrics VALUES',
-        performance_data
-    )
+def generate_sample_data_columnar(client, block_size=100000,
+                                  use_numpy=None, seed=None):
+    """Векторная генерация тестовых данных с потоковой колоночной вставкой"""
+    for table, total in (('user_actions', 1000000),
+                         ('performance_metrics', 500000)):
+        stats = load_table(client, table, total, block_size=block_size,
+                           use_numpy=use_numpy, seed=seed)
+        print(f"{table}: {stats['rows']} строк, "
+              f"генерация {stats['generate_rows_per_sec']:.0f} строк/сек, "
+              f"вставка {stats['insert_rows_per_sec']:.0f} строк/сек")
+
+
+def parallel_ingest_example(client, rows=200000, workers=4,
+                            block_size=100000, compression='lz4'):
+    """Параллельная вставка блоками с дедупликацией повторов
+
+    После вставки те же блоки отправляются еще раз с тем же run_id -
+    так выглядит повтор после сбоя, и ClickHouse отбрасывает его по
+    токенам дедупликации.
+    """
+    for table in ('user_actions', 'performance_metrics'):
+        enable_deduplication(client, table)
+
+    pool = ClickHousePool(lambda: get_client(compression=compression),
+                          size=workers)
+    try:
+        for table, total in (('user_actions', rows),
+                             ('performance_metrics', rows // 2)):
+            pipeline = IngestPipeline(pool, table)
+            blocks = list(generate_blocks(table, total, block_size))
+            stats = pipeline.run(blocks)
+            print(f"{table}: {stats['rows']} строк за "
+                  f"{stats['seconds']:.2f} сек "
+                  f"({stats['rows_per_sec']:.0f} строк/сек, "
+                  f"повторов: {stats['retries']})")
+
+            before = client.execute(f"SELECT count() FROM {table}")[0][0]
+            pipeline.run(blocks)
+            after = client.execute(f"SELECT count() FROM {table}")[0][0]
+            print(f"{table}: повторная вставка тех же блоков добавила "
+                  f"{after - before} строк")
+    finally:
+        pool.close()
 
 
 def run_analytics(client):
-    """Примеры аналитических запросов"""
+    """Примеры аналитических запросов
+
+    Запросы идут через RollupQueryLayer: если rollup для дашборда создан,
+    читается он, иначе сырые таблицы.
+    """
+    queries = RollupQueryLayer(client, ANALYTICS_QUERIES)
 
     # 1. Агрегация по временным интервалам
     print("\nАктивность пользователей по часам:")
-    result = client.execute('''
-        SELECT 
-            toStartOfHour(timestamp) as hour,
-            count() as actions,
-            uniq(user_id) as unique_users,
-            avg(duration_ms) as avg_duration
-        FROM user_actions
-        WHERE timestamp >= now() - INTERVAL 24 HOUR
-        GROUP BY hour
-        ORDER BY hour
-    ''')
+    result = queries.execute('hourly_activity')
     for row in result:
         print(
             f"Hour: {row[0]}, Actions: {row[1]}, Users: {row[2]}, Avg Duration: {row[3]:.2f}ms")
 
     # 2. Распределение по платформам и странам
     print("\nРаспределение пользователей по платформам и странам:")
-    result = client.execute('''
-        SELECT 
-            platform,
-            country,
-            count() as actions,
-            uniq(user_id) as users
-        FROM user_actions
-        GROUP BY platform, country
-        ORDER BY users DESC
-        LIMIT 10
-    ''')
+    result = queries.execute('platform_country')
     for row in result:
         print(
             f"Platform: {row[0]}, Country: {row[1]}, Actions: {row[2]}, Users: {row[3]}")
 
     # 3. Анализ производительности сервисов
     print("\nПроизводительность сервисов:")
-    result = client.execute('''
-        SELECT 
-            service,
-            endpoint,
-            count() as requests,
-            avg(response_time_ms) as avg_response_time,
-            quantile(0.95)(response_time_ms) as p95_response_time,
-            sum(status_code = 500) as errors
-        FROM performance_metrics
-        GROUP BY service, endpoint
-        ORDER BY avg_response_time DESC
-        LIMIT 10
-    ''')
+    result = queries.execute('service_performance')
     for row in result:
         print(f"Service: {row[0]}, Endpoint: {row[1]}")
         print(
@@ -156,71 +243,227 @@ def run_analytics(client):
 
     # 4. Когортный анализ
     print("\nУдержание пользователей по дням:")
-    result = client.execute('''
-        WITH toDate(timestamp) as action_date
-        SELECT 
-            toDate(min(timestamp)) over (partition by user_id) as cohort_date,
-            dateDiff('day', cohort_date, action_date) as day_number,
-            count(distinct user_id) as active_users
-        FROM user_actions
-        GROUP BY action_date, user_id
-        HAVING day_number >= 0
-        ORDER BY cohort_date, day_number
-        LIMIT 10
-    ''')
+    result = queries.execute('retention')
     for row in result:
         print(f"Cohort: {row[0]}, Day: {row[1]}, Active Users: {row[2]}")
 
 
-def materialized_views_example(client):
-    """Пример использования материализованных представлений"""
+def run_analytics_columnar(client, max_block_size=None):
+    """Почасовая активность в виде колонок NumPy вместо списка кортежей"""
+    columns = query_columns(client, HOURLY_ACTIVITY_QUERY,
+                            max_block_size=max_block_size)
+    if not columns:
+        return
+    print("\nПочасовая активность (колонки):")
+    print(f"Часов: {len(columns['hour'])}, "
+          f"всего действий: {int(columns['actions'].sum())}, "
+          f"средняя длительность: {columns['avg_duration'].mean():.2f}ms")
 
-    # Создание материализованного представления для агрегации по минутам
-    client.execute('''
-        CREATE MATERIALIZED VIEW IF NOT EXISTS metrics_by_minute
-        ENGINE = SummingMergeTree()
-        PARTITION BY toYYYYMM(minute)
-        ORDER BY (minute, service, endpoint)
-        AS SELECT
-            toStartOfMinute(timestamp) as minute,
-            service,
-            endpoint,
-            count() as requests,
-            sum(response_time_ms) as total_response_time,
-            sum(data_size_bytes) as total_data_size
-        FROM performance_metrics
-        GROUP BY minute, service, endpoint
-    ''')
 
-    # Запрос к материализованному представлению
-    print("\nАгрегированные метрики по минутам:")
-    result = client.execute('''
+def rollup_benchmark(rows=100000000, block_size=500000, workers=8,
+                     database='bench_rollups'):
+    """Сырые таблицы против rollup на больших объемах
+
+    Данные грузятся в отдельную базу. Rollup создаются до загрузки,
+    поэтому представления наполняются вместе с исходными таблицами.
+    База удаляется после замера.
+    """
+    admin = get_client()
+    admin.execute(f"CREATE DATABASE IF NOT EXISTS {database}")
+    client = get_client(database=database)
+    try:
+        create_tables(client)
+        create_rollups(client)
+
+        pool = ClickHousePool(lambda: get_client(database=database),
+                              size=workers)
+        try:
+            for table, total in (('user_actions', rows),
+                                 ('performance_metrics', rows // 2)):
+                stats = IngestPipeline(pool, table).run(
+                    generate_blocks(table, total, block_size))
+                print(f"{table}: {stats['rows']} строк, "
+                      f"{stats['rows_per_sec']:.0f} строк/сек")
+        finally:
+            pool.close()
+
+        rollup_query_benchmark(RollupQueryLayer(client, ANALYTICS_QUERIES))
+    finally:
+        client.disconnect()
+        admin.execute(f"DROP DATABASE IF EXISTS {database}")
+        admin.disconnect()
+
+
+METRICS_BY_MINUTE_SELECT = '''
+    SELECT
+        toStartOfMinute(timestamp) as minute,
+        service,
+        endpoint,
+        count() as requests,
+        sum(response_time_ms) as total_response_time,
+        sum(data_size_bytes) as total_data_size
+    FROM performance_metrics
+    {where}
+    GROUP BY minute, service, endpoint
+'''
+
+
+def query_metrics_by_minute(client, limit=5, since_minutes=None):
+    """Чтение metrics_by_minute с досуммированием строк
+
+    SummingMergeTree схлопывает строки с одинаковым ключом только при
+    слияниях, поэтому до них у одной минуты может быть несколько строк.
+    sum() ... GROUP BY дает правильный результат в любой момент.
+    """
+    where = ("WHERE minute >= now() - INTERVAL %(since)s MINUTE"
+             if since_minutes else "")
+    return client.execute(f'''
         SELECT
             minute,
             service,
             endpoint,
-            requests,
-            total_response_time / requests as avg_response_time
+            sum(requests) as requests_count,
+            sum(total_response_time) / sum(requests) as avg_response_time,
+            sum(total_data_size) as data_size
         FROM metrics_by_minute
+        {where}
+        GROUP BY minute, service, endpoint
         ORDER BY minute DESC
-        LIMIT 5
-    ''')
+        LIMIT %(limit)s
+    ''', {'limit': limit, 'since': since_minutes})
+
+
+def schema_benchmark(rows=10000000, block_size=500000, repeat=3):
+    """Прочитанные строки и задержка запросов до и после оптимизации схемы
+
+    Одинаковые данные загружаются в две базы: с исходной схемой и с
+    LowCardinality, индексами пропуска и проекцией по user_id. Обе базы
+    удаляются после замера.
+    """
+    variants = {
+        'bench_plain': {},
+        'bench_optimized': {'low_cardinality': True, 'skip_indexes': True,
+                            'user_projection': True},
+    }
+    queries = dict(ANALYTICS_QUERIES, **FILTER_QUERIES)
+    admin = get_client()
+    results = {}
+
+    try:
+        for database, options in variants.items():
+            admin.execute(f"CREATE DATABASE IF NOT EXISTS {database}")
+            client = get_client(database=database)
+            try:
+                create_tables(client, **options)
+                for table, total in (('user_actions', rows),
+                                     ('performance_metrics', rows // 2)):
+                    load_table(client, table, total, block_size=block_size,
+                               seed=1)
+                client.execute("OPTIMIZE TABLE user_actions FINAL")
+
+                for name, query in queries.items():
+                    best = float('inf')
+                    for _ in range(repeat):
+                        start = time.perf_counter()
+                        client.execute(query)
+                        best = min(best, time.perf_counter() - start)
+                    results[(database, name)] = (
+                        client.last_query.progress.rows, best * 1000)
+            finally:
+                client.disconnect()
+    finally:
+        for database in variants:
+            admin.execute(f"DROP DATABASE IF EXISTS {database}")
+        admin.disconnect()
+
+    print(f"\n{'Запрос':<24}{'строк до':>12}{'строк после':>14}"
+          f"{'мс до':>10}{'мс после':>10}")
+    for name in queries:
+        before = results[('bench_plain', name)]
+        after = results[('bench_optimized', name)]
+        print(f"{name:<24}{before[0]:>12}{after[0]:>14}"
+              f"{before[1]:>10.1f}{after[1]:>10.1f}")
+
+
+def materialized_views_example(client, pool=None):
+    """Пример использования материализованных представлений"""
+
+    # Создание материализованного представления для агрегации по минутам
+    exists = client.execute("EXISTS TABLE metrics_by_minute")[0][0]
+    if not exists:
+        with frozen_parts(client, 'performance_metrics') as parts:
+            client.execute('''
+                CREATE MATERIALIZED VIEW IF NOT EXISTS metrics_by_minute
+                ENGINE = SummingMergeTree()
+                PARTITION BY toYYYYMM(minute)
+                ORDER BY (minute, service, endpoint)
+                AS ''' + METRICS_BY_MINUTE_SELECT.format(where=''))
+
+            # Данные, вставленные до создания представления (куски
+            # снимка), переносим кусками по партициям и дням
+            chunks = backfill(client, 'metrics_by_minute',
+                              METRICS_BY_MINUTE_SELECT, 'performance_metrics',
+                              parts=parts, pool=pool)
+        print(f"\nmetrics_by_minute заполнено из {chunks} кусков")
+
+    # Запрос к материализованному представлению
+    print("\nАгрегированные метрики по минутам:")
+    result = query_metrics_by_minute(client, limit=5)
     for row in result:
         print(f"Minute: {row[0]}, Service: {row[1]}, Endpoint: {row[2]}")
         print(f"Requests: {row[3]}, Avg Response Time: {row[4]:.2f}ms")
 
 
-def main():
+def scratch_ingest_benchmark(database='bench_ingest', compression='lz4'):
+    """Бенчмарк параллельной вставки в отдельной базе
+
+    Демо-таблицы не трогаются, база удаляется после замера.
+    """
+    admin = get_client()
+    admin.execute(f"CREATE DATABASE IF NOT EXISTS {database}")
+    client = get_client(database=database)
+    try:
+        create_tables(client)
+        ingest_benchmark(lambda: get_client(database=database,
+                                            compression=compression))
+    finally:
+        client.disconnect()
+        admin.execute(f"DROP DATABASE IF EXISTS {database}")
+        admin.disconnect()
+
+
+def main(benchmarks=()):
+    """Примеры; benchmarks - тяжелые бенчмарки в отдельных базах"""
     client = get_client()
 
     # Создание структуры и данных
-    create_tables(client)
-    generate_sample_data(client)
+    create_tables(client, low_cardinality=True, skip_indexes=True,
+                  user_projection=True)
+    create_rollups(client)
+    generate_sample_data_columnar(client)
+    parallel_ingest_example(client)
 
     # Выполнение аналитики
     run_analytics(client)
-    materialized_views_example(client)
+    run_analytics_columnar(client)
+    retrieval_benchmark(client, ANALYTICS_QUERIES, max_block_size=65536)
+    pool = ClickHousePool(get_client, size=4)
+    try:
+        materialized_views_example(client, pool=pool)
+    finally:
+        pool.close()
+
+    if 'ingest' in benchmarks:
+        scratch_ingest_benchmark()
+    if 'rollups' in benchmarks:
+        rollup_benchmark()
+    if 'schema' in benchmarks:
+        schema_benchmark()
 
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--benchmark', action='append', default=[],
+                        choices=['ingest', 'rollups', 'schema'],
+                        help='бенчмарк после примеров, можно несколько')
+    main(parser.parse_args().benchmark)
\ No newline at end of file
@@ -1,41 +1,95 @@
+import argparse
+import asyncio
 import redis
+import redis.asyncio
 import json
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timedelta
 from typing import Optional, Dict, List, Any
 
+from redis_cache import TwoTierCache
+from redis_leaderboard import (ShardedLeaderboard,
+                               benchmark as leaderboard_benchmark)
+from redis_rate_limit import RateLimiter, benchmark as rate_limit_benchmark
+from redis_sessions import SessionStore
+from redis_streams import EventBus, benchmark as stream_benchmark
+
 
 class RedisExample:
-    def __init__(self, host='localhost', port=6379, db=0):
-        self.redis = redis.Redis(host=host, port=port, db=db,
-                                 decode_responses=True)
+    def __init__(self, host='localhost', port=6379, db=0,
+                 client: Optional[redis.Redis] = None):
+        # client позволяет подставить готовый клиент, например
+        # fakeredis.FakeRedis(decode_responses=True) вместо сервера
+        self.redis = client or redis.Redis(host=host, port=port, db=db,
+                                           decode_responses=True)
+        self.connection_params = {'host': host, 'port': port, 'db': db}
+
+    def batch(self, transaction: bool = False):
+        """Пайплайн для группы команд одной логической операции
+
+        transaction=True оборачивает команды в MULTI/EXEC, иначе они
+        просто отправляются одним пакетом за один сетевой проход.
+        """
+        return self.redis.pipeline(transaction=transaction)
+
+    def mget(self, keys: List[str]) -> Dict[str, Optional[str]]:
+        """Чтение многих ключей одной командой MGET"""
+        if not keys:
+            return {}
+        return dict(zip(keys, self.redis.mget(keys)))
+
+    def mset(self, mapping: Dict[str, Any], ttl: Optional[int] = None):
+        """Запись многих ключей одной командой MSET
+
+        MSET не умеет TTL, поэтому EXPIRE для ключей уходят в том же
+        пайплайне - все равно один сетевой проход.
+        """
+        if not mapping:
+            return
+        with self.batch(transaction=ttl is not None) as pipe:
+            pipe.mset(mapping)
+            if ttl is not None:
+                for key in mapping:
+                    pipe.expire(key, ttl)
+            pipe.execute()
 
     def basic_operations(self):
         """Базовые операции с Redis"""
         print("\n=== Базовые операции ===")
 
-        # Строки (Strings)
-        self.redis.set('user:1:name', 'John Doe')
-        self.redis.set('user:1:email', 'john@example.com')
-        self.redis.set('user:1:visits', 1,
-                       nx=True)  # Установить, только если не существует
+        with self.batch() as pipe:
+            # Строки (Strings)
+            pipe.mset({'user:1:name': 'John Doe',
+                       'user:1:email': 'john@example.com'})
+            pipe.set('user:1:visits', 1,
+                     nx=True)  # Установить, только если не существует
 
-        # Инкремент
-        self.redis.incr('user:1:visits')
-        visits = self.redis.get('user:1:visits')
-        print(f"Количество визитов: {visits}")
+            # Инкремент
+            pipe.incr('user:1:visits')
+            pipe.get('user:1:visits')
 
-        # Установка с истечением
-        self.redis.setex('temporary_key', 60, 'will expire in 60 seconds')
-        ttl = self.redis.ttl('temporary_key')
+            # Установка с истечением
+            pipe.setex('temporary_key', 60, 'will expire in 60 seconds')
+            pipe.ttl('temporary_key')
+            *_, visits, _, ttl = pipe.execute()
+
+        print(f"Количество визитов: {visits}")
         print(f"Оставшееся время жизни: {ttl} секунд")
 
+        profile = self.mget(['user:1:name', 'user:1:email'])
+        print(f"Профиль одним MGET: {profile}")
+
     def caching_example(self):
         """Пример использования Redis для кэширования"""
         print("\n=== Кэширование ===")
 
-        def get_expensive_data(user_id: int) -> dict:
+        cache = TwoTierCache(self.redis, ttl=300, l1_ttl=5)
+
+        @cache.cached('user')
+        def get_user_data(user_id: int) -> Dict[str, Any]:
             """Имитация получения данных из медленной БД"""
+            print("Получение данных из БД...")
             time.sleep(1)  # Имитация долгой работы
             return {
                 'id': user_id,
@@ -44,103 +98,99 @@ class RedisExample:
                 'preferences': {'theme': 'dark', 'language': 'en'}
             }
 
-        def get_user_data(user_id: int) -> Dict[str, Any]:
-            """Получение данных с использованием кэша"""
-            cache_key = f'user:{user_id}:data'
-
-            # Пробуем получить из кэша
-            cached_data = self.redis.get(cache_key)
-            if cached_data:
-                print("Данные получены из кэша")
-                return json.loads(cached_data)
-
-            # Если нет в кэше, получаем из БД
-            print("Получение данных из БД...")
-            data = get_expensive_data(user_id)
-
-            # Сохраняем в кэш на 5 минут
-            self.redis.setex(cache_key, 300, json.dumps(data))
-            return data
-
         # Пример использования
         start = time.time()
         data = get_user_data(1)  # Первый запрос (медленный)
         print(f"Первый запрос: {time.time() - start:.2f} сек")
 
         start = time.time()
-        data = get_user_data(1)  # Второй запрос (быстрый, из кэша)
-        print(f"Второй запрос: {time.time() - start:.2f} сек")
+        data = get_user_data(1)  # Второй запрос (из L1 в процессе)
+        print(f"Второй запрос: {time.time() - start:.4f} сек")
+
+        # Одновременные промахи: в БД идет только один запрос
+        start = time.time()
+        with ThreadPoolExecutor(max_workers=10) as pool:
+            list(pool.map(get_user_data, [2] * 10))
+        print(f"10 одновременных запросов: {time.time() - start:.2f} сек")
+
+        report = cache.report()
+        print(f"Доля попаданий: {report['hit_ratio']:.0%}, "
+              f"вычислений: {report['computations']}, "
+              f"средняя задержка: {report['avg_latency_ms']:.2f} мс")
 
     def session_management(self):
         """Пример управления сессиями"""
         print("\n=== Управление сессиями ===")
 
-        def create_session(user_id: int) -> str:
-            """Создание сессии"""
-            session_id = f"sess_{int(time.time())}"
-            session_data = {
-                'user_id': user_id,
-                'login_time': datetime.now().isoformat(),
-                'last_activity': datetime.now().isoformat()
-            }
-
-            # Сохраняем сессию на 30 минут
-            self.redis.hset(f'session:{session_id}', mapping=session_data)
-            self.redis.expire(f'session:{session_id}', 1800)
-
-            return session_id
-
-        def get_session(session_id: str) -> Optional[Dict]:
-            """Получение данных сессии"""
-            session_data = self.redis.hgetall(f'session:{session_id}')
-            if session_data:
-                # Обновляем время последней активности
-                self.redis.hset(f'session:{session_id}', 'last_activity',
-                                datetime.now().isoformat())
-                # Продлеваем время жизни сессии
-                self.redis.expire(f'session:{session_id}', 1800)
-            return session_data if session_data else None
+        # Сессии на 30 минут, чтение продлевает их одним Lua-вызовом
+        sessions = SessionStore(self.redis, ttl=1800)
 
         # Пример использования
-        session_id = create_session(user_id=1)
+        session_id = sessions.create(user_id=1)
         print(f"Создана сессия: {session_id}")
 
-        session = get_session(session_id)
+        session = sessions.get(session_id)
         print(f"Данные сессии: {session}")
 
+        other_id = sessions.create(user_id=2)
+        print(f"Пакетное чтение: "
+              f"{sessions.get_many([session_id, other_id, 'sess_missing'])}")
+
+    def session_benchmark(self, sessions_count: int = 100,
+                          requests: int = 5000):
+        """Пропускная способность старого и нового пути чтения сессии"""
+        print("\n=== Бенчмарк сессий ===")
+        store = SessionStore(self.redis, ttl=1800)
+        cached_store = SessionStore(self.redis, ttl=1800, local_ttl=1)
+        ids = [store.create(user_id=i) for i in range(sessions_count)]
+        lookups = [ids[i % sessions_count] for i in range(requests)]
+
+        def legacy_get(session_id: str) -> Optional[Dict]:
+            """HGETALL + HSET + EXPIRE - три сетевых прохода"""
+            key = f'session:{session_id}'
+            session_data = self.redis.hgetall(key)
+            if session_data:
+                self.redis.hset(key, 'last_activity',
+                                datetime.now().isoformat())
+                self.redis.expire(key, 1800)
+            return session_data or None
+
+        paths = {
+            'HGETALL+HSET+EXPIRE': lambda: [legacy_get(s) for s in lookups],
+            'Lua (1 проход)': lambda: [store.get(s) for s in lookups],
+            'Lua пакетами по 100': lambda: [
+                store.get_many(lookups[i:i + 100])
+                for i in range(0, requests, 100)],
+            'Lua + кэш в процессе': lambda: [cached_store.get(s)
+                                             for s in lookups],
+        }
+        for name, run in paths.items():
+            start = time.perf_counter()
+            run()
+            elapsed = time.perf_counter() - start
+            print(f"{name:<24}{requests / elapsed:>10.0f} чтений/сек")
+
+        for session_id in ids:
+            store.delete(session_id)
+
     def rate_limiting(self):
         """Пример ограничения частоты запросов"""
         print("\n=== Ограничение частоты запросов ===")
 
-        def check_rate_limit(user_id: int, limit: int = 5,
-                             window: int = 60) -> bool:
-            """
-            Проверка ограничения частоты запросов
-            limit: максимальное количество запросов
-            window: временное окно в секундах
-            """
-            key = f'ratelimit:{user_id}'
-            current = self.redis.get(key)
-
-            if not current:
-                # Первый запрос
-                self.redis.setex(key, window, 1)
-                return True
-
-            current = int(current)
-            if current >= limit:
-                return False
-
-            # Увеличиваем счетчик
-            self.redis.incr(key)
-            return True
+        # Проверка и учет запроса выполняются атомарно одним Lua-скриптом,
+        # поэтому лимит соблюдается и при конкурентных клиентах
+        limiter = RateLimiter(self.redis, 'sliding_log', limit=5, window=60)
 
         # Пример использования
         user_id = 1
         for i in range(7):
-            allowed = check_rate_limit(user_id)
+            allowed = limiter.allow(user_id)
             print(f"Запрос {i + 1}: {'разрешен' if allowed else 'отклонен'}")
 
+        # Пакетная проверка для многих пользователей за один проход
+        decisions = limiter.allow_many([2, 3, 4])
+        print(f"Пакетная проверка: {decisions}")
+
     def pub_sub_example(self):
         """Пример публикации и подписки"""
         print("\n=== Публикация и подписка ===")
@@ -158,6 +208,66 @@ class RedisExample:
 
         print("Событие опубликовано")
 
+        # То же событие в поток: оно не потеряется без подписчиков
+        bus = EventBus(self.redis, 'notifications:stream', maxlen=100000)
+        bus.ensure_group('mailer')
+        bus.publish_many([
+            {'type': 'user_registered', 'user_id': user_id,
+             'timestamp': datetime.now().isoformat()}
+            for user_id in range(1, 4)
+        ])
+
+        events = bus.read('mailer', 'mailer-1', count=10, block=None)
+        for _, event in events:
+            print(f"Получено из потока: {event}")
+        bus.ack('mailer', [entry_id for entry_id, _ in events])
+
+    def stream_benchmark(self, messages: int = 100000, consumers: int = 4,
+                         async_client=None):
+        """Сквозная пропускная способность шины на Redis Streams"""
+        print("\n=== Бенчмарк Redis Streams ===")
+
+        async def run():
+            client = async_client or redis.asyncio.Redis(
+                **self.connection_params, decode_responses=True)
+            try:
+                await stream_benchmark(self.redis, client, messages=messages,
+                                       consumers=consumers)
+            finally:
+                await client.aclose()
+
+        asyncio.run(run())
+
+    def pipeline_benchmark(self, operations: int = 10000,
+                           depths=(1, 10, 100, 1000)):
+        """Операций в секунду при разной глубине пайплайна"""
+        print("\n=== Бенчмарк пайплайнов ===")
+        keys = [f'bench:{i}' for i in range(operations)]
+
+        for depth in depths:
+            start = time.perf_counter()
+            for offset in range(0, operations, depth):
+                chunk = keys[offset:offset + depth]
+                if depth == 1:
+                    self.redis.set(chunk[0], offset)
+                    continue
+                with self.batch() as pipe:
+                    for i, key in enumerate(chunk):
+                        pipe.set(key, offset + i)
+                    pipe.execute()
+            elapsed = time.perf_counter() - start
+            print(f"Глубина {depth:>5}: {operations / elapsed:>10.0f} SET/сек")
+
+        for depth in depths[1:]:
+            start = time.perf_counter()
+            for offset in range(0, operations, depth):
+                self.mget(keys[offset:offset + depth])
+            elapsed = time.perf_counter() - start
+            print(f"MGET по {depth:>5}: {operations / elapsed:>10.0f} "
+                  f"ключей/сек")
+
+        self.redis.delete(*keys)
+
     def sorted_set_example(self):
         """Пример работы с сортированными множествами"""
         print("\n=== Сортированные множества ===")
@@ -180,8 +290,25 @@ class RedisExample:
         rank = self.redis.zrevrank('leaderboard', 'player1')
         print(f"Ранг player1: {rank + 1}")
 
+        # Та же таблица, разбитая на шарды: начисления пакетом
+        board = ShardedLeaderboard(self.redis, 'leaderboard:sharded', shards=4)
+        board.set_scores({'player1': 100, 'player2': 200,
+                          'player3': 150, 'player4': 300})
+        board.increment_many([('player1', 50), ('player1', 100),
+                              ('player3', 10)])
+        print("Топ 3 игрока (шарды):")
+        for player, score in board.top(3):
+            print(f"{player}: {int(score)}")
+        print(f"Ранг player1 (шарды): {board.rank('player1')}")
+
+    def leaderboard_benchmark(self, players: int = 1000000):
+        """Начисления и запросы ранга на шардированной таблице"""
+        print("\n=== Бенчмарк таблицы рекордов ===")
+        leaderboard_benchmark(self.redis, players=players)
 
-def main():
+
+def main(benchmarks=()):
+    """Примеры; benchmarks - бенчмарки на больших объемах данных"""
     redis_example = RedisExample()
 
     # Очистка базы данных перед демонстрацией
@@ -195,6 +322,22 @@ def main():
     redis_example.pub_sub_example()
     redis_example.sorted_set_example()
 
+    if 'pipeline' in benchmarks:
+        redis_example.pipeline_benchmark()
+    if 'sessions' in benchmarks:
+        redis_example.session_benchmark()
+    if 'streams' in benchmarks:
+        redis_example.stream_benchmark()
+    if 'leaderboard' in benchmarks:
+        redis_example.leaderboard_benchmark()
+    if 'rate_limit' in benchmarks:
+        rate_limit_benchmark(redis_example.redis)
+
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--benchmark', action='append', default=[],
+                        choices=['pipeline', 'sessions', 'streams',
+                                 'leaderboard', 'rate_limit'],
+                        help='бенчмарк после примеров, можно несколько')
+    main(parser.parse_args().benchmark)
\ No newline at end of file
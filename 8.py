@@ -1,12 +1,80 @@
+import argparse
 import asyncio
 from pyle38 import Tile38
-from typing import List, Tuple
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+from geofence_engine import (GeofenceEngine, HookReceiver,
+                             benchmark as geofence_benchmark)
+from spatial_index import (DEFAULT_LIMIT, PointIndex,
+                           benchmark as index_benchmark)
+from tile38_bulk import BulkPositionWriter, benchmark as bulk_benchmark
+from tile38_pool import Tile38Pool, benchmark as pool_benchmark
 
 
 class Tile38Client:
-    def __init__(self, host: str = 'localhost', port: int = 9851):
-        """Initialize Tile38 client connection"""
-        self.client = Tile38(url=f"redis://{host}:{port}")
+    def __init__(self, host: str = 'localhost', port: int = 9851,
+                 hook_url: Optional[str] = None, hook_port: int = 8080,
+                 hook_host: str = '127.0.0.1',
+                 followers: Sequence[Tuple[str, int]] = ()):
+        """Initialize Tile38 client connection
+
+        hook_url is the address Tile38 can reach this process at
+        (e.g. http://host.docker.internal:8080/hook); when set, server
+        hooks are received on hook_host:hook_port next to the local
+        geofence events. hook_host is loopback by default; a containerized
+        Tile38 needs an address it can reach (e.g. '0.0.0.0').
+        followers are (host, port) of read replicas used by the pool.
+        """
+        self.url = f"redis://{host}:{port}"
+        self.client = Tile38(url=self.url)
+        self.follower_urls = [f"redis://{h}:{p}" for h, p in followers]
+        self.pool = Tile38Pool(self.url, self.follower_urls)
+        self.hook_url = hook_url
+        self.hook_port = hook_port
+        self.hook_host = hook_host
+        self.hooks: Optional[HookReceiver] = None
+        self.geofences: Optional[GeofenceEngine] = None
+        self.writers: Dict[str, BulkPositionWriter] = {}
+        # Local copies of static collections, queried without the server
+        self.indexes: Dict[str, PointIndex] = {}
+
+    def writer(self, key: str = 'fleet') -> BulkPositionWriter:
+        """Pipelined writer for a collection, created on first use"""
+        if key not in self.writers:
+            self.writers[key] = BulkPositionWriter(self.url, key)
+        return self.writers[key]
+
+    async def bulk_update_positions(
+            self, fixes: Iterable[Tuple[str, float, float]],
+            key: str = 'fleet') -> int:
+        """Write many (id, lat, lon) fixes, only the latest per id is sent"""
+        return await self.writer(key).update(fixes)
+
+    async def nearby(self, key: str, lat: float, lon: float, radius: float,
+                     limit: int = DEFAULT_LIMIT, cursor: int = 0) -> Dict:
+        """NEARBY from the local index when the collection has one
+
+        Both paths return the same asObjects()-shaped dict and page the
+        same way, so callers cannot tell where the answer came from.
+        """
+        if key in self.indexes:
+            return self.indexes[key].nearby(lat, lon, radius, limit, cursor)
+        return await self.pool.nearby(key, lat, lon, radius, limit, cursor)
+
+    async def within(self, key: str, polygon: dict,
+                     limit: int = DEFAULT_LIMIT, cursor: int = 0) -> Dict:
+        """WITHIN a GeoJSON polygon, local index first"""
+        if key in self.indexes:
+            return self.indexes[key].within(polygon, limit, cursor)
+        return await self.pool.within(key, polygon, limit, cursor)
+
+    async def close(self):
+        for writer in self.writers.values():
+            await writer.close()
+        if self.hooks is not None:
+            await self.hooks.stop()
+        await self.pool.close()
+        await self.client.quit()
 
     async def basic_operations(self):
         """Basic operations with geospatial data"""
@@ -32,7 +100,7 @@ class Tile38Client:
     async def geofencing(self):
         """Example of working with geofences"""
         # Create a geofence for city center using circle
-        await self.client.set("zones", "city_center").object({
+        city_center = {
             "type": "Polygon",
             "coordinates": [[
                 [13.37, 52.25],
@@ -41,20 +109,39 @@ class Tile38Client:
                 [13.37, 52.26],
                 [13.37, 52.25]
             ]]
-        }).exec()
+        }
+        await self.client.set("zones", "city_center").object(
+            city_center).exec()
 
         # Check if any couriers are inside the zone using WITHIN
         inside_zone = await self.client.within("fleet").get("zones",
                                                             "city_center").asObjects()
 
-        # Setup webhook for geofence notifications
-        hook = await self.client.sethook(
-            "city_alerts",
-            "http://example.com/webhook"
-        ).within("fleet").get("zones", "city_center").detect(
-            ["enter", "exit"]).activate()
-
-        return inside_zone
+        # Enter/exit detection in process: the engine remembers the zones
+        # of every courier and puts event batches on an asyncio queue
+        self.geofences = GeofenceEngine({"city_center": city_center},
+                                        hook="city_alerts")
+        queue = self.geofences.sink.queue
+        await self.geofences.process([("courier1", 52.255, 13.375),
+                                      ("courier2", 40.7128, -74.0060)])
+        await self.geofences.process([("courier1", 52.27, 13.39)])
+
+        # Server-side hook, delivered to the local receiver
+        if self.hook_url:
+            self.hooks = await HookReceiver(host=self.hook_host,
+                                            port=self.hook_port,
+                                            queue=queue).start()
+            await self.client.sethook(
+                "city_alerts",
+                self.hook_url
+            ).within("fleet").get("zones", "city_center").detect(
+                ["enter", "exit"]).activate()
+
+        events = []
+        while not queue.empty():
+            events.extend(queue.get_nowait())
+
+        return {"inside": inside_zone, "events": events}
 
     async def proximity_search(self):
         """Search for nearest objects"""
@@ -68,17 +155,19 @@ class Tile38Client:
             52.25, 13.38, {'name': 'Burger Joint', 'type': 'restaurant'})
         }
 
+        # One pipelined batch instead of a round trip per POI
+        writer = self.writer('pois')
         for id, (lat, lon, data) in pois.items():
-            await self.client.set('pois', id).point(lat, lon).fields(
-                data).exec()
+            writer.add(id, lat, lon, data)
+        await writer.flush()
+
+        # POIs rarely change, so nearby queries can stay in process
+        self.indexes['pois'] = PointIndex.from_items(pois)
 
         # Search POIs within 1000 meters
         search_point = (52.25, 13.37)
-        nearby = await self.client.nearby('pois').point(
-            search_point[0],
-            search_point[1],
-            1000
-        ).asObjects()
+        nearby = await self.nearby('pois', search_point[0], search_point[1],
+                                   1000)
 
         return nearby
 
@@ -99,10 +188,23 @@ class Tile38Client:
         ]
 
         await update_courier_position('courier1', route)
-        return await self.client.scan('fleet').asObjects()
+
+        # The rest of the fleet reports in bulk: several fixes per courier
+        # are coalesced and only the latest one is written
+        fleet_fixes = [(f'courier{i % 100 + 10}', lat + i * 1e-4, lon)
+                       for i, (lat, lon) in enumerate(route * 100)]
+        await self.bulk_update_positions(fleet_fixes)
+
+        # The fleet is read page by page so large fleets never come back
+        # in a single response
+        fleet = []
+        async for page in self.pool.scan_pages('fleet', page_size=100):
+            fleet.extend(page)
+        return fleet
 
 
-async def main():
+async def main(benchmarks=()):
+    """Examples; benchmarks are heavy runs done after them"""
     # Initialize client
     tile38 = Tile38Client()
 
@@ -123,9 +225,25 @@ async def main():
 
     except Exception as e:
         print(f"Error occurred: {e}")
+    else:
+        # Outside the except above: a failing benchmark must not be
+        # reported as an example error
+        if 'bulk' in benchmarks:
+            await bulk_benchmark(tile38.url)
+        if 'index' in benchmarks:
+            await index_benchmark(tile38.client, tile38.url)
+        if 'geofence' in benchmarks:
+            await geofence_benchmark()
+        if 'pool' in benchmarks:
+            await pool_benchmark(tile38.url, tile38.follower_urls)
     finally:
-        await tile38.client.quit()
+        await tile38.close()
 
 
 if __name__ == "__main__":
-    asyncio.run(main())
\ No newline at end of file
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--benchmark', action='append', default=[],
+                        choices=['bulk', 'index', 'geofence', 'pool'],
+                        help='benchmark to run after the examples, '
+                             'may be repeated')
+    asyncio.run(main(parser.parse_args().benchmark))
\ No newline at end of file
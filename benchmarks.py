@@ -0,0 +1,762 @@
+"""Единый набор бенчмарков для примеров 1.py - 8.py
+
+Запуск против сервисов из docker-compose.yml:
+
+    python benchmarks.py --scale 1 --output results.json
+
+против локальных заменителей там, где они есть (fakeredis, mongomock,
+chromadb в памяти, CSR-граф вместо Neo4j, сеточный индекс вместо Tile38):
+
+    python benchmarks.py --stand-ins --backends redis,chroma,neo4j,tile38
+
+и сравнение с сохраненным прогоном:
+
+    python benchmarks.py --output new.json --compare results.json
+
+--instrument добавляет разбивку по командам драйверов (instrumentation.py),
+--prometheus-port и --log-interval - экспорт этих метрик во время прогона.
+"""
+import argparse
+import asyncio
+import importlib.util
+import inspect
+import json
+import os
+import platform
+import sys
+import time
+from datetime import datetime, timedelta
+from typing import Any, Callable, Dict, Optional, Tuple
+
+import numpy as np
+
+from instrumentation import (LogSink, Metrics, PrometheusSink,
+                             instrument_script)
+
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+
+# имя операции -> (функция от номера итерации, число итераций)
+Operations = Dict[str, Tuple[Callable[[int], Any], int]]
+
+
+def load_script(number: int):
+    """Импорт n.py как модуля example_n (имя файла - не идентификатор)"""
+    name = f'example_{number}'
+    if name not in sys.modules:
+        spec = importlib.util.spec_from_file_location(
+            name, os.path.join(SCRIPTS_DIR, f'{number}.py'))
+        module = importlib.util.module_from_spec(spec)
+        sys.modules[name] = module
+        try:
+            spec.loader.exec_module(module)
+        except BaseException:
+            del sys.modules[name]
+            raise
+    return sys.modules[name]
+
+
+def summarize(latencies_ns: np.ndarray, seconds: float) -> Dict[str, float]:
+    ms = latencies_ns / 1e6
+    p50, p95, p99 = np.percentile(ms, [50, 95, 99])
+    return {
+        'count': int(len(ms)),
+        'p50_ms': float(p50),
+        'p95_ms': float(p95),
+        'p99_ms': float(p99),
+        'mean_ms': float(ms.mean()),
+        'max_ms': float(ms.max()),
+        'ops_per_sec': len(ms) / seconds if seconds else 0.0,
+    }
+
+
+def _warmup_count(iterations: int, warmup: float) -> int:
+    return max(1, int(iterations * warmup)) if warmup else 0
+
+
+async def measure(operation: Callable, iterations: int,
+                  warmup: float = 0.1) -> Dict[str, float]:
+    """Задержка каждого вызова и общая пропускная способность
+
+    Прогрев вызывает операцию с номерами после измеряемых, чтобы вставки
+    не конфликтовали по ключам. Синхронные и асинхронные операции
+    измеряются одинаково.
+    """
+    is_async = inspect.iscoroutinefunction(operation)
+    for i in range(_warmup_count(iterations, warmup)):
+        result = operation(iterations + i)
+        if is_async:
+            await result
+
+    latencies = np.empty(iterations, dtype=np.int64)
+    clock = time.perf_counter_ns
+    start = time.perf_counter()
+    for i in range(iterations):
+        began = clock()
+        result = operation(i)
+        if is_async:
+            await result
+        latencies[i] = clock() - began
+    return summarize(latencies, time.perf_counter() - start)
+
+
+class Workload:
+    """Стандартная нагрузка одного хранилища
+
+    setup готовит данные и возвращает операции, teardown убирает за собой.
+    Оба могут быть корутинами. Размеры умножаются на scale, все случайные
+    данные берутся из генератора с фиксированным seed.
+    """
+
+    name = ''
+    script = 0
+    description = ''
+
+    def __init__(self, scale: float = 1.0, seed: int = 42,
+                 stand_in: bool = False):
+        self.scale = scale
+        self.seed = seed
+        self.stand_in = stand_in
+        self.rng = np.random.default_rng(seed)
+
+    def n(self, base: int) -> int:
+        return max(1, int(base * self.scale))
+
+    def picks(self, high: int, size: int) -> list:
+        return self.rng.integers(0, high, size).tolist()
+
+    def setup(self) -> Operations:
+        raise NotImplementedError
+
+    def teardown(self):
+        pass
+
+
+class PostgresWorkload(Workload):
+    name = 'postgres'
+    script = 1
+    description = 'CRUD по users и join заказов'
+
+    def setup(self) -> Operations:
+        from psycopg2.extras import execute_values
+
+        module = load_script(1)
+        self.conn = module.get_connection()
+        module.create_tables(self.conn)
+        self.teardown_rows()
+
+        users = self.n(1000)
+        products = 100
+        with self.conn.cursor() as cur:
+            execute_values(cur, "INSERT INTO users (email, name) VALUES %s",
+                           [(f'bench_{i}@example.com', f'Bench {i}')
+                            for i in range(users)])
+            execute_values(cur, "INSERT INTO products (name, price, stock) "
+                                "VALUES %s",
+                           [(f'bench_product_{i}', 10 + i, 1000)
+                            for i in range(products)])
+            cur.execute("SELECT id FROM users WHERE email LIKE 'bench_%' "
+                        "ORDER BY id")
+            user_ids = [row[0] for row in cur.fetchall()]
+            cur.execute("SELECT id FROM products "
+                        "WHERE name LIKE 'bench_product_%' ORDER BY id")
+            product_ids = [row[0] for row in cur.fetchall()]
+
+            owners = self.picks(users, users * 2)
+            order_ids = [row[0] for row in execute_values(
+                cur, "INSERT INTO orders (user_id, total_amount, status) "
+                     "VALUES %s RETURNING id",
+                [(user_ids[i], 100, 'completed') for i in owners],
+                fetch=True)]
+            items = {(order_id, product_ids[p]) for order_id, p in
+                     zip(order_ids, self.picks(products, len(order_ids)))}
+            execute_values(cur, "INSERT INTO order_items "
+                                "(order_id, product_id, quantity, "
+                                "price_at_time) VALUES %s",
+                           [(o, p, 1, 100) for o, p in items])
+        self.conn.commit()
+
+        iterations = self.n(1000)
+        lookups = self.picks(users, iterations * 2)
+
+        def insert(i):
+            with self.conn.cursor() as cur:
+                cur.execute("INSERT INTO users (email, name) VALUES (%s, %s) "
+                            "RETURNING id", (f'bench_new_{i}@example.com',
+                                             'New'))
+                cur.fetchone()
+            self.conn.commit()
+
+        def select(i):
+            with self.conn.cursor() as cur:
+                cur.execute("SELECT * FROM users WHERE email = %s",
+                            (f'bench_{lookups[i]}@example.com',))
+                cur.fetchone()
+
+        def update(i):
+            with self.conn.cursor() as cur:
+                cur.execute("UPDATE users SET name = %s WHERE email = %s",
+                            (f'Bench {i}', f'bench_{lookups[i]}@example.com'))
+            self.conn.commit()
+
+        def join(i):
+            with self.conn.cursor() as cur:
+                cur.execute("""
+                    SELECT u.name, COUNT(o.id), SUM(o.total_amount)
+                    FROM users u
+                    JOIN orders o ON u.id = o.user_id
+                    JOIN order_items oi ON o.id = oi.order_id
+                    GROUP BY u.id, u.name
+                    ORDER BY 3 DESC
+                    LIMIT 10
+                """)
+                cur.fetchall()
+
+        return {'insert': (insert, iterations),
+                'select_by_email': (select, iterations),
+                'update': (update, iterations),
+                'join_top_customers': (join, self.n(50))}
+
+    def teardown_rows(self):
+        with self.conn.cursor() as cur:
+            cur.execute("""
+                DELETE FROM order_items WHERE order_id IN (
+                    SELECT o.id FROM orders o JOIN users u
+                    ON o.user_id = u.id WHERE u.email LIKE 'bench_%')
+            """)
+            cur.execute("DELETE FROM orders WHERE user_id IN (SELECT id FROM "
+                        "users WHERE email LIKE 'bench_%')")
+            cur.execute("DELETE FROM users WHERE email LIKE 'bench_%'")
+            cur.execute("DELETE FROM products "
+                        "WHERE name LIKE 'bench_product_%'")
+        self.conn.commit()
+
+    def teardown(self):
+        self.teardown_rows()
+        self.conn.close()
+
+
+class MongoWorkload(Workload):
+    name = 'mongo'
+    script = 2
+    description = 'insert_one, find_one, aggregate'
+
+    def setup(self) -> Operations:
+        if self.stand_in:
+            import mongomock
+            self.client = mongomock.MongoClient()
+        else:
+            self.client = load_script(2).get_connection()
+        self.client.drop_database('bench_db')
+        db = self.client.bench_db
+
+        users = self.n(1000)
+        statuses = ['pending', 'completed', 'cancelled']
+        db.users.insert_many([{'email': f'bench_{i}@example.com',
+                               'name': f'Bench {i}'} for i in range(users)])
+        db.users.create_index('email')
+        db.orders.insert_many([
+            {'user_id': int(u), 'total': int(t), 'status': statuses[s]}
+            for u, t, s in zip(self.picks(users, self.n(5000)),
+                               self.picks(2000, self.n(5000)),
+                               self.picks(3, self.n(5000)))])
+        iterations = self.n(1000)
+        lookups = self.picks(users, iterations * 2)
+
+        pipeline = [
+            {'$match': {'status': 'completed'}},
+            {'$group': {'_id': '$user_id', 'total': {'$sum': '$total'}}},
+            {'$sort': {'total': -1}},
+            {'$limit': 10},
+        ]
+        return {
+            'insert_one': (lambda i: db.events.insert_one(
+                {'seq': i, 'created_at': datetime.utcnow()}), iterations),
+            'find_one': (lambda i: db.users.find_one(
+                {'email': f'bench_{lookups[i]}@example.com'}), iterations),
+            'aggregate_top_users': (lambda i: list(
+                db.orders.aggregate(pipeline)), self.n(50)),
+        }
+
+    def teardown(self):
+        self.client.drop_database('bench_db')
+        self.client.close()
+
+
+class InfluxWorkload(Workload):
+    name = 'influx'
+    script = 3
+    description = 'запись пачки точек и агрегирующий Flux-запрос'
+
+    bucket = 'mybucket'
+    measurement = 'bench_readings'
+
+    def setup(self) -> Operations:
+        module = load_script(3)
+        self.client = module.get_client()
+        if not self.client.ping():
+            raise ConnectionError('InfluxDB недоступен')
+        write_api = self.client.write_api(write_options=module.SYNCHRONOUS)
+        query_api = self.client.query_api()
+        self.start = datetime.utcnow() - timedelta(hours=1)
+
+        batch = 100
+        iterations = self.n(200)
+        values = self.rng.normal(20, 1, (iterations * 2, batch))
+
+        def write(i):
+            now = datetime.utcnow()
+            points = [module.Point(self.measurement)
+                      .tag('sensor_id', f'sensor_{j % 10}')
+                      .field('temperature', float(values[i, j]))
+                      .time(now - timedelta(milliseconds=j))
+                      for j in range(batch)]
+            write_api.write(bucket=self.bucket, record=points)
+
+        flux = f'''
+            from(bucket: "{self.bucket}")
+                |> range(start: -1h)
+                |> filter(fn: (r) => r._measurement == "{self.measurement}")
+                |> group(columns: ["sensor_id"])
+                |> mean()
+        '''
+        return {'write_100_points': (write, iterations),
+                'query_mean_by_sensor': (lambda i: query_api.query(flux),
+                                         self.n(50))}
+
+    def teardown(self):
+        self.client.delete_api().delete(
+            self.start, datetime.utcnow() + timedelta(minutes=1),
+            f'_measurement="{self.measurement}"', bucket=self.bucket,
+            org=self.client.org)
+        self.client.close()
+
+
+class ChromaWorkload(Workload):
+    name = 'chroma'
+    script = 4
+    description = 'добавление эмбеддингов и поиск ближайших'
+
+    dim = 128
+
+    def setup(self) -> Operations:
+        if self.stand_in:
+            import chromadb
+            self.client = chromadb.EphemeralClient()
+        else:
+            self.client = load_script(4).get_client()
+        try:
+            self.client.delete_collection('bench')
+        except Exception:
+            pass
+        collection = self.client.create_collection('bench')
+
+        count, batch = self.n(10000), 1000
+        vectors = self.rng.random((count, self.dim), dtype=np.float32)
+        categories = self.picks(10, count)
+        for offset in range(0, count, batch):
+            collection.add(
+                ids=[f'doc_{i}' for i in range(offset,
+                                               min(offset + batch, count))],
+                embeddings=vectors[offset:offset + batch].tolist(),
+                metadatas=[{'category': c}
+                           for c in categories[offset:offset + batch]])
+
+        iterations = self.n(200)
+        new = self.rng.random((iterations * 2, 100, self.dim),
+                              dtype=np.float32)
+        queries = self.rng.random((iterations * 2, self.dim),
+                                  dtype=np.float32)
+        return {
+            'add_100': (lambda i: collection.add(
+                ids=[f'new_{i}_{j}' for j in range(100)],
+                embeddings=new[i].tolist()), iterations),
+            'query_top10': (lambda i: collection.query(
+                query_embeddings=[queries[i].tolist()], n_results=10),
+                iterations),
+            'query_top10_filtered': (lambda i: collection.query(
+                query_embeddings=[queries[i].tolist()], n_results=10,
+                where={'category': i % 10}), iterations),
+        }
+
+    def teardown(self):
+        self.client.delete_collection('bench')
+
+
+class Neo4jWorkload(Workload):
+    name = 'neo4j'
+    script = 5
+    description = 'поиск по ключу и обход друзей друзей'
+
+    def setup(self) -> Operations:
+        people, edges = self.n(10000), self.n(50000)
+        iterations = self.n(500)
+        names = [f'person_{i}' for i in self.picks(people, iterations * 4)]
+
+        if self.stand_in:
+            from graph_analytics import synthetic_graph
+            graph = synthetic_graph(people, edges, seed=self.seed)
+            self.connection = None
+            return {
+                'friends_of_friends': (
+                    lambda i: graph.friends_of_friends(names[i]),
+                    iterations),
+                'shortest_path': (lambda i: graph.shortest_path(
+                    names[2 * i], names[2 * i + 1]), iterations),
+            }
+
+        from neo4j_bulk_loader import (GraphBulkLoader, synthetic_friendships,
+                                       synthetic_people)
+
+        module = load_script(5)
+        self.connection = module.Neo4jConnection(
+            uri="bolt://localhost:7687", user="neo4j", password="test1234")
+        self.teardown_graph()
+        loader = GraphBulkLoader(self.connection)
+        loader.ensure_schema()
+        loader.load_people(synthetic_people(people, seed=self.seed))
+        loader.load_friendships(
+            synthetic_friendships(people, edges, seed=self.seed))
+
+        friends_of_friends = module.FRIENDS_OF_FRIENDS_QUERY.replace(
+            "'Alice'", "$name")
+        lookup = "MATCH (p:Person {name: $name}) RETURN p.age as age"
+        return {
+            'lookup_by_name': (lambda i: self.connection.execute_read(
+                lookup, {'name': names[i]}), iterations),
+            'friends_of_friends': (lambda i: self.connection.execute_read(
+                friends_of_friends, {'name': names[i]}), iterations),
+        }
+
+    def teardown_graph(self):
+        self.connection.run_query("""
+            MATCH (p:Person) WHERE p.name STARTS WITH 'person_'
+            CALL { WITH p DETACH DELETE p } IN TRANSACTIONS OF 10000 ROWS
+        """)
+
+    def teardown(self):
+        if self.connection is not None:
+            self.teardown_graph()
+            self.connection.close()
+
+
+class ClickHouseWorkload(Workload):
+    name = 'clickhouse'
+    script = 6
+    description = 'колоночная вставка блоков и аналитические запросы'
+
+    database = 'bench'
+
+    def setup(self) -> Operations:
+        from clickhouse_data import generate_blocks, insert_block
+
+        module = load_script(6)
+        admin = module.get_client()
+        try:
+            admin.execute(f'CREATE DATABASE IF NOT EXISTS {self.database}')
+        finally:
+            admin.disconnect()
+        self.client = module.get_client(database=self.database)
+        module.create_tables(self.client)
+
+        iterations = self.n(20)
+        blocks = list(generate_blocks('user_actions', 10000 * iterations * 2,
+                                      block_size=10000, seed=self.seed))
+        return {
+            'insert_10k_rows': (lambda i: insert_block(
+                self.client, 'user_actions', blocks[i]), iterations),
+            'hourly_activity': (lambda i: self.client.execute(
+                module.HOURLY_ACTIVITY_QUERY), self.n(50)),
+            'platform_country': (lambda i: self.client.execute(
+                module.PLATFORM_COUNTRY_QUERY), self.n(50)),
+        }
+
+    def teardown(self):
+        self.client.execute(f'DROP DATABASE IF EXISTS {self.database}')
+        self.client.disconnect()
+
+
+class RedisWorkload(Workload):
+    name = 'redis'
+    script = 7
+    description = 'SET/GET, MSET/MGET по 100 ключей, ZINCRBY'
+
+    def setup(self) -> Operations:
+        module = load_script(7)
+        client = None
+        if self.stand_in:
+            import fakeredis
+            client = fakeredis.FakeRedis(decode_responses=True)
+        self.example = module.RedisExample(client=client)
+        self.example.redis.ping()
+        redis = self.example.redis
+
+        keys = self.n(10000)
+        self.example.mset({f'bench:key:{i}': 'x' * 100
+                           for i in range(keys)})
+        iterations = self.n(5000)
+        lookups = self.picks(keys, iterations * 2)
+        batches = [[f'bench:key:{k}' for k in self.picks(keys, 100)]
+                   for _ in range(self.n(200) * 2)]
+        players = self.picks(keys, iterations * 2)
+        return {
+            'set': (lambda i: redis.set(f'bench:key:{lookups[i]}', 'y' * 100),
+                    iterations),
+            'get': (lambda i: redis.get(f'bench:key:{lookups[i]}'),
+                    iterations),
+            'mset_100': (lambda i: self.example.mset(
+                dict.fromkeys(batches[i], 'z' * 100)), self.n(200)),
+            'mget_100': (lambda i: self.example.mget(batches[i]),
+                         self.n(200)),
+            'zincrby': (lambda i: redis.zincrby(
+                'bench:leaderboard', 1, f'player{players[i]}'), iterations),
+        }
+
+    def teardown(self):
+        redis = self.example.redis
+        with redis.pipeline(transaction=False) as pipe:
+            for key in redis.scan_iter('bench:*', count=1000):
+                pipe.delete(key)
+            pipe.execute()
+
+
+class Tile38Workload(Workload):
+    name = 'tile38'
+    script = 8
+    description = 'SET точки, пакетный SET, NEARBY'
+
+    key = 'bench:fleet'
+
+    async def setup(self) -> Operations:
+        from spatial_index import PointIndex, synthetic_points
+
+        count = self.n(100000)
+        ids, lats, lons = synthetic_points(count, seed=self.seed)
+        iterations = self.n(1000)
+        centers = self.picks(count, iterations * 2)
+        radius = 1000
+
+        if self.stand_in:
+            self.tile38 = None
+            index = PointIndex(ids, lats, lons)
+            side = radius / 111320
+            return {
+                'nearby': (lambda i: index.nearby(
+                    lats[centers[i]], lons[centers[i]], radius), iterations),
+                'within_box': (lambda i: index.within([
+                    [lons[centers[i]] - side, lats[centers[i]] - side],
+                    [lons[centers[i]] + side, lats[centers[i]] - side],
+                    [lons[centers[i]] + side, lats[centers[i]] + side],
+                    [lons[centers[i]] - side, lats[centers[i]] + side],
+                    [lons[centers[i]] - side, lats[centers[i]] - side]]),
+                    iterations),
+            }
+
+        self.tile38 = load_script(8).Tile38Client()
+        pool = self.tile38.pool
+        await pool.write('DROP', self.key)
+        await self.tile38.bulk_update_positions(
+            zip(ids, lats.tolist(), lons.tolist()), key=self.key)
+
+        moves = self.rng.normal(0, 0.001, (iterations * 2, 1000, 2))
+
+        async def set_point(i):
+            j = centers[i]
+            await pool.set_point(self.key, ids[j], lats[j], lons[j])
+
+        async def bulk_set(i):
+            fixes = [(ids[(i * 1000 + j) % count],
+                      lats[(i * 1000 + j) % count] + moves[i, j, 0],
+                      lons[(i * 1000 + j) % count] + moves[i, j, 1])
+                     for j in range(1000)]
+            await self.tile38.bulk_update_positions(fixes, key=self.key)
+
+        async def nearby(i):
+            j = centers[i]
+            await pool.nearby(self.key, lats[j], lons[j], radius, limit=100)
+
+        return {'set_point': (set_point, iterations),
+                'bulk_set_1000': (bulk_set, self.n(50)),
+                'nearby': (nearby, iterations)}
+
+    async def teardown(self):
+        if self.tile38 is not None:
+            await self.tile38.pool.write('DROP', self.key)
+            await self.tile38.close()
+
+
+WORKLOADS = {workload.name: workload for workload in (
+    PostgresWorkload, MongoWorkload, InfluxWorkload, ChromaWorkload,
+    Neo4jWorkload, ClickHouseWorkload, RedisWorkload, Tile38Workload)}
+
+# Хранилища, для которых есть локальный заменитель
+STAND_INS = {'mongo', 'chroma', 'neo4j', 'redis', 'tile38'}
+
+
+async def _maybe_await(value):
+    if inspect.isawaitable(value):
+        return await value
+    return value
+
+
+async def run_workload(workload: Workload, warmup: float) -> Dict:
+    """Все операции одной нагрузки; недоступное хранилище - пропуск"""
+    try:
+        operations = await _maybe_await(workload.setup())
+    except Exception as e:
+        return {'skipped': f'{type(e).__name__}: {e}'}
+
+    results = {}
+    try:
+        for name, (operation, iterations) in operations.items():
+            results[name] = await measure(operation, iterations, warmup)
+    finally:
+        try:
+            await _maybe_await(workload.teardown())
+        except Exception as e:
+            print(f"  очистка {workload.name} не удалась: {e}")
+    return results
+
+
+def print_results(backend: str, results: Dict):
+    if 'skipped' in results:
+        print(f"\n{backend}: пропущен ({results['skipped']})")
+        return
+    print(f"\n{backend}")
+    print(f"{'Операция':<24}{'p50, мс':>10}{'p95, мс':>10}{'p99, мс':>10}"
+          f"{'оп/сек':>12}")
+    for name, stats in results.items():
+        print(f"{name:<24}{stats['p50_ms']:>10.3f}{stats['p95_ms']:>10.3f}"
+              f"{stats['p99_ms']:>10.3f}{stats['ops_per_sec']:>12.0f}")
+
+
+def compare(baseline: Dict, current: Dict, threshold: float = 0.1) -> int:
+    """Сравнение p95 и пропускной способности с прошлым прогоном
+
+    Возвращает число операций, ухудшившихся больше чем на threshold.
+    Результаты заменителей хранятся под именем 'хранилище[stand-in]' и с
+    настоящими сервисами не сравниваются.
+    """
+    regressions = 0
+    was = baseline.get('meta', {}).get('stand_ins')
+    now = current.get('meta', {}).get('stand_ins')
+    if was != now:
+        print(f"\nВнимание: stand_ins было {was}, стало {now} - "
+              f"сравниваются только совпадающие хранилища")
+    print(f"\n{'Операция':<36}{'p95 было':>10}{'стало':>10}"
+          f"{'оп/сек было':>13}{'стало':>10}")
+    for backend, results in current['results'].items():
+        if backend not in baseline.get('results', {}):
+            print(f"{backend}: нет в прошлом прогоне")
+            continue
+        old_results = baseline['results'][backend]
+        for name, stats in results.items():
+            old = old_results.get(name)
+            if not isinstance(stats, dict) or not isinstance(old, dict):
+                continue
+            slower = stats['p95_ms'] > old['p95_ms'] * (1 + threshold)
+            fewer = stats['ops_per_sec'] < old['ops_per_sec'] * (1 - threshold)
+            mark = '  <- регрессия' if slower or fewer else ''
+            regressions += bool(mark)
+            print(f"{backend + '.' + name:<36}{old['p95_ms']:>10.3f}"
+                  f"{stats['p95_ms']:>10.3f}{old['ops_per_sec']:>13.0f}"
+                  f"{stats['ops_per_sec']:>10.0f}{mark}")
+    return regressions
+
+
+async def run(backends, scale: float = 1.0, seed: int = 42,
+              warmup: float = 0.1, stand_ins: bool = False,
+              metrics: Optional[Metrics] = None) -> Dict:
+    report = {
+        'meta': {
+            'started': datetime.now().isoformat(),
+            'scale': scale,
+            'seed': seed,
+            'warmup': warmup,
+            'stand_ins': stand_ins,
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+        },
+        'results': {},
+    }
+    for backend in backends:
+        workload = WORKLOADS[backend](scale, seed,
+                                      stand_ins and backend in STAND_INS)
+        if metrics is not None:
+            try:
+                instrument_script(workload.script,
+                                  load_script(workload.script), metrics)
+            except Exception:
+                pass  # недоступный драйвер - нагрузка сама будет пропущена
+        print(f"\n=== {backend} ({workload.script}.py): "
+              f"{workload.description} ===")
+        results = await run_workload(workload, warmup)
+        # Заменитель измеряет другое, его нельзя спутать с сервисом
+        name = f'{backend}[stand-in]' if workload.stand_in else backend
+        report['results'][name] = results
+        print_results(name, results)
+    if metrics is not None:
+        report['instrumentation'] = metrics.snapshot()
+    return report
+
+
+def main(argv: Optional[list] = None) -> int:
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backends', default=','.join(WORKLOADS),
+                        help='список через запятую: ' + ', '.join(WORKLOADS))
+    parser.add_argument('--scale', type=float, default=1.0,
+                        help='множитель объема данных и числа итераций')
+    parser.add_argument('--seed', type=int, default=42)
+    parser.add_argument('--warmup', type=float, default=0.1,
+                        help='доля итераций на прогрев')
+    parser.add_argument('--stand-ins', action='store_true',
+                        help='локальные заменители вместо сервисов')
+    parser.add_argument('--output', help='файл для результатов в JSON')
+    parser.add_argument('--compare', help='JSON прошлого прогона')
+    parser.add_argument('--threshold', type=float, default=0.1,
+                        help='допустимое ухудшение при сравнении')
+    parser.add_argument('--instrument', action='store_true',
+                        help='задержки по командам драйверов')
+    parser.add_argument('--sample-every', type=int, default=1,
+                        help='замерять каждый N-й вызов драйвера')
+    parser.add_argument('--prometheus-port', type=int,
+                        help='отдавать метрики на :PORT/metrics')
+    parser.add_argument('--log-interval', type=float,
+                        help='печатать метрики каждые N секунд')
+    args = parser.parse_args(argv)
+
+    backends = [b.strip() for b in args.backends.split(',') if b.strip()]
+    unknown = set(backends) - set(WORKLOADS)
+    if unknown:
+        parser.error(f"неизвестные хранилища: {', '.join(sorted(unknown))}")
+
+    metrics = sinks = None
+    if args.instrument or args.prometheus_port or args.log_interval:
+        metrics = Metrics(args.sample_every)
+        sinks = []
+        if args.prometheus_port:
+            sinks.append(PrometheusSink(metrics, args.prometheus_port).start())
+        if args.log_interval:
+            sinks.append(LogSink(metrics, args.log_interval).start())
+
+    report = asyncio.run(run(backends, args.scale, args.seed, args.warmup,
+                             args.stand_ins, metrics))
+    if metrics is not None:
+        print()
+        metrics.report()
+        for sink in sinks:
+            sink.stop()
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2, ensure_ascii=False)
+        print(f"\nРезультаты записаны в {args.output}")
+
+    if args.compare:
+        with open(args.compare) as f:
+            baseline = json.load(f)
+        if compare(baseline, report, args.threshold):
+            return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,621 @@
+"""Потоковый перенос изменений orders/order_items (1.py) в ClickHouse
+
+Изменения читаются инкрементально по водяному знаку (updated_at, ключ):
+триггер обновляет updated_at при каждом UPDATE, а пакеты выбираются по
+индексу (updated_at, ключ) keyset-пагинацией. Пакет превращается в
+колоночный блок и вставляется в ReplacingMergeTree с версией updated_at,
+поэтому повторная доставка строки заменяет, а не дублирует ее. Токен
+дедупликации блока строится из границ пакета: повтор того же пакета после
+сбоя ClickHouse отбрасывает целиком.
+
+Водяной знак не хранится отдельно - при старте он берется из целевой
+таблицы (последняя вставленная строка), а вставки одной таблицы идут
+строго по порядку. Удаления таким способом не видны; если они нужны,
+источником должно быть логическое декодирование (pgoutput/wal2json).
+
+Запуск против контейнеров из docker-compose:
+
+    python cdc_pipeline.py --backfill 200000 --rate 2000 --duration 30
+"""
+import argparse
+import queue
+import threading
+import time
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from clickhouse_ingest import ClickHousePool, enable_deduplication
+
+# Начальный водяной знак для пустой целевой таблицы
+EPOCH = datetime(1970, 1, 1)
+
+ORDER_STATUSES = ['new', 'paid', 'shipped', 'completed', 'cancelled']
+
+# source -> ключ, выражения выборки (в порядке columns) и DDL приемника.
+# NULL из необязательных колонок Postgres заменяются, чтобы не делать
+# колонки ClickHouse Nullable.
+CDC_TABLES = {
+    'orders': {
+        'key': ['id'],
+        'columns': ['id', 'user_id', 'total_amount', 'status', 'created_at',
+                    'updated_at'],
+        'select': ['id', 'coalesce(user_id, 0)', 'total_amount', 'status',
+                   'coalesce(created_at, updated_at)', 'updated_at'],
+        'ddl': '''
+            CREATE TABLE IF NOT EXISTS {target} (
+                id UInt32,
+                user_id UInt32,
+                total_amount Decimal(10, 2),
+                status LowCardinality(String),
+                created_at DateTime64(6),
+                updated_at DateTime64(6)
+            )
+            ENGINE = ReplacingMergeTree(updated_at)
+            PARTITION BY toYYYYMM(created_at)
+            ORDER BY id
+        ''',
+    },
+    'order_items': {
+        'key': ['order_id', 'product_id'],
+        'columns': ['order_id', 'product_id', 'quantity', 'price_at_time',
+                    'updated_at'],
+        'select': ['order_id', 'product_id', 'quantity', 'price_at_time',
+                   'updated_at'],
+        'ddl': '''
+            CREATE TABLE IF NOT EXISTS {target} (
+                order_id UInt32,
+                product_id UInt32,
+                quantity UInt32,
+                price_at_time Decimal(10, 2),
+                updated_at DateTime64(6)
+            )
+            ENGINE = ReplacingMergeTree(updated_at)
+            ORDER BY (order_id, product_id)
+        ''',
+    },
+}
+
+REVENUE_BY_STATUS_QUERY = '''
+    SELECT
+        o.status,
+        count() as orders,
+        sum(o.total_amount) as revenue,
+        sum(i.items) as items
+    FROM {orders} AS o FINAL
+    LEFT JOIN (
+        SELECT order_id, sum(quantity) as items
+        FROM {order_items} FINAL
+        GROUP BY order_id
+    ) AS i ON i.order_id = o.id
+    GROUP BY o.status
+    ORDER BY revenue DESC
+'''
+
+
+def enable_change_tracking(conn, tables: Sequence[str] = tuple(CDC_TABLES)):
+    """Колонка updated_at, триггер и индекс для инкрементального чтения
+
+    clock_timestamp(), а не now(): время изменения строки, а не начала
+    транзакции, иначе долгие транзакции отставали бы от водяного знака.
+    """
+    with conn.cursor() as cur:
+        cur.execute("""
+            CREATE OR REPLACE FUNCTION cdc_touch_updated_at()
+            RETURNS trigger AS $$
+            BEGIN
+                NEW.updated_at := clock_timestamp();
+                RETURN NEW;
+            END
+            $$ LANGUAGE plpgsql
+        """)
+        for table in tables:
+            key = ', '.join(CDC_TABLES[table]['key'])
+            cur.execute(f"""
+                ALTER TABLE {table} ADD COLUMN IF NOT EXISTS updated_at
+                TIMESTAMP NOT NULL DEFAULT clock_timestamp()
+            """)
+            cur.execute(f"DROP TRIGGER IF EXISTS {table}_cdc_touch "
+                        f"ON {table}")
+            cur.execute(f"""
+                CREATE TRIGGER {table}_cdc_touch
+                BEFORE UPDATE ON {table}
+                FOR EACH ROW EXECUTE FUNCTION cdc_touch_updated_at()
+            """)
+            cur.execute(f"CREATE INDEX IF NOT EXISTS {table}_cdc_idx "
+                        f"ON {table} (updated_at, {key})")
+    conn.commit()
+
+
+class TableSync:
+    """Перенос изменений одной таблицы
+
+    Поток чтения выбирает пакеты из Postgres и кладет их в короткую
+    очередь, вставка идет в вызывающем потоке - чтение следующего пакета
+    перекрывается с вставкой текущего. Читаются только строки старше
+    settle секунд: так транзакции, еще не зафиксированные на момент
+    чтения, не оказываются позади водяного знака (транзакции длиннее
+    settle все же могут быть пропущены). После неполного пакета читатель
+    ждет poll_interval, чтобы при слабом потоке изменений не делать
+    вставку на каждые несколько строк.
+    """
+
+    def __init__(self, source: str, pg_factory: Callable,
+                 pool: ClickHousePool, target: Optional[str] = None,
+                 batch_size: int = 50000, settle: float = 1.0,
+                 poll_interval: float = 0.2, retries: int = 3,
+                 backoff: float = 0.5):
+        spec = CDC_TABLES[source]
+        self.source = source
+        self.target = target or f'cdc_{source}'
+        self.key = spec['key']
+        self.columns = spec['columns']
+        self.select = spec['select']
+        self.pg_factory = pg_factory
+        self.pool = pool
+        self.batch_size = batch_size
+        self.settle = settle
+        self.poll_interval = poll_interval
+        self.retries = retries
+        self.backoff = backoff
+
+        self.watermark: Tuple = (EPOCH,) + (0,) * len(self.key)
+        # Начало последнего пустого чтения после того, как все прочитанное
+        # вставлено: изменения до synced_at - settle уже в ClickHouse
+        self.synced_at = 0.0
+        # Задержка каждого пакета: от самого старого изменения в нем до
+        # окончания вставки
+        self.lags = deque(maxlen=100000)
+        self.stats = {'rows': 0, 'batches': 0, 'retries': 0,
+                      'insert_seconds': 0.0}
+        self._lock = threading.Lock()
+
+    def prepare(self):
+        """Таблица-приемник и водяной знак по уже перенесенным строкам"""
+        key = ', '.join(self.key)
+        with self.pool.connection() as client:
+            client.execute(CDC_TABLES[self.source]['ddl'].format(
+                target=self.target))
+            enable_deduplication(client, self.target)
+            last = client.execute(
+                f"SELECT updated_at, {key} FROM {self.target} "
+                f"ORDER BY updated_at DESC, "
+                f"{', '.join(k + ' DESC' for k in self.key)} LIMIT 1")
+        if last:
+            self.watermark = tuple(last[0])
+        return self
+
+    def _query(self) -> str:
+        key = ', '.join(self.key)
+        after = ', '.join(['%s'] * (len(self.key) + 1))
+        return f"""
+            SELECT {', '.join(self.select)}
+            FROM {self.source}
+            WHERE (updated_at, {key}) > ({after}) AND updated_at < %s
+            ORDER BY updated_at, {key}
+            LIMIT %s
+        """
+
+    def pull(self, conn, after: Tuple) -> Optional[Dict]:
+        """Следующий пакет после водяного знака after в колоночном виде"""
+        with conn.cursor() as cur:
+            cur.execute("SELECT clock_timestamp()::timestamp")
+            pg_now = cur.fetchone()[0]
+            read_at = time.perf_counter()
+            cur.execute(self._query(),
+                        (*after, pg_now - timedelta(seconds=self.settle),
+                         self.batch_size))
+            rows = cur.fetchall()
+        # Снимок читается без открытой транзакции между пакетами
+        conn.rollback()
+        if not rows:
+            return None
+
+        updated = self.columns.index('updated_at')
+        key = [self.columns.index(k) for k in self.key]
+        first, last = rows[0], rows[-1]
+        return {
+            'columns': [list(column) for column in zip(*rows)],
+            'rows': len(rows),
+            'after': after,
+            'last': (last[updated], *(last[i] for i in key)),
+            # Задержка самой старой строки на момент чтения, по часам
+            # Postgres - расхождение часов машин на нее не влияет
+            'lag_at_read': (pg_now - first[updated]).total_seconds(),
+            'read_at': read_at,
+        }
+
+    def token(self, batch: Dict) -> str:
+        """Один и тот же пакет всегда получает один и тот же токен"""
+        bounds = [str(value) for value in (*batch['after'], *batch['last'])]
+        return f"{self.target}-{'-'.join(bounds)}"
+
+    def insert(self, batch: Dict) -> int:
+        settings = {'insert_deduplicate': 1,
+                    'insert_deduplication_token': self.token(batch)}
+        for attempt in range(self.retries + 1):
+            try:
+                with self.pool.connection() as client:
+                    client.execute(
+                        f"INSERT INTO {self.target} "
+                        f"({', '.join(self.columns)}) VALUES",
+                        batch['columns'], columnar=True, settings=settings)
+                return attempt
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def _read(self, batches: queue.Queue, stop: threading.Event,
+              errors: List):
+        conn = self.pg_factory()
+        try:
+            after = self.watermark
+            while not stop.is_set():
+                pulled_at = time.perf_counter()
+                batch = self.pull(conn, after)
+                if batch is None:
+                    # Догнали источник, когда вставлен последний пакет
+                    batches.join()
+                    self.synced_at = pulled_at
+                    stop.wait(self.poll_interval)
+                    continue
+                after = batch['last']
+                batches.put(batch)
+                if batch['rows'] < self.batch_size:
+                    # Источник почти догнан: копим изменения до следующего
+                    # чтения вместо мелких вставок
+                    stop.wait(self.poll_interval)
+        except Exception as e:
+            errors.append(e)
+        finally:
+            batches.put(None)
+            conn.close()
+
+    def snapshot(self) -> Tuple[Dict, List[float]]:
+        """Согласованная копия счетчиков и задержек"""
+        with self._lock:
+            return dict(self.stats), list(self.lags)
+
+    def run(self, stop: threading.Event):
+        """Переносит изменения, пока не выставлен stop"""
+        batches = queue.Queue(maxsize=2)
+        errors = []
+        reader = threading.Thread(target=self._read,
+                                  args=(batches, stop, errors), daemon=True)
+        reader.start()
+        try:
+            while True:
+                batch = batches.get()
+                if batch is None:
+                    break
+                try:
+                    start = time.perf_counter()
+                    retried = self.insert(batch)
+                    done = time.perf_counter()
+                except Exception as e:
+                    errors.append(e)
+                    stop.set()
+                    batches.task_done()
+                    break
+                # Водяной знак двигается только после успешной вставки
+                self.watermark = batch['last']
+                with self._lock:
+                    self.lags.append(batch['lag_at_read']
+                                     + done - batch['read_at'])
+                    self.stats['rows'] += batch['rows']
+                    self.stats['batches'] += 1
+                    self.stats['retries'] += retried
+                    self.stats['insert_seconds'] += done - start
+                batches.task_done()
+        finally:
+            stop.set()
+            # Читатель мог заблокироваться на полной очереди
+            while reader.is_alive():
+                try:
+                    batches.get(timeout=0.1)
+                    batches.task_done()
+                except queue.Empty:
+                    pass
+            reader.join()
+        if errors:
+            raise errors[0]
+
+
+class CdcPipeline:
+    """Перенос orders и order_items, по потоку на таблицу"""
+
+    def __init__(self, pg_factory: Callable, ch_factory: Callable,
+                 tables: Sequence[str] = tuple(CDC_TABLES),
+                 batch_size: int = 50000, settle: float = 1.0,
+                 poll_interval: float = 0.2):
+        self.pool = ClickHousePool(ch_factory, size=len(tables))
+        self.syncs = [TableSync(table, pg_factory, self.pool,
+                                batch_size=batch_size, settle=settle,
+                                poll_interval=poll_interval)
+                      for table in tables]
+        self.stop_event = threading.Event()
+        self.threads: List[threading.Thread] = []
+        self.errors: List[Exception] = []
+        self.started = 0.0
+
+    def _run(self, sync: TableSync):
+        try:
+            sync.run(self.stop_event)
+        except Exception as e:
+            self.errors.append(e)
+
+    def start(self):
+        for sync in self.syncs:
+            sync.prepare()
+        self.stop_event.clear()
+        self.started = time.perf_counter()
+        self.threads = [threading.Thread(target=self._run, args=(sync,),
+                                         daemon=True)
+                        for sync in self.syncs]
+        for thread in self.threads:
+            thread.start()
+        return self
+
+    def wait_caught_up(self, timeout: Optional[float] = None) -> bool:
+        """Ждет, пока в ClickHouse не окажутся все изменения до вызова"""
+        since = time.perf_counter()
+        while any(sync.synced_at < since + sync.settle
+                  for sync in self.syncs):
+            if self.errors:
+                raise self.errors[0]
+            if timeout is not None and time.perf_counter() - since > timeout:
+                return False
+            time.sleep(0.05)
+        return True
+
+    def stop(self):
+        self.stop_event.set()
+        for thread in self.threads:
+            thread.join()
+        self.pool.close()
+        if self.errors:
+            raise self.errors[0]
+
+    def snapshot(self) -> Dict:
+        """Точка отсчета для report: время и счетчики таблиц"""
+        return {'at': time.perf_counter(),
+                'syncs': {sync.source: sync.snapshot()[0]
+                          for sync in self.syncs}}
+
+    def report(self, since: Optional[Dict] = None
+               ) -> Dict[str, Dict[str, float]]:
+        """Строк/сек и перцентили задержки по таблицам
+
+        Считается с момента старта или, если передан since, с момента
+        снимка snapshot() - счетчики потоков переноса при этом не
+        сбрасываются.
+        """
+        elapsed = time.perf_counter() - (since['at'] if since
+                                         else self.started)
+        result = {}
+        for sync in self.syncs:
+            stats, lags = sync.snapshot()
+            if since:
+                base = since['syncs'][sync.source]
+                stats = {name: value - base[name]
+                         for name, value in stats.items()}
+                # Задержки пакетов после снимка - последние в очереди
+                lags = lags[len(lags) - min(len(lags), stats['batches']):]
+            lags = np.array(lags) if lags else np.zeros(1)
+            result[sync.source] = {
+                'rows': stats['rows'],
+                'batches': stats['batches'],
+                'retries': stats['retries'],
+                'rows_per_sec': stats['rows'] / elapsed
+                if elapsed else 0.0,
+                'insert_rows_per_sec': stats['rows']
+                / stats['insert_seconds']
+                if stats['insert_seconds'] else 0.0,
+                'lag_p50': float(np.percentile(lags, 50)),
+                'lag_p95': float(np.percentile(lags, 95)),
+                'lag_max': float(lags.max()),
+            }
+        return result
+
+
+def print_report(report: Dict[str, Dict[str, float]], title: str):
+    print(f"\n{title}")
+    print(f"{'Таблица':<14}{'строк':>10}{'строк/сек':>12}{'пакетов':>9}"
+          f"{'лаг p50':>10}{'лаг p95':>10}{'лаг max':>10}")
+    for table, stats in report.items():
+        print(f"{table:<14}{stats['rows']:>10}{stats['rows_per_sec']:>12.0f}"
+              f"{stats['batches']:>9}{stats['lag_p50']:>9.2f}s"
+              f"{stats['lag_p95']:>9.2f}s{stats['lag_max']:>9.2f}s")
+
+
+class OrderLoad:
+    """Нагрузка на orders/order_items: новые заказы и смена статусов"""
+
+    def __init__(self, conn, users: int = 1000, products: int = 200,
+                 items_per_order: int = 3, seed: int = 42):
+        from psycopg2.extras import execute_values
+
+        self.conn = conn
+        self.execute_values = execute_values
+        self.items_per_order = items_per_order
+        self.rng = np.random.default_rng(seed)
+        self.recent = deque(maxlen=100000)
+
+        with conn.cursor() as cur:
+            execute_values(cur, "INSERT INTO users (email, name) VALUES %s "
+                                "ON CONFLICT (email) DO NOTHING",
+                           [(f'cdc_{i}@example.com', f'CDC {i}')
+                            for i in range(users)])
+            cur.execute("SELECT count(*) FROM products "
+                        "WHERE name LIKE 'cdc_product_%'")
+            if not cur.fetchone()[0]:
+                execute_values(cur, "INSERT INTO products "
+                                    "(name, price, stock) VALUES %s",
+                               [(f'cdc_product_{i}', 10 + i % 90, 1000)
+                                for i in range(products)])
+            cur.execute("SELECT id FROM users WHERE email LIKE 'cdc_%' "
+                        "ORDER BY id")
+            self.user_ids = [row[0] for row in cur.fetchall()]
+            cur.execute("SELECT id FROM products "
+                        "WHERE name LIKE 'cdc_product_%' ORDER BY id")
+            self.product_ids = [row[0] for row in cur.fetchall()]
+        conn.commit()
+
+    def insert_orders(self, count: int) -> int:
+        """count новых заказов с позициями, возвращает число строк"""
+        owners = self.rng.integers(0, len(self.user_ids), count).tolist()
+        with self.conn.cursor() as cur:
+            order_ids = [row[0] for row in self.execute_values(
+                cur, "INSERT INTO orders (user_id, total_amount, status) "
+                     "VALUES %s RETURNING id",
+                [(self.user_ids[i], 0, 'new') for i in owners],
+                fetch=True, page_size=1000)]
+            items = []
+            for order_id in order_ids:
+                picked = self.rng.choice(len(self.product_ids),
+                                         self.items_per_order, replace=False)
+                items.extend((order_id, self.product_ids[p],
+                              int(self.rng.integers(1, 5)), 10 + p % 90)
+                             for p in picked.tolist())
+            self.execute_values(
+                cur, "INSERT INTO order_items "
+                     "(order_id, product_id, quantity, price_at_time) "
+                     "VALUES %s", items, page_size=1000)
+            cur.execute("""
+                UPDATE orders o SET total_amount = s.total
+                FROM (SELECT order_id, sum(quantity * price_at_time) as total
+                      FROM order_items WHERE order_id = ANY(%s)
+                      GROUP BY order_id) s
+                WHERE o.id = s.order_id
+            """, (order_ids,))
+        self.conn.commit()
+        self.recent.extend(order_ids)
+        return len(order_ids) + len(items)
+
+    def update_statuses(self, count: int) -> int:
+        """Смена статуса count случайных недавних заказов"""
+        if not self.recent:
+            return 0
+        picked = self.rng.integers(0, len(self.recent), count).tolist()
+        ids = sorted({self.recent[i] for i in picked})
+        statuses = self.rng.choice(ORDER_STATUSES[1:], len(ids)).tolist()
+        with self.conn.cursor() as cur:
+            self.execute_values(
+                cur, "UPDATE orders o SET status = v.status "
+                     "FROM (VALUES %s) AS v (id, status) WHERE o.id = v.id",
+                list(zip(ids, statuses)), page_size=1000)
+        self.conn.commit()
+        return len(ids)
+
+    def run(self, rate: float, duration: float, update_share: float = 0.2,
+            tick: float = 0.1) -> int:
+        """rate заказов в секунду в течение duration секунд"""
+        changed = 0
+        start = time.perf_counter()
+        ticks = 0
+        while time.perf_counter() - start < duration:
+            ticks += 1
+            per_tick = max(1, int(rate * tick))
+            changed += self.insert_orders(per_tick)
+            changed += self.update_statuses(int(per_tick * update_share))
+            pause = start + ticks * tick - time.perf_counter()
+            if pause > 0:
+                time.sleep(pause)
+        return changed
+
+
+def revenue_by_status(client, orders: str = 'cdc_orders',
+                      order_items: str = 'cdc_order_items'):
+    """Аналитика по заказам из ClickHouse вместо OLTP-базы"""
+    return client.execute(REVENUE_BY_STATUS_QUERY.format(
+        orders=orders, order_items=order_items))
+
+
+def benchmark(pg_factory: Callable, ch_factory: Callable,
+              backfill: int = 200000, rate: float = 2000,
+              duration: float = 30, batch_size: int = 50000,
+              settle: float = 1.0, seed: int = 42,
+              timeout: float = 60) -> Dict[str, Dict]:
+    """Начальная загрузка и установившийся поток: строк/сек и задержка
+
+    Если после нагрузки перенос не догоняет источник за timeout секунд,
+    выбрасывается TimeoutError - отчет по неполному переносу был бы
+    неверным.
+    """
+    conn = pg_factory()
+    try:
+        enable_change_tracking(conn)
+        load = OrderLoad(conn, seed=seed)
+        start = time.perf_counter()
+        for offset in range(0, backfill, 10000):
+            load.insert_orders(min(10000, backfill - offset))
+        print(f"\nВ Postgres записано {backfill} заказов за "
+              f"{time.perf_counter() - start:.2f} сек")
+
+        pipeline = CdcPipeline(pg_factory, ch_factory,
+                               batch_size=batch_size, settle=settle)
+        pipeline.start()
+        try:
+            pipeline.wait_caught_up()
+            initial = pipeline.report()
+            print_report(initial, 'Начальная загрузка')
+
+            # Установившийся режим считается отдельно от начальной загрузки
+            since = pipeline.snapshot()
+            changed = load.run(rate, duration)
+            if not pipeline.wait_caught_up(timeout=timeout):
+                raise TimeoutError(
+                    f"Перенос не догнал Postgres за {timeout:.0f} сек "
+                    f"после нагрузки: {pipeline.report(since)}")
+            streaming = pipeline.report(since)
+            print_report(streaming, f'Поток {rate:.0f} заказов/сек, '
+                                    f'{changed} измененных строк')
+        finally:
+            pipeline.stop()
+
+        client = ch_factory()
+        try:
+            print("\nВыручка по статусам (ClickHouse):")
+            for status, orders, revenue, items in revenue_by_status(client):
+                print(f"{status:<12}{orders:>10}{revenue:>16}{items:>10}")
+        finally:
+            client.disconnect()
+    finally:
+        conn.close()
+    return {'initial': initial, 'streaming': streaming}
+
+
+def main():
+    from benchmarks import load_script
+
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--backfill', type=int, default=200000,
+                        help='заказов до запуска переноса')
+    parser.add_argument('--rate', type=float, default=2000,
+                        help='новых заказов в секунду во время потока')
+    parser.add_argument('--duration', type=float, default=30)
+    parser.add_argument('--batch-size', type=int, default=50000)
+    parser.add_argument('--settle', type=float, default=1.0,
+                        help='возраст строк, после которого они читаются')
+    parser.add_argument('--timeout', type=float, default=60,
+                        help='сколько ждать переноса после нагрузки')
+    args = parser.parse_args()
+
+    postgres = load_script(1)
+    clickhouse = load_script(6)
+    conn = postgres.get_connection()
+    try:
+        postgres.create_tables(conn)
+    finally:
+        conn.close()
+    benchmark(postgres.get_connection, clickhouse.get_client,
+              backfill=args.backfill, rate=args.rate,
+              duration=args.duration, batch_size=args.batch_size,
+              settle=args.settle, timeout=args.timeout)
+
+
+if __name__ == '__main__':
+    main()
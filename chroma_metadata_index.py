@@ -0,0 +1,266 @@
+import time
+from typing import Any, Dict, List, Optional
+
+import numpy as np
+
+
+class MetadataIndex:
+    """Локальный индекс метаданных для фильтрованного векторного поиска
+
+    Для строковых полей хранится битовая маска на каждое значение,
+    для числовых - отсортированный массив значений с позициями строк.
+    Фильтр в формате where из ChromaDB превращается в маску кандидатов,
+    после чего векторный поиск идет только по ним (pre-filter) или по всей
+    коллекции с последующей фильтрацией (post-filter), если фильтр
+    пропускает большую часть данных.
+    """
+
+    def __init__(self, ids: List[str], embeddings, metadatas: List[Dict],
+                 documents: Optional[List[str]] = None,
+                 post_filter_threshold: float = 0.2):
+        self.ids = list(ids)
+        self.embeddings = np.asarray(embeddings, dtype=np.float32)
+        self.metadatas = list(metadatas)
+        self.documents = list(documents) if documents is not None else None
+        # Доля подходящих строк, начиная с которой выгоднее post-filter
+        self.post_filter_threshold = post_filter_threshold
+        self.size = len(self.ids)
+
+        # Квадраты норм для быстрого расчета L2 через скалярное произведение
+        self._norms = np.einsum('ij,ij->i', self.embeddings, self.embeddings)
+
+        self.bitmaps: Dict[str, Dict[Any, np.ndarray]] = {}
+        self.sorted_values: Dict[str, np.ndarray] = {}
+        self.sorted_rows: Dict[str, np.ndarray] = {}
+        self._build()
+
+    def _build(self):
+        """Построение битовых масок и отсортированных массивов"""
+        fields = {}
+        for row, metadata in enumerate(self.metadatas):
+            for field, value in metadata.items():
+                fields.setdefault(field, []).append((row, value))
+
+        for field, pairs in fields.items():
+            rows = np.fromiter((row for row, _ in pairs), dtype=np.int64,
+                               count=len(pairs))
+            values = [value for _, value in pairs]
+
+            if all(isinstance(v, (int, float)) and not isinstance(v, bool)
+                   for v in values):
+                values = np.asarray(values, dtype=np.float64)
+                order = np.argsort(values, kind='stable')
+                self.sorted_values[field] = values[order]
+                self.sorted_rows[field] = rows[order]
+            else:
+                bitmaps = {}
+                for row, value in pairs:
+                    if value not in bitmaps:
+                        bitmaps[value] = np.zeros(self.size, dtype=bool)
+                    bitmaps[value][row] = True
+                self.bitmaps[field] = bitmaps
+
+    def _range_mask(self, field: str, op: str, value) -> np.ndarray:
+        """Маска строк для сравнения числового поля"""
+        mask = np.zeros(self.size, dtype=bool)
+        values = self.sorted_values[field]
+        rows = self.sorted_rows[field]
+
+        if op == '$eq':
+            start = np.searchsorted(values, value, side='left')
+            stop = np.searchsorted(values, value, side='right')
+            mask[rows[start:stop]] = True
+        elif op == '$ne':
+            mask[rows] = True
+            mask &= ~self._range_mask(field, '$eq', value)
+        elif op == '$lt':
+            mask[rows[:np.searchsorted(values, value, side='left')]] = True
+        elif op == '$lte':
+            mask[rows[:np.searchsorted(values, value, side='right')]] = True
+        elif op == '$gt':
+            mask[rows[np.searchsorted(values, value, side='right'):]] = True
+        elif op == '$gte':
+            mask[rows[np.searchsorted(values, value, side='left'):]] = True
+        elif op == '$in':
+            for item in value:
+                mask |= self._range_mask(field, '$eq', item)
+        elif op == '$nin':
+            mask[rows] = True
+            for item in value:
+                mask &= ~self._range_mask(field, '$eq', item)
+        else:
+            raise ValueError(f"Неподдерживаемый оператор {op} для поля {field}")
+        return mask
+
+    def _value_mask(self, field: str, op: str, value) -> np.ndarray:
+        """Маска строк для условия на строковое поле"""
+        bitmaps = self.bitmaps[field]
+        empty = np.zeros(self.size, dtype=bool)
+
+        if op == '$eq':
+            return bitmaps.get(value, empty).copy()
+        if op == '$in':
+            mask = empty
+            for item in value:
+                if item in bitmaps:
+                    mask = mask | bitmaps[item]
+            return mask
+        if op in ('$ne', '$nin'):
+            excluded = [value] if op == '$ne' else value
+            mask = empty
+            for item, bitmap in bitmaps.items():
+                if item not in excluded:
+                    mask = mask | bitmap
+            return mask
+        raise ValueError(f"Неподдерживаемый оператор {op} для поля {field}")
+
+    def _field_mask(self, field: str, condition) -> np.ndarray:
+        if isinstance(condition, dict):
+            mask = np.ones(self.size, dtype=bool)
+            for op, value in condition.items():
+                mask &= self._field_mask_op(field, op, value)
+            return mask
+        return self._field_mask_op(field, '$eq', condition)
+
+    def _field_mask_op(self, field: str, op: str, value) -> np.ndarray:
+        if field in self.sorted_values:
+            return self._range_mask(field, op, value)
+        if field in self.bitmaps:
+            return self._value_mask(field, op, value)
+        # Поле отсутствует у всех документов
+        return np.zeros(self.size, dtype=bool)
+
+    def candidates(self, where: Optional[Dict]) -> np.ndarray:
+        """Маска строк, удовлетворяющих фильтру where"""
+        if not where:
+            return np.ones(self.size, dtype=bool)
+
+        mask = np.ones(self.size, dtype=bool)
+        for key, condition in where.items():
+            if key == '$and':
+                for clause in condition:
+                    mask &= self.candidates(clause)
+            elif key == '$or':
+                any_mask = np.zeros(self.size, dtype=bool)
+                for clause in condition:
+                    any_mask |= self.candidates(clause)
+                mask &= any_mask
+            else:
+                mask &= self._field_mask(key, condition)
+        return mask
+
+    def selectivity(self, where: Optional[Dict]) -> float:
+        """Доля строк, проходящих фильтр"""
+        if self.size == 0:
+            return 0.0
+        return float(np.count_nonzero(self.candidates(where))) / self.size
+
+    def _distances(self, query: np.ndarray, rows=None) -> np.ndarray:
+        """Квадрат L2 расстояния (как в ChromaDB по умолчанию)"""
+        if rows is None:
+            return self._norms - 2 * (self.embeddings @ query) + query @ query
+        return (self._norms[rows] - 2 * (self.embeddings[rows] @ query)
+                + query @ query)
+
+    @staticmethod
+    def _top_k(distances: np.ndarray, k: int) -> np.ndarray:
+        if k >= len(distances):
+            return np.argsort(distances, kind='stable')
+        part = np.argpartition(distances, k)[:k]
+        return part[np.argsort(distances[part], kind='stable')]
+
+    def _pre_filter(self, query, mask, n_results):
+        rows = np.flatnonzero(mask)
+        distances = self._distances(query, rows)
+        best = self._top_k(distances, n_results)
+        return rows[best], distances[best]
+
+    def _post_filter(self, query, mask, n_results):
+        distances = self._distances(query)
+        # Берем с запасом, чтобы после фильтрации осталось n_results
+        fetch = min(self.size, max(n_results * 4, n_results + 16))
+        while True:
+            best = self._top_k(distances, fetch)
+            best = best[mask[best]]
+            if len(best) >= n_results or fetch >= self.size:
+                best = best[:n_results]
+                return best, distances[best]
+            fetch = min(self.size, fetch * 4)
+
+    def query(self, query_embeddings, n_results: int = 10,
+              where: Optional[Dict] = None,
+              strategy: str = 'auto') -> Dict[str, List]:
+        """Векторный поиск с фильтрацией
+
+        strategy: 'auto', 'pre' или 'post'. Результат имеет ту же форму,
+        что и collection.query в ChromaDB.
+        """
+        mask = self.candidates(where)
+        selected = int(np.count_nonzero(mask))
+        if strategy == 'auto':
+            share = selected / self.size if self.size else 0.0
+            strategy = 'post' if share >= self.post_filter_threshold else 'pre'
+
+        results = {'ids': [], 'distances': [], 'metadatas': [],
+                   'documents': []}
+        for query in np.asarray(query_embeddings, dtype=np.float32):
+            if selected == 0:
+                rows, distances = np.empty(0, dtype=np.int64), np.empty(0)
+            elif strategy == 'pre':
+                rows, distances = self._pre_filter(query, mask, n_results)
+            else:
+                rows, distances = self._post_filter(query, mask, n_results)
+
+            results['ids'].append([self.ids[r] for r in rows])
+            results['distances'].append([float(d) for d in distances])
+            results['metadatas'].append([self.metadatas[r] for r in rows])
+            results['documents'].append(
+                [self.documents[r] for r in rows]
+                if self.documents is not None else None)
+        return results
+
+
+def benchmark(size: int = 200000, dim: int = 128, n_results: int = 10,
+              queries: int = 20):
+    """Сравнение стратегий фильтрации на разной селективности"""
+    rng = np.random.default_rng(42)
+    embeddings = rng.random((size, dim), dtype=np.float32)
+    categories = rng.choice(['electronics', 'computers', 'books', 'toys'],
+                            size=size, p=[0.5, 0.3, 0.15, 0.05])
+    prices = rng.integers(1, 10000, size=size)
+    metadatas = [{"category": str(c), "price": int(p)}
+                 for c, p in zip(categories, prices)]
+    ids = [f"prod_{i}" for i in range(size)]
+
+    start = time.perf_counter()
+    index = MetadataIndex(ids, embeddings, metadatas)
+    print(f"Построение индекса ({size} векторов): "
+          f"{time.perf_counter() - start:.2f} сек")
+
+    filters = {
+        "без фильтра": None,
+        "electronics": {"category": "electronics"},
+        "electronics, price < 1000": {"category": "electronics",
+                                      "price": {"$lt": 1000}},
+        "toys, price < 500": {"category": "toys", "price": {"$lt": 500}},
+        "toys, price < 10": {"category": "toys", "price": {"$lt": 10}},
+    }
+    query_vectors = rng.random((queries, dim), dtype=np.float32)
+
+    print(f"\n{'Фильтр':<28}{'Доля':>8}{'pre, мс':>10}"
+          f"{'post, мс':>10}{'auto, мс':>10}")
+    for name, where in filters.items():
+        timings = {}
+        for strategy in ('pre', 'post', 'auto'):
+            start = time.perf_counter()
+            index.query(query_vectors, n_results=n_results, where=where,
+                        strategy=strategy)
+            timings[strategy] = ((time.perf_counter() - start) * 1000
+                                 / queries)
+        print(f"{name:<28}{index.selectivity(where):>8.3f}"
+              f"{timings['pre']:>10.2f}{timings['post']:>10.2f}"
+              f"{timings['auto']:>10.2f}")
+
+
+if __name__ == "__main__":
+    benchmark()
@@ -0,0 +1,138 @@
+import time
+from datetime import datetime
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+
+
+ACTIONS = np.array(['view', 'click', 'scroll', 'submit'], dtype=object)
+PAGES = np.array(['/home', '/products', '/cart', '/checkout'], dtype=object)
+PLATFORMS = np.array(['web', 'mobile', 'tablet'], dtype=object)
+COUNTRIES = np.array(['US', 'UK', 'DE', 'FR', 'JP'], dtype=object)
+SERVICES = np.array(['api', 'web', 'auth', 'payment'], dtype=object)
+ENDPOINTS = np.array(['/users', '/orders', '/products', '/auth'],
+                     dtype=object)
+STATUS_CODES = np.array([200, 200, 200, 404, 500], dtype=np.uint16)
+
+USER_ACTIONS_COLUMNS = ['timestamp', 'user_id', 'action', 'page',
+                        'duration_ms', 'platform', 'country']
+PERFORMANCE_COLUMNS = ['timestamp', 'service', 'endpoint', 'response_time_ms',
+                       'status_code', 'error_type', 'data_size_bytes']
+
+
+def _timestamps(rng, size: int, now: datetime) -> np.ndarray:
+    """Случайные моменты за последние 24 часа с точностью до минуты"""
+    minutes = rng.integers(0, 1440, size=size).astype('timedelta64[m]')
+    return np.datetime64(now, 's') - minutes
+
+
+def _pick(rng, values: np.ndarray, size: int) -> np.ndarray:
+    return values[rng.integers(0, len(values), size=size)]
+
+
+def user_actions_block(rng, size: int, now: datetime) -> Dict[str, np.ndarray]:
+    """Один блок user_actions, каждая колонка - целый массив"""
+    return {
+        'timestamp': _timestamps(rng, size, now),
+        'user_id': rng.integers(1, 10001, size=size, dtype=np.uint32),
+        'action': _pick(rng, ACTIONS, size),
+        'page': _pick(rng, PAGES, size),
+        'duration_ms': rng.integers(50, 5000, size=size, dtype=np.uint32),
+        'platform': _pick(rng, PLATFORMS, size),
+        'country': _pick(rng, COUNTRIES, size),
+    }
+
+
+def performance_block(rng, size: int, now: datetime) -> Dict[str, np.ndarray]:
+    """Один блок performance_metrics"""
+    return {
+        'timestamp': _timestamps(rng, size, now),
+        'service': _pick(rng, SERVICES, size),
+        'endpoint': _pick(rng, ENDPOINTS, size),
+        'response_time_ms': rng.integers(10, 1000, size=size,
+                                         dtype=np.uint32),
+        'status_code': _pick(rng, STATUS_CODES, size),
+        'error_type': np.full(size, '', dtype=object),
+        'data_size_bytes': rng.integers(100, 10000, size=size,
+                                        dtype=np.uint32),
+    }
+
+
+BLOCK_GENERATORS = {
+    'user_actions': (user_actions_block, USER_ACTIONS_COLUMNS),
+    'performance_metrics': (performance_block, PERFORMANCE_COLUMNS),
+}
+
+
+def generate_blocks(table: str, total: int, block_size: int = 100000,
+                    seed: Optional[int] = None,
+                    now: Optional[datetime] = None
+                    ) -> Iterator[Dict[str, np.ndarray]]:
+    """Поток блоков фиксированного размера - в памяти только один блок"""
+    make_block, _ = BLOCK_GENERATORS[table]
+    rng = np.random.default_rng(seed)
+    now = now or datetime.now()
+    for offset in range(0, total, block_size):
+        yield make_block(rng, min(block_size, total - offset), now)
+
+
+def to_python_columns(block: Dict[str, np.ndarray], columns) -> list:
+    """Колонки для клиента без use_numpy: списки Python-значений"""
+    result = []
+    for name in columns:
+        values = block[name]
+        if np.issubdtype(values.dtype, np.datetime64):
+            values = values.astype('datetime64[s]').astype(object)
+        result.append(values.tolist())
+    return result
+
+
+def insert_block(client, table: str, block: Dict[str, np.ndarray],
+                 use_numpy: Optional[bool] = None,
+                 settings: Optional[Dict] = None):
+    """Колоночная вставка одного блока
+
+    По умолчанию формат колонок берется из настроек клиента: драйвер
+    забирает use_numpy из settings={'use_numpy': True} в
+    client.client_settings. Явный use_numpy передается драйверу в
+    настройках запроса, так что формат и клиент всегда совпадают.
+    """
+    if use_numpy is None:
+        use_numpy = bool(client.client_settings.get('use_numpy'))
+    _, columns = BLOCK_GENERATORS[table]
+    if use_numpy:
+        data = [block[name] for name in columns]
+    else:
+        data = to_python_columns(block, columns)
+    client.execute(
+        f"INSERT INTO {table} ({', '.join(columns)}) VALUES",
+        data,
+        columnar=True,
+        settings=dict(settings or {}, use_numpy=use_numpy)
+    )
+
+
+def load_table(client, table: str, total: int, block_size: int = 100000,
+               use_numpy: Optional[bool] = None,
+               seed: Optional[int] = None) -> Dict[str, float]:
+    """Генерация и вставка блоками с раздельным замером времени"""
+    generate_seconds = insert_seconds = 0.0
+    blocks = generate_blocks(table, total, block_size, seed)
+    while True:
+        start = time.perf_counter()
+        block = next(blocks, None)
+        generate_seconds += time.perf_counter() - start
+        if block is None:
+            break
+
+        start = time.perf_counter()
+        insert_block(client, table, block, use_numpy=use_numpy)
+        insert_seconds += time.perf_counter() - start
+
+    return {
+        'rows': total,
+        'generate_rows_per_sec': total / generate_seconds
+        if generate_seconds else 0.0,
+        'insert_rows_per_sec': total / insert_seconds
+        if insert_seconds else 0.0,
+    }
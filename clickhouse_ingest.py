@@ -0,0 +1,171 @@
+import queue
+import threading
+import time
+import uuid
+from contextlib import contextmanager
+from typing import Callable, Dict, Iterable, List, Optional
+
+import numpy as np
+
+from clickhouse_data import generate_blocks, insert_block
+
+
+class ClickHousePool:
+    """Простой пул соединений ClickHouse
+
+    Client из clickhouse_driver не потокобезопасен, поэтому каждый поток
+    берет соединение в монопольное пользование.
+    """
+
+    def __init__(self, factory: Callable, size: int = 4,
+                 acquire_timeout: Optional[float] = None):
+        self.factory = factory
+        self.size = size
+        self.acquire_timeout = acquire_timeout
+        self._idle = queue.LifoQueue(maxsize=size)
+        for _ in range(size):
+            self._idle.put(None)  # соединение создается при первом запросе
+
+    @contextmanager
+    def connection(self):
+        client = self._idle.get(timeout=self.acquire_timeout)
+        if client is None:
+            try:
+                client = self.factory()
+            except Exception:
+                self._idle.put(None)
+                raise
+        try:
+            yield client
+        except Exception:
+            # Соединение в неизвестном состоянии - пересоздаем
+            client.disconnect()
+            client = None
+            raise
+        finally:
+            self._idle.put(client)
+
+    def close(self):
+        while not self._idle.empty():
+            client = self._idle.get_nowait()
+            if client is not None:
+                client.disconnect()
+
+
+def enable_deduplication(client, table: str, window: int = 1000):
+    """Дедупликация вставок для нереплицируемого MergeTree
+
+    Без non_replicated_deduplication_window токены
+    insert_deduplication_token игнорируются.
+    """
+    client.execute(f"ALTER TABLE {table} "
+                   f"MODIFY SETTING non_replicated_deduplication_window = "
+                   f"{window}")
+
+
+class IngestPipeline:
+    """Параллельная вставка потока блоков через пул соединений
+
+    Производитель кладет блоки в ограниченную очередь, рабочие потоки
+    вставляют их каждый через свое соединение. Каждому блоку назначается
+    токен дедупликации run_id-номер, поэтому повтор после сбоя (или
+    повторный запуск с тем же run_id) не создает дубликатов.
+    """
+
+    def __init__(self, pool: ClickHousePool, table: str,
+                 workers: Optional[int] = None, queue_size: int = 8,
+                 retries: int = 3, backoff: float = 0.5,
+                 use_numpy: Optional[bool] = None,
+                 run_id: Optional[str] = None):
+        self.pool = pool
+        self.table = table
+        self.workers = workers or pool.size
+        self.queue_size = queue_size
+        self.retries = retries
+        self.backoff = backoff
+        self.use_numpy = use_numpy
+        self.run_id = run_id or uuid.uuid4().hex
+
+    def _insert(self, seq: int, block: Dict[str, np.ndarray]) -> int:
+        settings = {
+            'insert_deduplicate': 1,
+            'insert_deduplication_token': f'{self.table}-{self.run_id}-{seq}'
+        }
+        for attempt in range(self.retries + 1):
+            try:
+                with self.pool.connection() as client:
+                    insert_block(client, self.table, block,
+                                 use_numpy=self.use_numpy, settings=settings)
+                return attempt
+            except Exception:
+                if attempt == self.retries:
+                    raise
+                time.sleep(self.backoff * 2 ** attempt)
+
+    def _worker(self, tasks: queue.Queue, stats: Dict, errors: List,
+                lock: threading.Lock):
+        while True:
+            task = tasks.get()
+            if task is None:
+                return
+            seq, block = task
+            try:
+                retried = self._insert(seq, block)
+            except Exception as e:
+                errors.append(e)
+                continue
+            rows = len(next(iter(block.values())))
+            with lock:
+                stats['rows'] += rows
+                stats['blocks'] += 1
+                stats['retries'] += retried
+
+    def run(self, blocks: Iterable[Dict[str, np.ndarray]]) -> Dict[str, float]:
+        tasks = queue.Queue(maxsize=self.queue_size)
+        stats = {'rows': 0, 'blocks': 0, 'retries': 0}
+        errors = []
+        lock = threading.Lock()
+        threads = [threading.Thread(target=self._worker,
+                                    args=(tasks, stats, errors, lock),
+                                    daemon=True)
+                   for _ in range(self.workers)]
+
+        start = time.perf_counter()
+        for thread in threads:
+            thread.start()
+        try:
+            for seq, block in enumerate(blocks):
+                # put блокируется, пока очередь полна, - память ограничена
+                tasks.put((seq, block))
+                if errors:
+                    break
+        finally:
+            for _ in threads:
+                tasks.put(None)
+            for thread in threads:
+                thread.join()
+
+        if errors:
+            raise errors[0]
+        elapsed = time.perf_counter() - start
+        stats['seconds'] = elapsed
+        stats['rows_per_sec'] = stats['rows'] / elapsed if elapsed else 0.0
+        return stats
+
+
+def benchmark(factory: Callable, table: str = 'user_actions',
+              total: int = 2000000, block_size: int = 100000,
+              worker_counts=(1, 2, 4, 8),
+              use_numpy: Optional[bool] = None):
+    """Пропускная способность вставки в зависимости от числа потоков"""
+    print(f"\n{'Потоков':>8}{'строк/сек':>14}{'повторов':>10}")
+    for workers in worker_counts:
+        pool = ClickHousePool(factory, size=workers)
+        try:
+            pipeline = IngestPipeline(pool, table, use_numpy=use_numpy)
+            stats = pipeline.run(
+                generate_blocks(table, total, block_size, seed=workers))
+        finally:
+            pool.close()
+        print(f"{workers:>8}{stats['rows_per_sec']:>14.0f}"
+              f"{stats['retries']:>10}")
@@ -0,0 +1,115 @@
+import time
+import tracemalloc
+from typing import Dict, Iterator, Optional
+
+import numpy as np
+
+
+def _settings(max_block_size: Optional[int], use_numpy: bool,
+              settings: Optional[Dict]) -> Dict:
+    result = dict(settings or {})
+    if max_block_size:
+        result['max_block_size'] = max_block_size
+    if use_numpy:
+        result['use_numpy'] = True
+    return result
+
+
+def query_columns(client, query: str, params: Optional[Dict] = None,
+                  max_block_size: Optional[int] = None,
+                  use_numpy: bool = False,
+                  settings: Optional[Dict] = None) -> Dict[str, np.ndarray]:
+    """Результат запроса как словарь {колонка: массив}
+
+    С use_numpy драйвер сам собирает массивы из блоков
+    (нужен clickhouse-driver[numpy]), иначе колонки приходят кортежами
+    и превращаются в массивы без построчных кортежей.
+    """
+    columns, types = client.execute(
+        query, params,
+        columnar=True,
+        with_column_types=True,
+        settings=_settings(max_block_size, use_numpy, settings)
+    )
+    if not types:
+        return {}
+    if not columns:
+        return {name: np.empty(0) for name, _ in types}
+    return {name: np.asarray(column)
+            for (name, _), column in zip(types, columns)}
+
+
+def iter_column_blocks(client, query: str, params: Optional[Dict] = None,
+                       block_rows: int = 65536,
+                       max_block_size: Optional[int] = None,
+                       settings: Optional[Dict] = None
+                       ) -> Iterator[Dict[str, np.ndarray]]:
+    """Потоковое чтение блоками по block_rows строк
+
+    Память ограничена одним блоком, поэтому подходит для выборок,
+    которые целиком не помещаются в память.
+    """
+    rows = client.execute_iter(
+        query, params,
+        with_column_types=True,
+        settings=_settings(max_block_size or block_rows, False, settings)
+    )
+    types = next(rows, None)
+    if types is None:
+        return
+    names = [name for name, _ in types]
+
+    block = []
+    for row in rows:
+        block.append(row)
+        if len(block) >= block_rows:
+            yield _transpose(names, block)
+            block = []
+    if block:
+        yield _transpose(names, block)
+
+
+def _transpose(names, rows) -> Dict[str, np.ndarray]:
+    return {name: np.asarray(column)
+            for name, column in zip(names, zip(*rows))}
+
+
+def _measure(func):
+    tracemalloc.start()
+    start = time.perf_counter()
+    func()
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed * 1000, peak / 2 ** 20
+
+
+def benchmark(client, queries: Dict[str, str],
+              max_block_size: Optional[int] = None, repeat: int = 3):
+    """Время (мс) и пик памяти (МБ) для разных способов получения результата"""
+    paths = {
+        'tuples': lambda q: client.execute(q),
+        'columnar': lambda q: query_columns(
+            client, q, max_block_size=max_block_size),
+        'numpy': lambda q: query_columns(
+            client, q, max_block_size=max_block_size, use_numpy=True),
+        'blocks': lambda q: sum(
+            1 for _ in iter_column_blocks(
+                client, q, max_block_size=max_block_size)),
+    }
+
+    report = {}
+    print(f"\n{'Запрос':<22}{'Путь':<10}{'мс':>10}{'МБ':>10}")
+    for name, query in queries.items():
+        for path, run in paths.items():
+            try:
+                results = [_measure(lambda: run(query))
+                           for _ in range(repeat)]
+            except Exception as e:
+                print(f"{name:<22}{path:<10}  недоступно: {e}")
+                continue
+            elapsed = min(r[0] for r in results)
+            memory = max(r[1] for r in results)
+            report[(name, path)] = (elapsed, memory)
+            print(f"{name:<22}{path:<10}{elapsed:>10.1f}{memory:>10.2f}")
+    return report
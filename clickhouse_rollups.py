@@ -0,0 +1,290 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from typing import Dict, Iterator, List, Optional, Tuple
+
+
+# Каждый rollup - таблица AggregatingMergeTree с промежуточными
+# состояниями агрегатов и материализованное представление, которое
+# дописывает в нее новые вставки исходной таблицы
+ROLLUPS = {
+    'user_actions_hourly': {
+        'source': 'user_actions',
+        'table': '''
+            CREATE TABLE IF NOT EXISTS user_actions_hourly (
+                hour DateTime,
+                actions_state AggregateFunction(count),
+                users_state AggregateFunction(uniq, UInt32),
+                duration_state AggregateFunction(avg, UInt32)
+            )
+            ENGINE = AggregatingMergeTree()
+            PARTITION BY toYYYYMM(hour)
+            ORDER BY hour
+        ''',
+        'select': '''
+            SELECT
+                toStartOfHour(timestamp) as hour,
+                countState() as actions_state,
+                uniqState(user_id) as users_state,
+                avgState(duration_ms) as duration_state
+            FROM user_actions
+            {where}
+            GROUP BY hour
+        ''',
+    },
+    'user_actions_platform_country': {
+        'source': 'user_actions',
+        'table': '''
+            CREATE TABLE IF NOT EXISTS user_actions_platform_country (
+                day Date,
+                platform String,
+                country String,
+                actions_state AggregateFunction(count),
+                users_state AggregateFunction(uniq, UInt32)
+            )
+            ENGINE = AggregatingMergeTree()
+            PARTITION BY toYYYYMM(day)
+            ORDER BY (platform, country, day)
+        ''',
+        'select': '''
+            SELECT
+                toDate(timestamp) as day,
+                platform,
+                country,
+                countState() as actions_state,
+                uniqState(user_id) as users_state
+            FROM user_actions
+            {where}
+            GROUP BY day, platform, country
+        ''',
+    },
+    'performance_service_hourly': {
+        'source': 'performance_metrics',
+        'table': '''
+            CREATE TABLE IF NOT EXISTS performance_service_hourly (
+                hour DateTime,
+                service String,
+                endpoint String,
+                requests_state AggregateFunction(count),
+                response_time_state AggregateFunction(avg, UInt32),
+                p95_state AggregateFunction(quantile(0.95), UInt32),
+                errors_state AggregateFunction(sum, UInt8)
+            )
+            ENGINE = AggregatingMergeTree()
+            PARTITION BY toYYYYMM(hour)
+            ORDER BY (service, endpoint, hour)
+        ''',
+        'select': '''
+            SELECT
+                toStartOfHour(timestamp) as hour,
+                service,
+                endpoint,
+                countState() as requests_state,
+                avgState(response_time_ms) as response_time_state,
+                quantileState(0.95)(response_time_ms) as p95_state,
+                sumState(status_code = 500) as errors_state
+            FROM performance_metrics
+            {where}
+            GROUP BY hour, service, endpoint
+        ''',
+    },
+}
+
+# Запросы дашбордов поверх rollup. Имена совпадают с ANALYTICS_QUERIES
+# из 6.py, колонки результата - с исходными запросами.
+ROLLUP_QUERIES = {
+    'hourly_activity': ('user_actions_hourly', '''
+        SELECT
+            hour,
+            countMerge(actions_state) as actions,
+            uniqMerge(users_state) as unique_users,
+            avgMerge(duration_state) as avg_duration
+        FROM user_actions_hourly
+        WHERE hour >= toStartOfHour(now() - INTERVAL 24 HOUR)
+        GROUP BY hour
+        ORDER BY hour
+    '''),
+    'platform_country': ('user_actions_platform_country', '''
+        SELECT
+            platform,
+            country,
+            countMerge(actions_state) as actions,
+            uniqMerge(users_state) as users
+        FROM user_actions_platform_country
+        GROUP BY platform, country
+        ORDER BY users DESC
+        LIMIT 10
+    '''),
+    'service_performance': ('performance_service_hourly', '''
+        SELECT
+            service,
+            endpoint,
+            countMerge(requests_state) as requests,
+            avgMerge(response_time_state) as avg_response_time,
+            quantileMerge(0.95)(p95_state) as p95_response_time,
+            sumMerge(errors_state) as errors
+        FROM performance_service_hourly
+        GROUP BY service, endpoint
+        ORDER BY avg_response_time DESC
+        LIMIT 10
+    '''),
+}
+
+
+def source_parts(client, source: str) -> List[str]:
+    """Имена активных кусков исходной таблицы"""
+    return [row[0] for row in client.execute("""
+        SELECT name FROM system.parts
+        WHERE database = currentDatabase() AND table = %(table)s AND active
+    """, {'table': source})]
+
+
+@contextmanager
+def frozen_parts(client, source: str) -> Iterator[List[str]]:
+    """Снимок кусков source при остановленных слияниях
+
+    Граница backfill проходит по времени вставки, а не по timestamp
+    строк: все, что лежит в кусках снимка, переносит backfill, все более
+    поздние вставки считает представление. Слияния остановлены, пока
+    backfill не закончит, иначе кусок снимка мог бы слиться с новым и
+    исчезнуть. Между снимком и CREATE MATERIALIZED VIEW вставки должны
+    быть приостановлены - строки, попавшие в этот промежуток, не
+    посчитает никто; во время самого backfill вставлять можно.
+    """
+    client.execute(f"SYSTEM STOP MERGES {source}")
+    try:
+        yield source_parts(client, source)
+    finally:
+        client.execute(f"SYSTEM START MERGES {source}")
+
+
+def backfill_chunks(client, source: str,
+                    parts: Optional[List[str]] = None) -> List[Tuple]:
+    """Куски для backfill: (партиция, день) существующих данных"""
+    if parts is not None and not parts:
+        return []
+    where = "WHERE _part IN %(parts)s" if parts is not None else ""
+    return client.execute(f"""
+        SELECT DISTINCT _partition_id, toDate(timestamp) as day
+        FROM {source}
+        {where}
+        ORDER BY _partition_id, day
+    """, {'parts': parts})
+
+
+def backfill(client, target: str, select: str, source: str,
+             parts: Optional[List[str]] = None, pool=None) -> int:
+    """Заполнение представления данными, вставленными до его создания
+
+    select - SELECT представления с плейсхолдером {where}. Данные
+    переносятся кусками по (партиция, день); с пулом ClickHousePool куски
+    обрабатываются параллельно, по одному на соединение. parts - снимок
+    кусков из frozen_parts на момент создания представления: вставки
+    после него представление уже посчитало само. Возвращает число
+    обработанных кусков.
+    """
+    chunks = backfill_chunks(client, source, parts)
+
+    def run(chunk, conn):
+        partition_id, day = chunk
+        conditions = ["_partition_id = %(partition_id)s",
+                      "toDate(timestamp) = %(day)s"]
+        if parts is not None:
+            conditions.append("_part IN %(parts)s")
+        conn.execute(
+            f"INSERT INTO {target} "
+            + select.format(where="WHERE " + " AND ".join(conditions)),
+            {'partition_id': partition_id, 'day': day, 'parts': parts}
+        )
+
+    if pool is None:
+        for chunk in chunks:
+            run(chunk, client)
+        return len(chunks)
+
+    def run_pooled(chunk):
+        with pool.connection() as conn:
+            run(chunk, conn)
+
+    with ThreadPoolExecutor(max_workers=pool.size) as executor:
+        list(executor.map(run_pooled, chunks))
+    return len(chunks)
+
+
+def create_rollups(client, backfill_existing: bool = True,
+                   pool=None) -> List[str]:
+    """Создание rollup-таблиц и представлений
+
+    Представление видит только новые вставки, поэтому уже лежащие в
+    исходной таблице данные при backfill_existing=True переносятся
+    через backfill по снимку кусков (см. frozen_parts - на время
+    создания представления вставки нужно приостановить). Возвращает
+    имена созданных rollup.
+    """
+    existing = {row[0] for row in client.execute('SHOW TABLES')}
+    created = []
+    for name, rollup in ROLLUPS.items():
+        if name in existing:
+            continue
+        client.execute(rollup['table'])
+        with frozen_parts(client, rollup['source']) as parts:
+            client.execute(f"CREATE MATERIALIZED VIEW IF NOT EXISTS "
+                           f"{name}_mv TO {name} AS "
+                           + rollup['select'].format(where=''))
+            if backfill_existing:
+                backfill(client, name, rollup['select'], rollup['source'],
+                         parts=parts, pool=pool)
+        created.append(name)
+    return created
+
+
+class RollupQueryLayer:
+    """Выполнение запросов дашбордов с прозрачным чтением rollup
+
+    raw_queries - запросы к сырым таблицам по имени. Если для имени есть
+    запрос в ROLLUP_QUERIES и его таблица существует, выполняется он,
+    иначе исходный запрос. Почасовые rollup отвечают с точностью до часа,
+    поэтому окно сырого hourly_activity тоже выровнено по началу часа и
+    оба запроса считают одни и те же строки.
+    """
+
+    def __init__(self, client, raw_queries: Dict[str, str]):
+        self.client = client
+        self.raw_queries = raw_queries
+        self._tables = None
+
+    def refresh(self):
+        self._tables = {row[0] for row in self.client.execute('SHOW TABLES')}
+
+    def uses_rollup(self, name: str) -> bool:
+        if self._tables is None:
+            self.refresh()
+        return (name in ROLLUP_QUERIES
+                and ROLLUP_QUERIES[name][0] in self._tables)
+
+    def query_for(self, name: str, use_rollup: Optional[bool] = None) -> str:
+        if use_rollup is None:
+            use_rollup = self.uses_rollup(name)
+        if use_rollup:
+            return ROLLUP_QUERIES[name][1]
+        return self.raw_queries[name]
+
+    def execute(self, name: str, use_rollup: Optional[bool] = None,
+                **kwargs):
+        return self.client.execute(self.query_for(name, use_rollup),
+                                   **kwargs)
+
+
+def benchmark(layer: RollupQueryLayer, repeat: int = 5):
+    """Задержка дашбордов: сырые таблицы против rollup"""
+    print(f"\n{'Запрос':<22}{'raw, мс':>12}{'rollup, мс':>12}")
+    for name in ROLLUP_QUERIES:
+        timings = {}
+        for use_rollup in (False, True):
+            best = float('inf')
+            for _ in range(repeat):
+                start = time.perf_counter()
+                layer.execute(name, use_rollup=use_rollup)
+                best = min(best, time.perf_counter() - start)
+            timings[use_rollup] = best * 1000
+        print(f"{name:<22}{timings[False]:>12.1f}{timings[True]:>12.1f}")
@@ -0,0 +1,333 @@
+import asyncio
+import json
+import math
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+from spatial_index import _rings
+
+# (courier_id, lat, lon)
+Fix = Tuple[str, float, float]
+
+
+class ZoneIndex:
+    """Grid of zone bounding boxes for batch point-in-zone lookups
+
+    Every zone is registered in each cell its bounding box touches, the
+    cells are stored CSR-style (sorted cell numbers, offsets, zone numbers)
+    so a whole batch of points is matched to candidate zones with one
+    searchsorted. Candidates pass a bounding-box check and then exact ray
+    casting, vectorized over all (point, zone) pairs of the batch.
+    """
+
+    def __init__(self, zones: Dict[str, dict], cell_deg: float = 0.05):
+        self.cell_deg = cell_deg
+        self.columns = int(math.ceil(360 / cell_deg)) + 1
+        self.names = list(zones)
+        self.polygons = [zones[name] for name in self.names]
+
+        boxes = np.empty((len(self.names), 4))
+        edges = []
+        for i, polygon in enumerate(self.polygons):
+            rings = _rings(polygon)
+            shell = rings[0]
+            boxes[i] = (shell[:, 1].min(), shell[:, 0].min(),
+                        shell[:, 1].max(), shell[:, 0].max())
+            # Edges of all rings together: even-odd counting handles holes
+            edges.append(np.concatenate([
+                np.hstack([ring, np.roll(ring, -1, axis=0)])
+                for ring in rings]))
+        self.boxes = boxes
+
+        # Edges padded to the largest polygon; horizontal padding edges
+        # never cross a ray, so every zone is tested with the same loop
+        longest = max((len(e) for e in edges), default=0)
+        self.edges = np.zeros((len(edges), longest, 4))
+        for i, zone_edges in enumerate(edges):
+            self.edges[i, :len(zone_edges)] = zone_edges
+
+        cells, owners = [], []
+        row0, col0 = self._row_col(boxes[:, 0], boxes[:, 1])
+        row1, col1 = self._row_col(boxes[:, 2], boxes[:, 3])
+        for zone in range(len(self.names)):
+            rows = np.arange(row0[zone], row1[zone] + 1)
+            cols = np.arange(col0[zone], col1[zone] + 1)
+            zone_cells = (rows[:, None] * self.columns + cols).ravel()
+            cells.append(zone_cells)
+            owners.append(np.full(len(zone_cells), zone))
+        cells = np.concatenate(cells) if cells else np.empty(0, np.int64)
+        owners = np.concatenate(owners) if owners else np.empty(0, np.int64)
+
+        order = np.argsort(cells, kind='stable')
+        cells, self.zone_of = cells[order], owners[order]
+        self.cells, starts = np.unique(cells, return_index=True)
+        self.offsets = np.append(starts, len(cells))
+
+    def _row_col(self, lats, lons):
+        row = np.floor((np.asarray(lats) + 90) / self.cell_deg)
+        col = np.floor((np.asarray(lons) + 180) / self.cell_deg)
+        return row.astype(np.int64), col.astype(np.int64)
+
+    def locate(self, lats: np.ndarray,
+               lons: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """(point, zone) index pairs for points inside zones"""
+        row, col = self._row_col(lats, lons)
+        keys = row * self.columns + col
+        slots = np.searchsorted(self.cells, keys)
+        slots = np.minimum(slots, len(self.cells) - 1)
+        found = self.cells[slots] == keys if len(self.cells) else \
+            np.zeros(len(keys), dtype=bool)
+
+        points = np.flatnonzero(found)
+        starts = self.offsets[slots[points]]
+        counts = self.offsets[slots[points] + 1] - starts
+        pair_points = np.repeat(points, counts)
+        # Position inside each point's run of zones
+        within_run = np.arange(len(pair_points)) - np.repeat(
+            np.cumsum(counts) - counts, counts)
+        pair_zones = self.zone_of[np.repeat(starts, counts) + within_run]
+
+        box = self.boxes[pair_zones]
+        plat, plon = lats[pair_points], lons[pair_points]
+        mask = ((plat >= box[:, 0]) & (plon >= box[:, 1])
+                & (plat <= box[:, 2]) & (plon <= box[:, 3]))
+        pair_points, pair_zones = pair_points[mask], pair_zones[mask]
+
+        # Ray casting over all pairs at once, one step per edge slot
+        plat, plon = plat[mask], plon[mask]
+        inside = np.zeros(len(pair_points), dtype=bool)
+        for k in range(self.edges.shape[1]):
+            ax, ay, bx, by = self.edges[pair_zones, k].T
+            crosses = (ay > plat) != (by > plat)
+            with np.errstate(divide='ignore', invalid='ignore'):
+                x_cross = ax + (plat - ay) * (bx - ax) / (by - ay)
+            inside ^= crosses & (plon < x_cross)
+        return pair_points[inside], pair_zones[inside]
+
+
+class QueueSink:
+    """Puts event batches on an asyncio.Queue"""
+
+    def __init__(self, queue: Optional[asyncio.Queue] = None):
+        self.queue = queue or asyncio.Queue()
+
+    async def emit(self, events: List[Dict]):
+        await self.queue.put(events)
+
+
+class StreamSink:
+    """Appends events to a Redis stream through redis_streams.EventBus"""
+
+    def __init__(self, bus, batch_size: int = 500):
+        self.bus = bus
+        self.batch_size = batch_size
+
+    async def emit(self, events: List[Dict]):
+        await asyncio.to_thread(self.bus.publish_many, events,
+                                self.batch_size)
+
+
+class GeofenceEngine:
+    """Enter/exit detection for a fleet against many zones
+
+    Keeps the set of zones each courier was last seen in. A batch of fixes
+    is evaluated at once (several fixes of a courier in one batch collapse
+    to the latest), membership changes become events shaped like Tile38
+    hook notifications and go to the sink in batches of batch_size.
+    """
+
+    def __init__(self, zones: Dict[str, dict], sink=None,
+                 hook: str = 'zones', key: str = 'fleet',
+                 batch_size: int = 1000, cell_deg: float = 0.05):
+        self.index = ZoneIndex(zones, cell_deg)
+        self.sink = sink or QueueSink()
+        self.hook = hook
+        self.key = key
+        self.batch_size = batch_size
+        # courier -> sorted tuple of zone numbers it is inside
+        self.membership: Dict[str, tuple] = {}
+        self.stats = {'fixes': 0, 'events': 0, 'seconds': 0.0}
+
+    def evaluate(self, fixes: Iterable[Fix]) -> List[Dict]:
+        """Events caused by a batch of fixes, updates the membership"""
+        start = time.perf_counter()
+        latest = {courier: (lat, lon) for courier, lat, lon in fixes}
+        couriers = list(latest)
+        coords = np.array(list(latest.values()), dtype=np.float64)
+        coords = coords.reshape(-1, 2)
+        lats, lons = coords[:, 0], coords[:, 1]
+
+        points, zones = self.index.locate(lats, lons)
+        order = np.lexsort((zones, points))
+        current: Dict[int, tuple] = {}
+        for point, zone in zip(points[order].tolist(),
+                               zones[order].tolist()):
+            current[point] = current.get(point, ()) + (zone,)
+
+        # Only couriers inside some zone now or before can change state
+        position = dict(zip(couriers, range(len(couriers))))
+        touched = set(current)
+        touched.update(position[courier] for courier in
+                       self.membership.keys() & position.keys())
+
+        now = time.time()
+        events = []
+        names = self.index.names
+        for point in sorted(touched):
+            courier = couriers[point]
+            inside = current.get(point, ())
+            before = self.membership.get(courier, ())
+            if inside == before:
+                continue
+            if inside:
+                self.membership[courier] = inside
+            else:
+                self.membership.pop(courier, None)
+            changes = [('enter', zone) for zone in inside
+                       if zone not in before]
+            changes += [('exit', zone) for zone in before
+                        if zone not in inside]
+            for detect, zone in changes:
+                events.append({
+                    'command': 'set', 'detect': detect, 'hook': self.hook,
+                    'key': self.key, 'id': courier, 'zone': names[zone],
+                    'time': now,
+                    'object': {'type': 'Point',
+                               'coordinates': [float(lons[point]),
+                                               float(lats[point])]},
+                })
+
+        self.stats['fixes'] += len(couriers)
+        self.stats['events'] += len(events)
+        self.stats['seconds'] += time.perf_counter() - start
+        return events
+
+    async def process(self, fixes: Iterable[Fix]) -> int:
+        events = self.evaluate(fixes)
+        for offset in range(0, len(events), self.batch_size):
+            await self.sink.emit(events[offset:offset + self.batch_size])
+        return len(events)
+
+
+class HookReceiver:
+    """Minimal HTTP endpoint for Tile38 webhooks (SETHOOK http://...)
+
+    Every POSTed JSON notification is put on the queue, so hooks from the
+    server and events from GeofenceEngine can be handled by one consumer.
+    Listens on loopback by default; pass host='0.0.0.0' only when Tile38
+    runs elsewhere (e.g. in a container). Bodies over max_body bytes are
+    refused with 413 and the connection is closed.
+    """
+
+    def __init__(self, host: str = '127.0.0.1', port: int = 8080,
+                 queue: Optional[asyncio.Queue] = None,
+                 max_body: int = 1 << 20):
+        self.host = host
+        self.port = port
+        self.queue = queue or asyncio.Queue()
+        self.max_body = max_body
+        self.server = None
+
+    async def _handle(self, reader: asyncio.StreamReader,
+                      writer: asyncio.StreamWriter):
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line:
+                    break
+                length = 0
+                while True:
+                    header = await reader.readline()
+                    if header in (b'\r\n', b'\n', b''):
+                        break
+                    name, _, value = header.decode().partition(':')
+                    if name.strip().lower() == 'content-length':
+                        length = int(value)
+                if not 0 <= length <= self.max_body:
+                    writer.write(b'HTTP/1.1 413 Payload Too Large\r\n'
+                                 b'Content-Length: 0\r\n'
+                                 b'Connection: close\r\n\r\n')
+                    await writer.drain()
+                    break
+                body = await reader.readexactly(length) if length else b''
+                if body:
+                    await self.queue.put([json.loads(body)])
+                writer.write(b'HTTP/1.1 200 OK\r\nContent-Length: 0\r\n\r\n')
+                await writer.drain()
+        except (asyncio.IncompleteReadError, ConnectionResetError,
+                ValueError):
+            pass
+        finally:
+            writer.close()
+
+    async def start(self):
+        self.server = await asyncio.start_server(self._handle, self.host,
+                                                 self.port)
+        return self
+
+    async def stop(self):
+        if self.server is not None:
+            self.server.close()
+            await self.server.wait_closed()
+
+
+def square_zone(lat: float, lon: float, side: float) -> dict:
+    half = side / 2
+    return {'type': 'Polygon', 'coordinates': [[
+        [lon - half, lat - half], [lon + half, lat - half],
+        [lon + half, lat + half], [lon - half, lat + half],
+        [lon - half, lat - half]]]}
+
+
+def synthetic_zones(count: int, center: Tuple[float, float] = (52.52, 13.40),
+                    spread: float = 0.5, side: float = 0.01,
+                    seed: int = 42) -> Dict[str, dict]:
+    rng = np.random.default_rng(seed)
+    lats = center[0] + rng.uniform(-spread, spread, count)
+    lons = center[1] + rng.uniform(-spread, spread, count)
+    return {f'zone{i}': square_zone(lat, lon, side)
+            for i, (lat, lon) in enumerate(zip(lats, lons))}
+
+
+async def benchmark(couriers: int = 100000, zones: int = 10000,
+                    rounds: int = 5, step: float = 0.002,
+                    center: Tuple[float, float] = (52.52, 13.40),
+                    spread: float = 0.5, seed: int = 42) -> Dict[str, float]:
+    """Fixes/sec and events/sec for a moving fleet against many zones"""
+    rng = np.random.default_rng(seed)
+    start = time.perf_counter()
+    engine = GeofenceEngine(synthetic_zones(zones, center, spread,
+                                            seed=seed))
+    print(f"\nZone index for {zones} zones built in "
+          f"{time.perf_counter() - start:.2f} s")
+
+    ids = [f'courier{i}' for i in range(couriers)]
+    lats = center[0] + rng.uniform(-spread, spread, couriers)
+    lons = center[1] + rng.uniform(-spread, spread, couriers)
+
+    drained = 0
+
+    async def drain():
+        nonlocal drained
+        while True:
+            drained += len(await engine.sink.queue.get())
+
+    consumer = asyncio.create_task(drain())
+    print(f"{'Round':<8}{'fixes/sec':>14}{'events':>10}{'events/sec':>14}")
+    for round_ in range(rounds):
+        lats += rng.normal(0, step, couriers)
+        lons += rng.normal(0, step, couriers)
+        start = time.perf_counter()
+        events = await engine.process(zip(ids, lats.tolist(), lons.tolist()))
+        elapsed = time.perf_counter() - start
+        print(f"{round_:<8}{couriers / elapsed:>14.0f}{events:>10}"
+              f"{events / elapsed:>14.0f}")
+
+    await asyncio.sleep(0)
+    consumer.cancel()
+    stats = engine.stats
+    return {'fixes_per_sec': stats['fixes'] / stats['seconds'],
+            'events_per_sec': stats['events'] / stats['seconds'],
+            'events_delivered': drained}
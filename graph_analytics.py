@@ -0,0 +1,227 @@
+import time
+from array import array
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+from neo4j_bulk_loader import batches
+
+
+EXPORT_PEOPLE = "MATCH (p:Person) RETURN p.name AS name"
+
+EXPORT_FRIENDS = """
+MATCH (a:Person)-[:FRIENDS]->(b:Person)
+RETURN a.name AS source, b.name AS target
+"""
+
+WRITE_PAGERANK = """
+UNWIND $rows AS row
+MATCH (p:Person {name: row.name})
+SET p.pageRank = row.rank
+"""
+
+
+class CSRGraph:
+    """Граф в формате CSR: соседи узла i лежат в targets[offsets[i]:offsets[i + 1]]
+
+    Узлы нумеруются с нуля, names хранит соответствие индекса и Person.name.
+    """
+
+    def __init__(self, names: Sequence[str], offsets: np.ndarray,
+                 targets: np.ndarray):
+        self.names = list(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.offsets = offsets.astype(np.int32, copy=False)
+        self.targets = targets.astype(np.int32, copy=False)
+        self.size = len(self.names)
+        self.degrees = np.diff(self.offsets)
+        # Источник для каждого ребра - нужен для векторного PageRank
+        self.sources = np.repeat(np.arange(self.size, dtype=np.int32),
+                                 self.degrees)
+        self._undirected = None
+
+    @classmethod
+    def from_edges(cls, names: Sequence[str], sources,
+                   targets) -> 'CSRGraph':
+        sources = np.asarray(sources, dtype=np.int32)
+        targets = np.asarray(targets, dtype=np.int32)
+        order = np.argsort(sources, kind='stable')
+        counts = np.bincount(sources, minlength=len(names))
+        offsets = np.zeros(len(names) + 1, dtype=np.int32)
+        np.cumsum(counts, out=offsets[1:])
+        return cls(names, offsets, targets[order])
+
+    @classmethod
+    def from_neo4j(cls, connection) -> 'CSRGraph':
+        """Однократная выгрузка подграфа FRIENDS потоком записей"""
+        names = [record['name']
+                 for record in connection.stream_query(EXPORT_PEOPLE)]
+        index = {name: i for i, name in enumerate(names)}
+
+        sources, targets = array('i'), array('i')
+        for record in connection.stream_query(EXPORT_FRIENDS):
+            sources.append(index[record['source']])
+            targets.append(index[record['target']])
+
+        return cls.from_edges(names,
+                              np.frombuffer(sources, dtype=np.int32),
+                              np.frombuffer(targets, dtype=np.int32))
+
+    def undirected(self) -> 'CSRGraph':
+        """Граф с ребрами в обе стороны (как -[:FRIENDS*]- в Cypher)"""
+        if self._undirected is None:
+            self._undirected = CSRGraph.from_edges(
+                self.names,
+                np.concatenate([self.sources, self.targets]),
+                np.concatenate([self.targets, self.sources])
+            )
+        return self._undirected
+
+    def neighbors(self, node: int) -> np.ndarray:
+        return self.targets[self.offsets[node]:self.offsets[node + 1]]
+
+    def expand(self, frontier: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """Соседи всех узлов фронта одной операцией
+
+        Возвращает (neighbors, parents), где parents[i] - узел фронта,
+        из которого пришли в neighbors[i].
+        """
+        starts = self.offsets[frontier]
+        lengths = self.offsets[frontier + 1] - starts
+        total = int(lengths.sum())
+        if total == 0:
+            empty = np.empty(0, dtype=np.int32)
+            return empty, empty
+        # Позиции в targets: starts[k] + 0..lengths[k]-1 для каждого узла
+        shifts = np.repeat(starts - np.cumsum(lengths) + lengths, lengths)
+        positions = shifts + np.arange(total)
+        return self.targets[positions], np.repeat(frontier, lengths)
+
+    def pagerank(self, damping: float = 0.85, max_iter: int = 20,
+                 tol: float = 1e-6) -> np.ndarray:
+        n = self.size
+        if n == 0:
+            return np.empty(0)
+        rank = np.full(n, 1.0 / n)
+        out_degree = self.degrees.astype(np.float64)
+        dangling = out_degree == 0
+        safe_degree = np.where(dangling, 1.0, out_degree)
+
+        for _ in range(max_iter):
+            contrib = (rank / safe_degree)[self.sources]
+            new_rank = np.bincount(self.targets, weights=contrib,
+                                   minlength=n)
+            # Ранг висячих узлов распределяется равномерно
+            new_rank = (damping * (new_rank + rank[dangling].sum() / n)
+                        + (1 - damping) / n)
+            delta = np.abs(new_rank - rank).sum()
+            rank = new_rank
+            if delta < tol:
+                break
+        return rank
+
+    def shortest_path(self, source: str, target: str) -> Optional[List[str]]:
+        """Кратчайший путь в ненаправленном графе (BFS по фронтам)"""
+        graph = self.undirected()
+        start, goal = self.index[source], self.index[target]
+        parent = np.full(self.size, -1, dtype=np.int32)
+        parent[start] = start
+        frontier = np.array([start], dtype=np.int32)
+
+        while len(frontier) and parent[goal] == -1:
+            neighbors, parents = graph.expand(frontier)
+            fresh = parent[neighbors] == -1
+            neighbors, parents = neighbors[fresh], parents[fresh]
+            neighbors, first = np.unique(neighbors, return_index=True)
+            parent[neighbors] = parents[first]
+            frontier = neighbors
+
+        if parent[goal] == -1:
+            return None
+        path = [goal]
+        while path[-1] != start:
+            path.append(int(parent[path[-1]]))
+        return [self.names[i] for i in reversed(path)]
+
+    def friends_of_friends(self, name: str) -> List[str]:
+        node = self.index[name]
+        second, _ = self.expand(self.neighbors(node))
+        second = np.unique(second)
+        return [self.names[i] for i in second[second != node]]
+
+    def recommend_friends(self, name: str,
+                          top_n: int = 10) -> List[Tuple[str, int]]:
+        """Кандидаты в друзья по числу общих друзей"""
+        node = self.index[name]
+        friends = self.neighbors(node)
+        second, _ = self.expand(friends)
+        second = second[(second != node) & ~np.isin(second, friends)]
+        candidates, counts = np.unique(second, return_counts=True)
+        order = np.argsort(-counts, kind='stable')[:top_n]
+        return [(self.names[candidates[i]], int(counts[i])) for i in order]
+
+    def write_pagerank(self, connection, ranks: np.ndarray,
+                       batch_size: int = 10000):
+        """Запись PageRank обратно в Person.pageRank пакетами"""
+        rows = ({'name': name, 'rank': float(rank)}
+                for name, rank in zip(self.names, ranks))
+        for batch in batches(rows, batch_size):
+            connection.execute_write(WRITE_PAGERANK, {'rows': batch})
+
+
+def synthetic_graph(people: int = 100000, edges: int = 1000000,
+                    seed: int = 42) -> CSRGraph:
+    """Случайный граф person_i без выгрузки из Neo4j"""
+    rng = np.random.default_rng(seed)
+    sources = rng.integers(0, people, size=edges, dtype=np.int32)
+    targets = rng.integers(0, people, size=edges, dtype=np.int32)
+    keep = sources != targets
+    names = [f'person_{i}' for i in range(people)]
+    return CSRGraph.from_edges(names, sources[keep], targets[keep])
+
+
+def benchmark(graph: CSRGraph, samples: int = 100, seed: int = 42,
+              picks: Optional[Sequence[str]] = None) -> Dict[str, float]:
+    """Время локальных алгоритмов на CSR, в миллисекундах
+
+    picks - имена для поиска (для сравнения с Cypher на тех же узлах),
+    иначе samples случайных узлов.
+    """
+    if picks is None:
+        rng = np.random.default_rng(seed)
+        picks = [graph.names[i]
+                 for i in rng.integers(0, graph.size, samples)]
+    samples = len(picks)
+    timings = {}
+
+    start = time.perf_counter()
+    graph.pagerank()
+    timings['pagerank'] = (time.perf_counter() - start) * 1000
+
+    start = time.perf_counter()
+    for name in picks:
+        graph.friends_of_friends(name)
+    timings['friends_of_friends'] = \
+        (time.perf_counter() - start) * 1000 / samples
+
+    start = time.perf_counter()
+    for name in picks:
+        graph.recommend_friends(name)
+    timings['recommend_friends'] = \
+        (time.perf_counter() - start) * 1000 / samples
+
+    graph.undirected()
+    start = time.perf_counter()
+    for source, target in zip(picks, reversed(picks)):
+        graph.shortest_path(source, target)
+    timings['shortest_path'] = (time.perf_counter() - start) * 1000 / samples
+    return timings
+
+
+if __name__ == "__main__":
+    start = time.perf_counter()
+    graph = synthetic_graph()
+    print(f"CSR граф: {graph.size} узлов, {len(graph.targets)} ребер, "
+          f"построен за {time.perf_counter() - start:.2f} сек")
+    for name, ms in benchmark(graph).items():
+        print(f"{name}: {ms:.3f} мс")
@@ -0,0 +1,701 @@
+"""Замеры задержек клиентов всех хранилищ примеров
+
+Обертки вокруг get_connection (1.py; для 2.py - CommandListener pymongo),
+get_client (3.py, 4.py, 6.py), Neo4jConnection, RedisExample и
+Tile38Client считают по каждой операции
+гистограмму задержек, число вызовов и ошибок, строки/документы в ответе,
+оценку байт в запросе и ответе и время ожидания соединения из пула.
+
+Гистограммы выделяются заранее (логарифмические корзины с 16 делениями
+на октаву, как в HdrHistogram), запись - одно вычисление индекса и
+инкремент. sample_every=N замеряет только каждый N-й вызов: вызовы и
+ошибки считаются по всем, а строки и байты выборки умножаются на N и
+дают оценку полного объема. Счетчики меняются под блокировкой - клиенты
+вызываются из многих потоков.
+"""
+import functools
+import itertools
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+SUB_BUCKET_BITS = 4
+SUB_BUCKETS = 1 << SUB_BUCKET_BITS
+MAX_EXPONENT = 40  # 2^40 нс - около 18 минут
+BUCKETS = (MAX_EXPONENT - SUB_BUCKET_BITS + 2) * SUB_BUCKETS
+
+# Границы корзин Prometheus-гистограммы, в секундах
+PROMETHEUS_BOUNDS = (0.0001, 0.00025, 0.0005, 0.001, 0.0025, 0.005, 0.01,
+                     0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def bucket_index(ns: int) -> int:
+    if ns < SUB_BUCKETS:
+        return max(ns, 0)
+    exponent = ns.bit_length() - 1
+    if exponent > MAX_EXPONENT:
+        return BUCKETS - 1
+    shift = exponent - SUB_BUCKET_BITS
+    return (shift + 1) * SUB_BUCKETS + ((ns >> shift) & (SUB_BUCKETS - 1))
+
+
+def bucket_upper(index: int) -> int:
+    """Верхняя граница (не включительно) корзины в наносекундах"""
+    block, sub = divmod(index, SUB_BUCKETS)
+    if block == 0:
+        return sub + 1
+    return (SUB_BUCKETS + sub + 1) << (block - 1)
+
+
+class Histogram:
+    """Гистограмма задержек с фиксированным набором корзин"""
+
+    __slots__ = ('counts', 'count', 'total', 'max', '_lock')
+
+    def __init__(self):
+        self.counts = [0] * BUCKETS
+        self.count = 0
+        self.total = 0
+        self.max = 0
+        self._lock = threading.Lock()
+
+    def record(self, ns: int):
+        index = bucket_index(ns)
+        with self._lock:
+            self.counts[index] += 1
+            self.count += 1
+            self.total += ns
+            if ns > self.max:
+                self.max = ns
+
+    def percentile(self, q: float) -> int:
+        """Оценка q-го перцентиля сверху (точность ~6%), в наносекундах"""
+        if not self.count:
+            return 0
+        target = q / 100 * self.count
+        seen = 0
+        for index, count in enumerate(self.counts):
+            seen += count
+            if count and seen >= target:
+                return min(bucket_upper(index), self.max)
+        return self.max
+
+    def cumulative(self, bounds_ns) -> Tuple[List[int], int, int]:
+        """Согласованный снимок: замеров не больше каждой границы, всего
+        замеров и их сумма
+
+        Корзина, в которую попадает граница, учитывается целиком, поэтому
+        счетчик может захватить замеры чуть выше границы (в пределах ~6%),
+        но не теряет лежащие ниже нее.
+        """
+        with self._lock:
+            counts = [sum(self.counts[:bucket_index(ns) + 1])
+                      for ns in bounds_ns]
+            return counts, self.count, self.total
+
+    def summary(self) -> Dict[str, float]:
+        return {
+            'count': self.count,
+            'mean_ms': self.total / self.count / 1e6 if self.count else 0.0,
+            'p50_ms': self.percentile(50) / 1e6,
+            'p95_ms': self.percentile(95) / 1e6,
+            'p99_ms': self.percentile(99) / 1e6,
+            'max_ms': self.max / 1e6,
+        }
+
+
+class OperationStats:
+    """Счетчики одной операции одного хранилища"""
+
+    __slots__ = ('latency', 'calls', 'errors', 'rows', 'bytes_in',
+                 'bytes_out', '_lock')
+
+    def __init__(self):
+        self.latency = Histogram()
+        self.calls = 0
+        self.errors = 0
+        self.rows = 0
+        self.bytes_in = 0
+        self.bytes_out = 0
+        self._lock = threading.Lock()
+
+    def add(self, calls: int = 0, errors: int = 0, rows: int = 0,
+            bytes_in: int = 0, bytes_out: int = 0):
+        with self._lock:
+            self.calls += calls
+            self.errors += errors
+            self.rows += rows
+            self.bytes_in += bytes_in
+            self.bytes_out += bytes_out
+
+    def counters(self) -> Dict[str, int]:
+        with self._lock:
+            return {'calls': self.calls, 'errors': self.errors,
+                    'rows': self.rows, 'bytes_in': self.bytes_in,
+                    'bytes_out': self.bytes_out}
+
+    def summary(self) -> Dict[str, float]:
+        return {**self.counters(), **self.latency.summary()}
+
+
+class Metrics:
+    """Реестр статистики: (хранилище, операция) -> OperationStats"""
+
+    def __init__(self, sample_every: int = 1):
+        self.sample_every = max(1, sample_every)
+        self.operations: Dict[Tuple[str, str], OperationStats] = {}
+        self.pool_wait: Dict[str, Histogram] = {}
+        self._calls = itertools.count()
+        self._lock = threading.Lock()
+
+    def stats(self, backend: str, operation: str) -> OperationStats:
+        key = (backend, operation)
+        stats = self.operations.get(key)
+        if stats is None:
+            with self._lock:
+                stats = self.operations.setdefault(key, OperationStats())
+        return stats
+
+    def sampled(self) -> bool:
+        return self.sample_every == 1 or \
+            next(self._calls) % self.sample_every == 0
+
+    def observe_pool_wait(self, backend: str, ns: int):
+        histogram = self.pool_wait.get(backend)
+        if histogram is None:
+            with self._lock:
+                histogram = self.pool_wait.setdefault(backend, Histogram())
+        histogram.record(ns)
+
+    def snapshot(self) -> Dict[str, Dict]:
+        result: Dict[str, Dict] = {}
+        for (backend, operation), stats in sorted(self.operations.items()):
+            result.setdefault(backend, {})[operation] = stats.summary()
+        for backend, histogram in sorted(self.pool_wait.items()):
+            result.setdefault(backend, {})['pool_wait'] = histogram.summary()
+        return result
+
+    def report(self, write: Callable[[str], Any] = print):
+        write(f"{'Хранилище.операция':<36}{'вызовов':>9}{'p50, мс':>9}"
+              f"{'p99, мс':>9}{'строк':>9}{'KB вх':>9}{'KB исх':>9}")
+        for backend, operations in self.snapshot().items():
+            for operation, s in operations.items():
+                write(f"{backend + '.' + operation:<36}"
+                      f"{s.get('calls', s['count']):>9}{s['p50_ms']:>9.3f}"
+                      f"{s['p99_ms']:>9.3f}{s.get('rows', 0):>9}"
+                      f"{s.get('bytes_in', 0) / 1024:>9.1f}"
+                      f"{s.get('bytes_out', 0) / 1024:>9.1f}")
+
+
+def estimate_size(value, depth: int = 2) -> int:
+    """Грубая оценка размера данных в байтах без сериализации"""
+    if value is None:
+        return 0
+    if isinstance(value, (bytes, bytearray, memoryview, str)):
+        return len(value)
+    if isinstance(value, (int, float)):
+        return 8
+    if depth and isinstance(value, dict):
+        return sum(estimate_size(k, depth - 1) + estimate_size(v, depth - 1)
+                   for k, v in value.items())
+    if depth and isinstance(value, (list, tuple)):
+        return sum(estimate_size(v, depth - 1) for v in value)
+    nbytes = getattr(value, 'nbytes', None)  # массивы NumPy
+    return nbytes if isinstance(nbytes, int) else 0
+
+
+def count_rows(target, result) -> int:
+    if isinstance(result, (list, tuple)):
+        return len(result)
+    if isinstance(result, dict) and isinstance(result.get('ids'), list):
+        ids = result['ids']
+        return sum(len(i) for i in ids) if ids and isinstance(
+            ids[0], list) else len(ids)
+    if result is None:
+        # execute курсора DB-API ничего не возвращает, число строк в rowcount
+        rowcount = getattr(target, 'rowcount', -1)
+        return rowcount if isinstance(rowcount, int) and rowcount > 0 else 0
+    return 0
+
+
+def _observe(metrics: Metrics, stats: OperationStats, target, args, kwargs,
+             result, started: int, bytes_in: Optional[Callable] = None,
+             rows_of: Optional[Callable] = None,
+             bytes_out: Optional[int] = None):
+    stats.latency.record(time.perf_counter_ns() - started)
+    if bytes_out is None:
+        bytes_out = estimate_size(args) + estimate_size(kwargs)
+    weight = metrics.sample_every
+    stats.add(calls=1,
+              rows=weight * (rows_of(args, result) if rows_of
+                             else count_rows(target, result)),
+              bytes_in=weight * (bytes_in(target, result) if bytes_in
+                                 else estimate_size(result)),
+              bytes_out=weight * bytes_out)
+
+
+def record_call(metrics: Metrics, stats: OperationStats, func: Callable,
+                args, kwargs, target=None,
+                bytes_in: Optional[Callable] = None,
+                bytes_out: Optional[Callable[[], int]] = None):
+    """Вызов func с учетом в stats (замер - только для выборки)
+
+    bytes_out - оценка запроса до вызова, если аргументы ее не дают.
+    """
+    sampled = metrics.sampled()
+    sent = bytes_out() if sampled and bytes_out else None
+    started = time.perf_counter_ns()
+    try:
+        result = func(*args, **kwargs)
+    except Exception:
+        stats.add(calls=1, errors=1)
+        raise
+    if sampled:
+        _observe(metrics, stats, target, args, kwargs, result, started,
+                 bytes_in, bytes_out=sent)
+    else:
+        stats.add(calls=1)
+    return result
+
+
+def timed(func: Callable, metrics: Metrics, backend: str, operation: str,
+          target=None, bytes_in: Optional[Callable] = None) -> Callable:
+    """Обертка синхронного вызова"""
+    stats = metrics.stats(backend, operation)
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        return record_call(metrics, stats, func, args, kwargs, target,
+                           bytes_in)
+    return wrapper
+
+
+def timed_async(func: Callable, metrics: Metrics, backend: str,
+                operation: Callable[..., str], target=None,
+                rows_of: Optional[Callable] = None) -> Callable:
+    """Обертка корутины; operation вычисляет имя по аргументам"""
+    @functools.wraps(func)
+    async def wrapper(*args, **kwargs):
+        stats = metrics.stats(backend, operation(*args))
+        sampled = metrics.sampled()
+        started = time.perf_counter_ns()
+        try:
+            result = await func(*args, **kwargs)
+        except Exception:
+            stats.add(calls=1, errors=1)
+            raise
+        if sampled:
+            _observe(metrics, stats, target, args, kwargs, result, started,
+                     rows_of=rows_of)
+        else:
+            stats.add(calls=1)
+        return result
+    return wrapper
+
+
+class InstrumentedProxy:
+    """Прокси клиента: замеряет методы из spec, остальное пропускает
+
+    spec = {'methods': {...}, 'nested': {метод: spec результата},
+            'bytes_in': функция(target, result)}
+    """
+
+    def __init__(self, target, metrics: Metrics, backend: str, spec: Dict,
+                 prefix: str = ''):
+        self._target = target
+        self._metrics = metrics
+        self._backend = backend
+        self._spec = spec
+        self._prefix = prefix
+        self._wrappers: Dict[str, Callable] = {}
+
+    def __getattr__(self, name):
+        wrapper = self._wrappers.get(name)
+        if wrapper is not None:
+            return wrapper
+        attr = getattr(self._target, name)
+        spec = self._spec
+        if name in spec.get('methods', ()):
+            wrapper = timed(attr, self._metrics, self._backend,
+                            self._prefix + name, self._target,
+                            spec.get('bytes_in'))
+        elif name in spec.get('nested', {}):
+            nested = spec['nested'][name]
+
+            @functools.wraps(attr)
+            def wrapper(*args, **kwargs):
+                return InstrumentedProxy(attr(*args, **kwargs), self._metrics,
+                                         self._backend, nested,
+                                         nested.get('prefix', ''))
+        else:
+            return attr
+        self._wrappers[name] = wrapper
+        return wrapper
+
+    def __setattr__(self, name, value):
+        if name.startswith('_'):
+            object.__setattr__(self, name, value)
+        else:
+            setattr(self._target, name, value)
+
+    def __enter__(self):
+        self._target.__enter__()
+        return self
+
+    def __exit__(self, *exc):
+        return self._target.__exit__(*exc)
+
+    def __iter__(self):
+        return iter(self._target)
+
+
+def _clickhouse_bytes_in(client, result) -> int:
+    # Драйвер сам считает байты блоков ответа
+    last_query = getattr(client, 'last_query', None)
+    profile = getattr(last_query, 'profile_info', None)
+    return getattr(profile, 'bytes', 0) or estimate_size(result)
+
+
+POSTGRES_SPEC = {
+    'methods': {'commit', 'rollback'},
+    'nested': {'cursor': {'methods': {'execute', 'executemany', 'fetchone',
+                                      'fetchall', 'fetchmany'}}},
+}
+INFLUX_SPEC = {
+    'methods': {'ping'},
+    'nested': {
+        'write_api': {'prefix': 'write_api.', 'methods': {'write'}},
+        'query_api': {'prefix': 'query_api.',
+                      'methods': {'query', 'query_raw', 'query_stream',
+                                  'query_data_frame'}},
+    },
+}
+_CHROMA_COLLECTION = {'prefix': 'collection.',
+                      'methods': {'add', 'upsert', 'update', 'query', 'get',
+                                  'delete', 'count'}}
+CHROMA_SPEC = {
+    'methods': {'heartbeat', 'list_collections', 'delete_collection'},
+    'nested': {'create_collection': _CHROMA_COLLECTION,
+               'get_collection': _CHROMA_COLLECTION,
+               'get_or_create_collection': _CHROMA_COLLECTION},
+}
+CLICKHOUSE_SPEC = {
+    'methods': {'execute', 'execute_iter', 'insert_dataframe',
+                'query_dataframe'},
+    'bytes_in': _clickhouse_bytes_in,
+}
+
+
+def instrument_factory(factory: Callable, metrics: Metrics, backend: str,
+                       spec: Dict) -> Callable:
+    """get_connection/get_client: время создания идет в pool_wait"""
+    @functools.wraps(factory)
+    def wrapper(*args, **kwargs):
+        started = time.perf_counter_ns()
+        client = factory(*args, **kwargs)
+        metrics.observe_pool_wait(backend, time.perf_counter_ns() - started)
+        return InstrumentedProxy(client, metrics, backend, spec)
+    wrapper.instrumented = True
+    return wrapper
+
+
+def mongo_listener(metrics: Metrics, backend: str = 'mongo'):
+    """CommandListener pymongo: регистрируется до создания MongoClient"""
+    from pymongo import monitoring
+
+    class Listener(monitoring.CommandListener):
+        def __init__(self):
+            self.pending: Dict[int, int] = {}
+
+        def started(self, event):
+            self.pending[event.request_id] = estimate_size(event.command)
+
+        def succeeded(self, event):
+            stats = metrics.stats(backend, event.command_name)
+            stats.latency.record(event.duration_micros * 1000)
+            reply = event.reply or {}
+            cursor = reply.get('cursor') or {}
+            batch = cursor.get('firstBatch', cursor.get('nextBatch'))
+            stats.add(calls=1,
+                      rows=len(batch) if batch is not None
+                      else int(reply.get('n', 0)),
+                      bytes_in=estimate_size(reply, depth=3),
+                      bytes_out=self.pending.pop(event.request_id, 0))
+
+        def failed(self, event):
+            self.pending.pop(event.request_id, None)
+            metrics.stats(backend, event.command_name).add(calls=1,
+                                                           errors=1)
+
+    listener = Listener()
+    monitoring.register(listener)
+    return listener
+
+
+def instrument_redis(client, metrics: Metrics, backend: str = 'redis'):
+    """Все команды клиента redis-py, пайплайны и ожидание соединения"""
+    if getattr(client, '_instrumented', False):
+        return client
+    execute_command = client.execute_command
+
+    @functools.wraps(execute_command)
+    def command(*args, **options):
+        stats = metrics.stats(backend, str(args[0]).upper())
+        return record_call(metrics, stats, execute_command, args, options)
+
+    pipeline = client.pipeline
+
+    @functools.wraps(pipeline)
+    def instrumented_pipeline(*args, **kwargs):
+        pipe = pipeline(*args, **kwargs)
+        execute = pipe.execute
+
+        def run(*args, **kwargs):
+            # Стек команд надо оценить до execute - он очищается
+            stats = metrics.stats(backend, 'PIPELINE')
+            return record_call(
+                metrics, stats, execute, args, kwargs,
+                bytes_out=lambda: estimate_size(
+                    [c[0] for c in getattr(pipe, 'command_stack', [])],
+                    depth=3))
+        pipe.execute = run
+        return pipe
+
+    pool = client.connection_pool
+    get_connection = pool.get_connection
+
+    @functools.wraps(get_connection)
+    def acquire(*args, **kwargs):
+        started = time.perf_counter_ns()
+        try:
+            return get_connection(*args, **kwargs)
+        finally:
+            metrics.observe_pool_wait(backend,
+                                      time.perf_counter_ns() - started)
+
+    client.execute_command = command
+    client.pipeline = instrumented_pipeline
+    pool.get_connection = acquire
+    client._instrumented = True
+    return client
+
+
+def instrument_neo4j(connection, metrics: Metrics, backend: str = 'neo4j',
+                     labels: Optional[Dict[str, str]] = None):
+    """run_query/execute_read/execute_write; labels: текст запроса -> имя"""
+    labels = labels or {}
+    for name in ('run_query', 'execute_read', 'execute_write'):
+        method = getattr(connection, name)
+
+        def wrapper(query, *args, _method=method, _name=name, **kwargs):
+            stats = metrics.stats(backend, labels.get(query, _name))
+            return record_call(metrics, stats, _method, (query, *args),
+                               kwargs)
+        setattr(connection, name, functools.wraps(method)(wrapper))
+    return connection
+
+
+def _tile38_rows(args, reply) -> int:
+    # NEARBY/WITHIN/SCAN отвечают [курсор, [объекты]], pyle38 - JSON
+    if isinstance(reply, list) and len(reply) == 2 and \
+            isinstance(reply[1], list):
+        return len(reply[1])
+    if isinstance(reply, dict):
+        for name in ('objects', 'points', 'ids', 'hooks'):
+            if isinstance(reply.get(name), list):
+                return len(reply[name])
+        return 1 if 'object' in reply else 0
+    return 0
+
+
+def _tile38_command(command, *args) -> str:
+    # pyle38 передает Command/SubCommand - str-перечисления
+    return str(getattr(command, 'value', command)).upper()
+
+
+def instrument_tile38(tile38, metrics: Metrics, backend: str = 'tile38'):
+    """Команды Tile38Pool и pyle38, ожидание семафора, пакетные записи
+
+    Построители запросов pyle38 (set(...).point(...).exec(), nearby,
+    within, sethook...) выполняются через Client.command клиента
+    tile38.client, поэтому подменяется этот метод экземпляра.
+    """
+    client = tile38.client
+    if callable(getattr(client, 'command', None)):
+        client.command = timed_async(client.command, metrics, backend,
+                                     _tile38_command, rows_of=_tile38_rows)
+
+    pool = tile38.pool
+    pool._call = timed_async(pool._call, metrics, backend,
+                             lambda client, *command: str(command[0]).upper(),
+                             rows_of=_tile38_rows)
+
+    acquire = pool.semaphore.acquire
+
+    async def wait_for_slot():
+        started = time.perf_counter_ns()
+        try:
+            return await acquire()
+        finally:
+            metrics.observe_pool_wait(backend,
+                                      time.perf_counter_ns() - started)
+    pool.semaphore.acquire = wait_for_slot
+
+    writer = tile38.writer
+
+    @functools.wraps(writer)
+    def instrumented_writer(key: str = 'fleet'):
+        bulk = writer(key)
+        if not getattr(bulk, '_instrumented', False):
+            bulk._write = timed_async(bulk._write, metrics, backend,
+                                      lambda batch: 'SET_BATCH',
+                                      rows_of=lambda args, _: len(args[0]))
+            bulk._instrumented = True
+        return bulk
+    tile38.writer = instrumented_writer
+    return tile38
+
+
+def _after_init(cls, instrument: Callable):
+    """Инструментирование каждого нового экземпляра класса"""
+    if getattr(cls, '_instrumented', False):
+        return
+    init = cls.__init__
+
+    @functools.wraps(init)
+    def __init__(self, *args, **kwargs):
+        init(self, *args, **kwargs)
+        instrument(self)
+    cls.__init__ = __init__
+    cls._instrumented = True
+
+
+def instrument_script(number: int, module, metrics: Metrics):
+    """Подмена фабрик клиентов в загруженном n.py"""
+    factories = {1: ('get_connection', 'postgres', POSTGRES_SPEC),
+                 3: ('get_client', 'influx', INFLUX_SPEC),
+                 4: ('get_client', 'chroma', CHROMA_SPEC),
+                 6: ('get_client', 'clickhouse', CLICKHOUSE_SPEC)}
+    if number in factories:
+        name, backend, spec = factories[number]
+        factory = getattr(module, name)
+        if not getattr(factory, 'instrumented', False):
+            setattr(module, name,
+                    instrument_factory(factory, metrics, backend, spec))
+    elif number == 2:
+        mongo_listener(metrics)
+    elif number == 5:
+        labels = {query: name for name, query in
+                  getattr(module, 'PROJECT_QUERIES', {}).items()}
+        _after_init(module.Neo4jConnection,
+                    lambda c: instrument_neo4j(c, metrics, labels=labels))
+    elif number == 7:
+        _after_init(module.RedisExample,
+                    lambda e: instrument_redis(e.redis, metrics))
+    elif number == 8:
+        _after_init(module.Tile38Client,
+                    lambda t: instrument_tile38(t, metrics))
+
+
+def prometheus_text(metrics: Metrics, prefix: str = 'db_client') -> str:
+    """Текстовый формат экспозиции Prometheus
+
+    Строки каждого семейства метрик идут подряд под его # TYPE.
+    """
+    lines = []
+    operations = sorted(metrics.operations.items())
+
+    bounds_ns = [int(bound * 1e9) for bound in PROMETHEUS_BOUNDS]
+
+    def histogram_lines(name: str, labels: str, histogram: Histogram):
+        counts, count, total = histogram.cumulative(bounds_ns)
+        for bound, below in zip(PROMETHEUS_BOUNDS, counts):
+            lines.append(f'{prefix}_{name}_bucket{{{labels},le="{bound}"}} '
+                         f'{below}')
+        lines.append(f'{prefix}_{name}_bucket{{{labels},le="+Inf"}} {count}')
+        lines.append(f'{prefix}_{name}_sum{{{labels}}} {total / 1e9}')
+        lines.append(f'{prefix}_{name}_count{{{labels}}} {count}')
+
+    def operation_labels(backend: str, operation: str) -> str:
+        return f'backend="{backend}",operation="{operation}"'
+
+    lines.append(f'# TYPE {prefix}_latency_seconds histogram')
+    for (backend, operation), stats in operations:
+        histogram_lines('latency_seconds',
+                        operation_labels(backend, operation), stats.latency)
+
+    values = {key: stats.counters() for key, stats in operations}
+    for name in ('calls', 'errors', 'rows', 'bytes_in', 'bytes_out'):
+        lines.append(f'# TYPE {prefix}_{name}_total counter')
+        for key in values:
+            lines.append(f'{prefix}_{name}_total'
+                         f'{{{operation_labels(*key)}}} {values[key][name]}')
+
+    lines.append(f'# TYPE {prefix}_pool_wait_seconds histogram')
+    for backend, histogram in sorted(metrics.pool_wait.items()):
+        histogram_lines('pool_wait_seconds', f'backend="{backend}"',
+                        histogram)
+    return '\n'.join(lines) + '\n'
+
+
+class PrometheusSink:
+    """HTTP-эндпоинт /metrics в фоновом потоке
+
+    По умолчанию слушает только 127.0.0.1; чтобы отдавать метрики
+    внешнему Prometheus, host задается явно.
+    """
+
+    def __init__(self, metrics: Metrics, port: int = 9108,
+                 host: str = '127.0.0.1'):
+        self.metrics = metrics
+        sink = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_GET(self):
+                body = prometheus_text(sink.metrics).encode()
+                self.send_response(200)
+                self.send_header('Content-Type',
+                                 'text/plain; version=0.0.4')
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            def log_message(self, *args):
+                pass
+
+        self.server = ThreadingHTTPServer((host, port), Handler)
+        self.thread = threading.Thread(target=self.server.serve_forever,
+                                       daemon=True)
+
+    def start(self) -> 'PrometheusSink':
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+class LogSink:
+    """Периодический вывод отчета (print или logger.info)"""
+
+    def __init__(self, metrics: Metrics, interval: float = 10.0,
+                 write: Callable[[str], Any] = print):
+        self.metrics = metrics
+        self.interval = interval
+        self.write = write
+        self._stop = threading.Event()
+        self.thread = threading.Thread(target=self._run, daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.metrics.report(self.write)
+
+    def start(self) -> 'LogSink':
+        self.thread.start()
+        return self
+
+    def stop(self):
+        self._stop.set()
+        self.thread.join()
@@ -0,0 +1,182 @@
+import time
+from concurrent.futures import ThreadPoolExecutor, FIRST_COMPLETED, wait
+from itertools import islice
+from typing import Dict, Iterable, Iterator, List
+
+import numpy as np
+
+from neo4j_schema import setup_schema
+
+
+MERGE_PEOPLE = """
+UNWIND $rows AS row
+MERGE (p:Person {name: row.name})
+ON CREATE SET p.joined = datetime()
+SET p += row
+"""
+
+MERGE_FRIENDS = """
+UNWIND $rows AS row
+MATCH (a:Person {name: row.source})
+MATCH (b:Person {name: row.target})
+MERGE (a)-[f:FRIENDS]->(b)
+ON CREATE SET f.since = datetime()
+"""
+
+MERGE_POSTS = """
+UNWIND $rows AS row
+MERGE (post:Post {id: row.id})
+ON CREATE SET post.created = datetime()
+SET post.content = row.content
+WITH post, row
+MATCH (author:Person {name: row.author})
+MERGE (author)-[:POSTED]->(post)
+"""
+
+MERGE_LIKES = """
+UNWIND $rows AS row
+MATCH (person:Person {name: row.person})
+MATCH (post:Post {id: row.post_id})
+MERGE (person)-[l:LIKED]->(post)
+ON CREATE SET l.timestamp = datetime()
+"""
+
+
+def batches(rows: Iterable, size: int) -> Iterator[List]:
+    """Разбиение потока на списки фиксированного размера"""
+    iterator = iter(rows)
+    while True:
+        batch = list(islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class GraphBulkLoader:
+    """Пакетная загрузка Person/FRIENDS/Post через UNWIND $rows
+
+    connection - Neo4jConnection из 5.py (нужен execute_write).
+    workers > 1 включает параллельную запись пакетов узлов; это безопасно
+    только для непересекающихся наборов узлов, поэтому ребра всегда
+    пишутся последовательно, чтобы не ловить взаимные блокировки.
+    """
+
+    def __init__(self, connection, batch_size: int = 10000,
+                 workers: int = 1):
+        self.connection = connection
+        self.batch_size = batch_size
+        self.workers = workers
+
+    def ensure_schema(self):
+        """Ограничения уникальности (и их индексы) до начала загрузки"""
+        setup_schema(self.connection)
+
+    def _write(self, query: str, rows: Iterable[Dict],
+               parallel: bool = False) -> Dict[str, float]:
+        start = time.perf_counter()
+        total = 0
+
+        if not parallel or self.workers <= 1:
+            for batch in batches(rows, self.batch_size):
+                self.connection.execute_write(query, {'rows': batch})
+                total += len(batch)
+        else:
+            # Ограничиваем число пакетов в полете, чтобы не держать
+            # весь поток в памяти
+            with ThreadPoolExecutor(max_workers=self.workers) as pool:
+                pending = set()
+                for batch in batches(rows, self.batch_size):
+                    if len(pending) >= self.workers * 2:
+                        done, pending = wait(pending,
+                                             return_when=FIRST_COMPLETED)
+                        for future in done:
+                            total += future.result()
+                    pending.add(pool.submit(self._write_batch, query, batch))
+                for future in pending:
+                    total += future.result()
+
+        elapsed = time.perf_counter() - start
+        return {
+            'rows': total,
+            'seconds': elapsed,
+            'rows_per_sec': total / elapsed if elapsed else 0.0
+        }
+
+    def _write_batch(self, query: str, batch: List[Dict]) -> int:
+        self.connection.execute_write(query, {'rows': batch})
+        return len(batch)
+
+    def load_people(self, people: Iterable[Dict]) -> Dict[str, float]:
+        """people: словари с обязательным ключом name"""
+        return self._write(MERGE_PEOPLE, people, parallel=True)
+
+    def load_friendships(self, edges: Iterable) -> Dict[str, float]:
+        """edges: пары (source, target) или словари с теми же ключами"""
+        rows = (edge if isinstance(edge, dict)
+                else {'source': edge[0], 'target': edge[1]}
+                for edge in edges)
+        return self._write(MERGE_FRIENDS, rows)
+
+    def load_posts(self, posts: Iterable[Dict]) -> Dict[str, float]:
+        """posts: словари с ключами id, author, content"""
+        return self._write(MERGE_POSTS, posts)
+
+    def load_likes(self, likes: Iterable) -> Dict[str, float]:
+        """likes: пары (person, post_id) или словари с теми же ключами"""
+        rows = (like if isinstance(like, dict)
+                else {'person': like[0], 'post_id': like[1]}
+                for like in likes)
+        return self._write(MERGE_LIKES, rows)
+
+
+def synthetic_people(count: int, seed: int = 42) -> Iterator[Dict]:
+    """Синтетические пользователи person_0..person_{count-1}"""
+    rng = np.random.default_rng(seed)
+    ages = rng.integers(18, 70, size=count)
+    for i in range(count):
+        yield {'name': f'person_{i}', 'age': int(ages[i])}
+
+
+def synthetic_friendships(people: int, edges: int, power_law: bool = False,
+                          seed: int = 42) -> Iterator[tuple]:
+    """Синтетические ребра FRIENDS
+
+    При power_law=True один конец ребра выбирается по закону Ципфа,
+    а направление случайное - получается небольшое число супер-узлов
+    с огромной входящей и исходящей степенью.
+    """
+    rng = np.random.default_rng(seed)
+    block = 100000
+    for offset in range(0, edges, block):
+        size = min(block, edges - offset)
+        sources = rng.integers(0, people, size=size)
+        if power_law:
+            targets = (rng.zipf(1.5, size=size) - 1) % people
+            flip = rng.random(size) < 0.5
+            sources, targets = (np.where(flip, targets, sources),
+                                np.where(flip, sources, targets))
+        else:
+            targets = rng.integers(0, people, size=size)
+        for source, target in zip(sources, targets):
+            if source != target:
+                yield f'person_{source}', f'person_{target}'
+
+
+def synthetic_posts(people: int, count: int,
+                    seed: int = 42) -> Iterator[Dict]:
+    """Синтетические посты post_0.. со случайными авторами"""
+    rng = np.random.default_rng(seed)
+    authors = rng.integers(0, people, size=count)
+    for i in range(count):
+        yield {'id': i, 'author': f'person_{authors[i]}',
+               'content': f'Post {i}'}
+
+
+def synthetic_likes(people: int, posts: int, count: int,
+                    seed: int = 42) -> Iterator[tuple]:
+    """Синтетические лайки с популярностью постов по закону Ципфа"""
+    rng = np.random.default_rng(seed)
+    persons = rng.integers(0, people, size=count)
+    post_ids = (rng.zipf(1.5, size=count) - 1) % posts
+    for person, post_id in zip(persons, post_ids):
+        yield f'person_{person}', int(post_id)
@@ -0,0 +1,248 @@
+import threading
+from collections import OrderedDict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+from neo4j_bulk_loader import batches
+
+
+# Степень каждого шага обхода ограничена $degree_cap, чтобы супер-узлы
+# не раздували 2-hop обход до миллионов путей
+FRIEND_RECOMMENDATIONS = """
+MATCH (person:Person {name: $name})
+CALL {
+    WITH person
+    MATCH (person)-[:FRIENDS]->(friend)
+    RETURN friend LIMIT $degree_cap
+}
+CALL {
+    WITH friend
+    MATCH (friend)-[:FRIENDS]->(candidate)
+    RETURN candidate LIMIT $degree_cap
+}
+WITH person, candidate, COUNT(friend) as common_friends
+WHERE candidate <> person AND NOT (person)-[:FRIENDS]->(candidate)
+RETURN candidate.name as name, common_friends as score
+ORDER BY score DESC, name
+LIMIT $top_n
+"""
+
+POST_RECOMMENDATIONS = """
+MATCH (person:Person {name: $name})
+CALL {
+    WITH person
+    MATCH (person)-[:FRIENDS]->(friend)
+    RETURN friend LIMIT $degree_cap
+}
+CALL {
+    WITH friend
+    MATCH (friend)-[:LIKED]->(post:Post)
+    RETURN post LIMIT $degree_cap
+}
+WITH person, post, COUNT(friend) as friend_likes
+WHERE NOT (person)-[:LIKED]->(post) AND NOT (person)-[:POSTED]->(post)
+RETURN post.content as name, friend_likes as score
+ORDER BY score DESC, name
+LIMIT $top_n
+"""
+
+STORE_RECOMMENDATIONS = """
+UNWIND $rows AS row
+MATCH (p:Person {name: row.name})
+SET p.recommendedFriends = row.friends,
+    p.recommendedFriendScores = row.friend_scores,
+    p.recommendedPosts = row.posts,
+    p.recommendedPostScores = row.post_scores
+"""
+
+LOAD_RECOMMENDATIONS = """
+MATCH (p:Person {name: $name})
+WHERE p.recommendedFriends IS NOT NULL
+RETURN p.recommendedFriends as friends,
+       p.recommendedFriendScores as friend_scores,
+       p.recommendedPosts as posts,
+       p.recommendedPostScores as post_scores
+"""
+
+CLEAR_RECOMMENDATIONS = """
+UNWIND $names AS name
+MATCH (p:Person {name: name})
+REMOVE p.recommendedFriends, p.recommendedFriendScores,
+       p.recommendedPosts, p.recommendedPostScores
+"""
+
+FOLLOWERS = """
+MATCH (follower:Person)-[:FRIENDS]->(:Person {name: $name})
+RETURN follower.name as name
+"""
+
+
+class LRUCache:
+    """Потокобезопасный LRU-кэш на OrderedDict"""
+
+    def __init__(self, max_size: int = 10000):
+        self.max_size = max_size
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, key):
+        with self._lock:
+            if key not in self._data:
+                self.misses += 1
+                return None
+            self.hits += 1
+            self._data.move_to_end(key)
+            return self._data[key]
+
+    def put(self, key, value):
+        with self._lock:
+            self._data[key] = value
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def invalidate(self, keys: Iterable):
+        with self._lock:
+            for key in keys:
+                self._data.pop(key, None)
+
+    def __len__(self):
+        return len(self._data)
+
+
+class RecommendationService:
+    """Предрасчитанные рекомендации друзей и постов для Person
+
+    Результаты лежат в LRU в процессе и, при store_in_graph=True, в
+    свойствах узла Person. Изменения FRIENDS/LIKED должны проходить через
+    add_friendship/add_like (или сопровождаться вызовом on_*_changed),
+    тогда инвалидируются только затронутые пользователи.
+    """
+
+    def __init__(self, connection, top_n: int = 10, degree_cap: int = 1000,
+                 cache_size: int = 10000, store_in_graph: bool = False):
+        self.connection = connection
+        self.top_n = top_n
+        self.degree_cap = degree_cap
+        self.store_in_graph = store_in_graph
+        self.cache = LRUCache(cache_size)
+
+    def _compute(self, name: str, session=None) -> Dict[str, List]:
+        params = {'name': name, 'top_n': self.top_n,
+                  'degree_cap': self.degree_cap}
+        friends = self.connection.execute_read(FRIEND_RECOMMENDATIONS, params,
+                                               session=session)
+        posts = self.connection.execute_read(POST_RECOMMENDATIONS, params,
+                                             session=session)
+        return {
+            'friends': [(r['name'], r['score']) for r in friends],
+            'posts': [(r['name'], r['score']) for r in posts]
+        }
+
+    def _load_from_graph(self, name: str) -> Optional[Dict[str, List]]:
+        records = self.connection.execute_read(LOAD_RECOMMENDATIONS,
+                                               {'name': name})
+        if not records:
+            return None
+        r = records[0]
+        return {
+            'friends': list(zip(r['friends'], r['friend_scores'])),
+            'posts': list(zip(r['posts'], r['post_scores']))
+        }
+
+    def _store(self, items: List[Tuple[str, Dict[str, List]]]):
+        rows = [{
+            'name': name,
+            'friends': [f for f, _ in recs['friends']],
+            'friend_scores': [s for _, s in recs['friends']],
+            'posts': [p for p, _ in recs['posts']],
+            'post_scores': [s for _, s in recs['posts']]
+        } for name, recs in items]
+        self.connection.execute_write(STORE_RECOMMENDATIONS, {'rows': rows})
+
+    def get(self, name: str) -> Dict[str, List]:
+        """Рекомендации: LRU -> свойства узла -> расчет"""
+        recs = self.cache.get(name)
+        if recs is not None:
+            return recs
+
+        if self.store_in_graph:
+            recs = self._load_from_graph(name)
+        if recs is None:
+            recs = self._compute(name)
+            if self.store_in_graph:
+                self._store([(name, recs)])
+        self.cache.put(name, recs)
+        return recs
+
+    def friend_recommendations(self, name: str) -> List[Tuple[str, int]]:
+        return self.get(name)['friends']
+
+    def post_recommendations(self, name: str) -> List[Tuple[str, int]]:
+        return self.get(name)['posts']
+
+    def precompute(self, names: Iterable[str], batch_size: int = 500) -> int:
+        """Пакетный предрасчет для списка пользователей"""
+        total = 0
+        with self.connection.session(read_only=True) as session:
+            for batch in batches(names, batch_size):
+                items = [(name, self._compute(name, session=session))
+                         for name in batch]
+                for name, recs in items:
+                    self.cache.put(name, recs)
+                if self.store_in_graph:
+                    self._store(items)
+                total += len(items)
+        return total
+
+    def invalidate(self, names: Iterable[str]):
+        names = list(set(names))
+        self.cache.invalidate(names)
+        if self.store_in_graph and names:
+            self.connection.execute_write(CLEAR_RECOMMENDATIONS,
+                                          {'names': names})
+
+    def _followers(self, name: str) -> List[str]:
+        return [r['name'] for r in
+                self.connection.stream_query(FOLLOWERS, {'name': name})]
+
+    def on_friendship_changed(self, source: str, target: str):
+        """Ребро source-[:FRIENDS]->target добавлено или удалено
+
+        Меняются рекомендации самого source (друзья и посты) и тех,
+        у кого source в друзьях: target для них кандидат через source.
+        """
+        self.invalidate([source] + self._followers(source))
+
+    def on_like_changed(self, person: str):
+        """Ребро person-[:LIKED]->post добавлено или удалено
+
+        Лайк влияет на рекомендации постов самого person и тех,
+        у кого он в друзьях.
+        """
+        self.invalidate([person] + self._followers(person))
+
+    def add_friendship(self, source: str, target: str):
+        self.connection.execute_write("""
+            MATCH (a:Person {name: $source}), (b:Person {name: $target})
+            MERGE (a)-[f:FRIENDS]->(b)
+            ON CREATE SET f.since = datetime()
+        """, {'source': source, 'target': target})
+        self.on_friendship_changed(source, target)
+
+    def remove_friendship(self, source: str, target: str):
+        self.connection.execute_write("""
+            MATCH (:Person {name: $source})-[f:FRIENDS]->
+                  (:Person {name: $target})
+            DELETE f
+        """, {'source': source, 'target': target})
+        self.on_friendship_changed(source, target)
+
+    def add_like(self, person: str, post_id):
+        self.connection.execute_write("""
+            MATCH (p:Person {name: $person}), (post:Post {id: $post_id})
+            MERGE (p)-[l:LIKED]->(post)
+            ON CREATE SET l.timestamp = datetime()
+        """, {'person': person, 'post_id': post_id})
+        self.on_like_changed(person)
@@ -0,0 +1,105 @@
+import time
+from typing import Dict, List, Optional
+
+
+SCHEMA_QUERIES = [
+    # Уникальность создает и индекс, поэтому поиск по name не сканирует метку
+    """
+    CREATE CONSTRAINT person_name_unique IF NOT EXISTS
+    FOR (p:Person) REQUIRE p.name IS UNIQUE
+    """,
+    """
+    CREATE CONSTRAINT post_id_unique IF NOT EXISTS
+    FOR (p:Post) REQUIRE p.id IS UNIQUE
+    """,
+    """
+    CREATE RANGE INDEX post_created IF NOT EXISTS
+    FOR (p:Post) ON (p.created)
+    """,
+    """
+    CREATE TEXT INDEX post_content IF NOT EXISTS
+    FOR (p:Post) ON (p.content)
+    """,
+]
+
+
+def setup_schema(connection, timeout: float = 300.0):
+    """Создание ограничений и индексов с ожиданием их готовности"""
+    for query in SCHEMA_QUERIES:
+        connection.execute_write(query)
+    wait_for_indexes(connection, timeout=timeout)
+
+
+def wait_for_indexes(connection, timeout: float = 300.0,
+                     poll_interval: float = 0.5):
+    """Ожидание перехода всех индексов в состояние ONLINE"""
+    deadline = time.monotonic() + timeout
+    while True:
+        records = connection.execute_read("""
+            SHOW INDEXES
+            YIELD name, state, populationPercent
+            RETURN name, state, populationPercent
+        """)
+        failed = [r['name'] for r in records if r['state'] == 'FAILED']
+        if failed:
+            raise RuntimeError(f"Не удалось построить индексы: {failed}")
+
+        pending = [r for r in records if r['state'] != 'ONLINE']
+        if not pending:
+            return
+
+        if time.monotonic() > deadline:
+            progress = ', '.join(f"{r['name']} {r['populationPercent']:.0f}%"
+                                 for r in pending)
+            raise TimeoutError(f"Индексы не готовы за {timeout} сек: "
+                               f"{progress}")
+        time.sleep(poll_interval)
+
+
+def _collect_db_hits(plan: Dict, operators: List[Dict]) -> int:
+    """Рекурсивный обход профиля плана с подсчетом обращений к БД"""
+    hits = plan.get('dbHits', 0)
+    operators.append({
+        'operator': plan.get('operatorType'),
+        'db_hits': hits,
+        'rows': plan.get('rows', 0)
+    })
+    for child in plan.get('children', []):
+        hits += _collect_db_hits(child, operators)
+    return hits
+
+
+def profile_query(connection, query: str,
+                  parameters: Optional[Dict] = None) -> Dict:
+    """Выполнение запроса под PROFILE и сбор db hits по операторам"""
+    with connection.session(read_only=True) as session:
+        result = session.run(f"PROFILE {query}", parameters or {})
+        rows = len(list(result))
+        summary = result.consume()
+
+    operators = []
+    total = _collect_db_hits(summary.profile or {}, operators)
+    return {
+        'db_hits': total,
+        'rows': rows,
+        'operators': operators,
+        'time_ms': ((summary.result_available_after or 0)
+                    + (summary.result_consumed_after or 0))
+    }
+
+
+def profile_queries(connection, queries: Dict[str, str]) -> Dict[str, Dict]:
+    """Профилирование набора именованных запросов с выводом отчета"""
+    report = {}
+    print(f"\n{'Запрос':<28}{'db hits':>12}{'строк':>8}{'мс':>8}")
+    for name, query in queries.items():
+        stats = profile_query(connection, query)
+        report[name] = stats
+        print(f"{name:<28}{stats['db_hits']:>12}{stats['rows']:>8}"
+              f"{stats['time_ms']:>8}")
+        # Самые дорогие операторы плана
+        for op in sorted(stats['operators'], key=lambda o: o['db_hits'],
+                         reverse=True)[:3]:
+            if op['db_hits']:
+                print(f"    {op['operator']}: {op['db_hits']} db hits")
+    return report
@@ -0,0 +1,266 @@
+import functools
+import json
+import math
+import pickle
+import random
+import threading
+import time
+import uuid
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Callable, Dict, Optional, Tuple
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+
+def _json_dumps(value) -> bytes:
+    return json.dumps(value, separators=(',', ':')).encode()
+
+
+SERIALIZERS: Dict[str, Tuple[Callable, Callable, bool]] = {
+    # имя: (dumps, loads, бинарный формат)
+    'json': (_json_dumps, json.loads, False),
+    'pickle': (lambda v: pickle.dumps(v, protocol=5), pickle.loads, True),
+}
+if orjson is not None:
+    SERIALIZERS['orjson'] = (orjson.dumps, orjson.loads, False)
+if msgpack is not None:
+    SERIALIZERS['msgpack'] = (
+        functools.partial(msgpack.packb, use_bin_type=True),
+        functools.partial(msgpack.unpackb, raw=False),
+        True
+    )
+
+# Отличает закэшированный None от промаха
+MISSING = object()
+
+# Снятие блокировки только своим владельцем
+RELEASE_LOCK = """
+if redis.call('GET', KEYS[1]) == ARGV[1] then
+    return redis.call('DEL', KEYS[1])
+end
+return 0
+"""
+
+
+class TTLCache:
+    """LRU-кэш в процессе с временем жизни записей"""
+
+    def __init__(self, max_size: int = 10000, ttl: float = 5.0):
+        self.max_size = max_size
+        self.ttl = ttl
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    def get(self, key, default=None):
+        """Значение или default; передайте MISSING, если None - значение"""
+        with self._lock:
+            item = self._data.get(key)
+            if item is None:
+                return default
+            value, expires = item
+            if expires < time.monotonic():
+                del self._data[key]
+                return default
+            self._data.move_to_end(key)
+            return value
+
+    def set(self, key, value, ttl: Optional[float] = None):
+        with self._lock:
+            self._data[key] = (value, time.monotonic() + (ttl or self.ttl))
+            self._data.move_to_end(key)
+            while len(self._data) > self.max_size:
+                self._data.popitem(last=False)
+
+    def delete(self, key):
+        with self._lock:
+            self._data.pop(key, None)
+
+
+class TwoTierCache:
+    """Двухуровневый кэш: L1 в процессе перед Redis (L2)
+
+    Промах вычисляет значение только один раз: внутри процесса ждущие
+    потоки получают общий Future, между процессами действует блокировка
+    SET NX. Значение в Redis хранится вместе со временем вычисления, и
+    запись может быть обновлена заранее с вероятностью, растущей к концу
+    TTL (probabilistic early expiration), чтобы не было лавины промахов.
+    """
+
+    def __init__(self, client, ttl: int = 300, l1_ttl: float = 5.0,
+                 l1_size: int = 10000, serializer: str = 'json',
+                 beta: float = 1.0, lock_ttl: float = 10.0,
+                 lock_wait: float = 0.05):
+        if serializer not in SERIALIZERS:
+            raise ValueError(f"Сериализатор {serializer} недоступен, "
+                             f"есть: {', '.join(SERIALIZERS)}")
+        self.dumps, self.loads, binary = SERIALIZERS[serializer]
+        decode = client.connection_pool.connection_kwargs.get(
+            'decode_responses', False)
+        if binary and decode:
+            raise ValueError(f"Для {serializer} нужен клиент Redis "
+                             f"с decode_responses=False")
+
+        self.redis = client
+        self.ttl = ttl
+        self.l1 = TTLCache(l1_size, l1_ttl)
+        self.beta = beta
+        self.lock_ttl = lock_ttl
+        self.lock_wait = lock_wait
+        self._release = client.register_script(RELEASE_LOCK)
+        self._inflight: Dict[str, Future] = {}
+        self._inflight_lock = threading.Lock()
+        self.stats = {'l1_hits': 0, 'l2_hits': 0, 'misses': 0,
+                      'computations': 0, 'early_refreshes': 0,
+                      'calls': 0, 'seconds': 0.0}
+        self._stats_lock = threading.Lock()
+
+    def _count(self, name: str, value=1):
+        with self._stats_lock:
+            self.stats[name] += value
+
+    def _read_l2(self, key: str):
+        raw = self.redis.get(key)
+        if raw is None:
+            return None
+        value, delta, expires = self.loads(raw)
+        return value, delta, expires
+
+    def _should_refresh(self, delta: float, expires: float) -> bool:
+        # XFetch: чем дольше вычисление и ближе истечение, тем вероятнее
+        return (time.time() - delta * self.beta * math.log(random.random())
+                >= expires)
+
+    def _compute_and_store(self, key: str, func: Callable, args, kwargs):
+        start = time.time()
+        value = func(*args, **kwargs)
+        delta = time.time() - start
+        expires = time.time() + self.ttl
+        self.redis.set(key, self.dumps([value, delta, expires]), ex=self.ttl)
+        self.l1.set(key, value)
+        self._count('computations')
+        return value
+
+    def _load_with_lock(self, key: str, func: Callable, args, kwargs,
+                        stale: Optional[float] = None):
+        """Вычисление под распределенной блокировкой
+
+        stale - срок истечения записи, которую обновляем заранее (None при
+        промахе). Получив блокировку, L2 читается еще раз: если другой
+        процесс успел записать значение новее, оно и возвращается.
+        """
+        lock_key = f'lock:{key}'
+        token = uuid.uuid4().hex
+        deadline = time.monotonic() + self.lock_ttl
+        while True:
+            if self.redis.set(lock_key, token, nx=True,
+                              px=int(self.lock_ttl * 1000)):
+                try:
+                    cached = self._read_l2(key)
+                    if cached is not None and (stale is None
+                                               or cached[2] > stale):
+                        self.l1.set(key, cached[0])
+                        return cached[0]
+                    return self._compute_and_store(key, func, args, kwargs)
+                finally:
+                    self._release(keys=[lock_key], args=[token])
+
+            # Значение вычисляет другой процесс - ждем его результат
+            time.sleep(self.lock_wait)
+            cached = self._read_l2(key)
+            if cached is not None:
+                self.l1.set(key, cached[0])
+                return cached[0]
+            if time.monotonic() > deadline:
+                # Владелец блокировки пропал - считаем сами
+                return self._compute_and_store(key, func, args, kwargs)
+
+    def _single_flight(self, key: str, func: Callable, args, kwargs,
+                       stale: Optional[float] = None):
+        """Один вычислитель на ключ внутри процесса"""
+        with self._inflight_lock:
+            future = self._inflight.get(key)
+            owner = future is None
+            if owner:
+                future = Future()
+                self._inflight[key] = future
+        if not owner:
+            return future.result()
+
+        try:
+            value = self._load_with_lock(key, func, args, kwargs, stale)
+            future.set_result(value)
+            return value
+        except Exception as e:
+            future.set_exception(e)
+            raise
+        finally:
+            with self._inflight_lock:
+                self._inflight.pop(key, None)
+
+    def get_or_compute(self, key: str, func: Callable, *args, **kwargs):
+        start = time.perf_counter()
+        try:
+            value = self.l1.get(key, MISSING)
+            if value is not MISSING:
+                self._count('l1_hits')
+                return value
+
+            cached = self._read_l2(key)
+            if cached is not None:
+                value, delta, expires = cached
+                if self._should_refresh(delta, expires):
+                    self._count('early_refreshes')
+                    return self._single_flight(key, func, args, kwargs,
+                                               stale=expires)
+                self._count('l2_hits')
+                self.l1.set(key, value)
+                return value
+
+            self._count('misses')
+            return self._single_flight(key, func, args, kwargs)
+        finally:
+            self._count('calls')
+            self._count('seconds', time.perf_counter() - start)
+
+    def invalidate(self, key: str):
+        self.l1.delete(key)
+        self.redis.delete(key)
+
+    def report(self) -> Dict[str, float]:
+        calls = self.stats['calls'] or 1
+        hits = self.stats['l1_hits'] + self.stats['l2_hits']
+        return {
+            'hit_ratio': hits / calls,
+            'l1_hit_ratio': self.stats['l1_hits'] / calls,
+            'avg_latency_ms': self.stats['seconds'] * 1000 / calls,
+            **self.stats
+        }
+
+    def cached(self, prefix: Optional[str] = None,
+               key: Optional[Callable[..., str]] = None):
+        """Декоратор: @cache.cached('user') над функцией загрузки"""
+        def decorator(func):
+            name = prefix or func.__name__
+
+            @functools.wraps(func)
+            def wrapper(*args, **kwargs):
+                if key is not None:
+                    cache_key = f'{name}:{key(*args, **kwargs)}'
+                else:
+                    parts = [str(a) for a in args]
+                    parts += [f'{k}={v}' for k, v in sorted(kwargs.items())]
+                    cache_key = ':'.join([name] + parts)
+                return self.get_or_compute(cache_key, func, *args, **kwargs)
+
+            wrapper.cache = self
+            return wrapper
+        return decorator
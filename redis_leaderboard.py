@@ -0,0 +1,175 @@
+import heapq
+import itertools
+import json
+import time
+import zlib
+from collections import defaultdict
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+
+
+# Глобальный ранг за один проход: счет игрока из его шарда и число
+# игроков с большим счетом во всех шардах
+GLOBAL_RANK = """
+local score = redis.call('ZSCORE', KEYS[tonumber(ARGV[2])], ARGV[1])
+if not score then
+    return nil
+end
+local above = 0
+for i = 1, #KEYS do
+    above = above + redis.call('ZCOUNT', KEYS[i], '(' .. score, '+inf')
+end
+return {above, score}
+"""
+
+
+class ShardedLeaderboard:
+    """Таблица рекордов, разбитая на несколько ZSET
+
+    Игрок всегда попадает в один шард (crc32 от имени), поэтому ZINCRBY
+    распределяется по ключам, а не бьет в один горячий ключ. Top-K
+    собирается слиянием top-K каждого шарда, страница топа кэшируется
+    в Redis на cache_ttl секунд. На кластере шарды должны попадать на
+    разные узлы, а скрипт ранга - выполняться по шардам одного узла;
+    здесь рассматривается один экземпляр Redis.
+    """
+
+    def __init__(self, client, name: str = 'leaderboard', shards: int = 16,
+                 cache_ttl: float = 1.0):
+        self.redis = client
+        self.name = name
+        self.shards = shards
+        self.cache_ttl = cache_ttl
+        self.keys = [f'{name}:shard:{i}' for i in range(shards)]
+        self._rank = client.register_script(GLOBAL_RANK)
+
+    def shard_of(self, player: str) -> int:
+        return zlib.crc32(player.encode()) % self.shards
+
+    def _key(self, player: str) -> str:
+        return self.keys[self.shard_of(player)]
+
+    def increment(self, player: str, delta: float = 1) -> float:
+        return self.redis.zincrby(self._key(player), delta, player)
+
+    def increment_many(self, updates: Iterable[Tuple[str, float]],
+                       batch_size: int = 1000) -> int:
+        """Пакетное начисление очков
+
+        Несколько начислений одному игроку схлопываются в одно,
+        команды уходят пайплайном. Возвращает число ZINCRBY.
+        """
+        deltas: Dict[str, float] = defaultdict(float)
+        for player, delta in updates:
+            deltas[player] += delta
+
+        pipe = self.redis.pipeline(transaction=False)
+        for player, delta in deltas.items():
+            pipe.zincrby(self._key(player), delta, player)
+            if len(pipe) >= batch_size:
+                pipe.execute()
+        if len(pipe):
+            pipe.execute()
+        return len(deltas)
+
+    def set_scores(self, scores: Dict[str, float], batch_size: int = 10000):
+        """Массовая установка счетов (ZADD по шардам)"""
+        by_shard: Dict[str, Dict[str, float]] = defaultdict(dict)
+        for player, score in scores.items():
+            by_shard[self._key(player)][player] = score
+
+        pipe = self.redis.pipeline(transaction=False)
+        for key, mapping in by_shard.items():
+            items = list(mapping.items())
+            for offset in range(0, len(items), batch_size):
+                pipe.zadd(key, dict(items[offset:offset + batch_size]))
+        pipe.execute()
+
+    def score(self, player: str) -> Optional[float]:
+        return self.redis.zscore(self._key(player), player)
+
+    def rank(self, player: str) -> Optional[int]:
+        """Глобальный ранг (с 1) одним вызовом скрипта"""
+        result = self._rank(keys=self.keys,
+                            args=[player, self.shard_of(player) + 1])
+        if result is None:
+            return None
+        return int(result[0]) + 1
+
+    def _merge_top(self, k: int) -> List[Tuple[str, float]]:
+        pipe = self.redis.pipeline(transaction=False)
+        for key in self.keys:
+            pipe.zrevrange(key, 0, k - 1, withscores=True)
+        # Каждый шард уже отсортирован по убыванию - достаточно слить
+        merged = heapq.merge(*pipe.execute(), key=lambda item: -item[1])
+        return list(itertools.islice(merged, k))
+
+    def top(self, k: int = 10, use_cache: bool = True
+            ) -> List[Tuple[str, float]]:
+        if not use_cache or not self.cache_ttl:
+            return self._merge_top(k)
+
+        cache_key = f'{self.name}:top:{k}'
+        cached = self.redis.get(cache_key)
+        if cached is not None:
+            return [tuple(item) for item in json.loads(cached)]
+        top = self._merge_top(k)
+        self.redis.set(cache_key, json.dumps(top),
+                       px=int(self.cache_ttl * 1000))
+        return top
+
+    def clear(self):
+        self.redis.delete(*self.keys)
+
+
+def benchmark(client, players: int = 1000000, shards: int = 16,
+              updates: int = 200000, batch_size: int = 1000,
+              queries: int = 1000, seed: int = 42):
+    """Пропускная способность начислений и задержка запросов ранга"""
+    rng = np.random.default_rng(seed)
+    board = ShardedLeaderboard(client, 'bench:leaderboard', shards=shards)
+    board.clear()
+
+    names = [f'player{i}' for i in range(players)]
+    start = time.perf_counter()
+    for offset in range(0, players, 100000):
+        chunk = names[offset:offset + 100000]
+        board.set_scores(dict(zip(chunk, rng.integers(0, 1000000,
+                                                      len(chunk)).tolist())))
+    print(f"\nЗагрузка {players} игроков: "
+          f"{players / (time.perf_counter() - start):.0f} игроков/сек")
+
+    # Горячие игроки получают большую часть начислений
+    hot = (rng.zipf(1.3, updates) - 1) % players
+    stream = [(names[i], 1) for i in hot]
+
+    start = time.perf_counter()
+    for player, delta in stream[:updates // 20]:
+        client.zincrby('bench:leaderboard:single', delta, player)
+    single = updates // 20 / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    for offset in range(0, updates, batch_size):
+        board.increment_many(stream[offset:offset + batch_size])
+    batched = updates / (time.perf_counter() - start)
+    print(f"ZINCRBY по одному в один ключ: {single:.0f} начислений/сек")
+    print(f"Пакетами по шардам: {batched:.0f} начислений/сек")
+
+    picks = rng.integers(0, players, queries)
+    start = time.perf_counter()
+    for i in picks:
+        board.rank(names[i])
+    print(f"Глобальный ранг: "
+          f"{(time.perf_counter() - start) * 1000 / queries:.3f} мс")
+
+    for use_cache in (False, True):
+        start = time.perf_counter()
+        for _ in range(queries):
+            board.top(100, use_cache=use_cache)
+        label = 'кэш' if use_cache else 'слияние шардов'
+        print(f"Top-100 ({label}): "
+              f"{(time.perf_counter() - start) * 1000 / queries:.3f} мс")
+
+    board.clear()
+    client.delete('bench:leaderboard:single', 'bench:leaderboard:top:100')
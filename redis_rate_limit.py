@@ -0,0 +1,159 @@
+import itertools
+import time
+import uuid
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Sequence
+
+
+# Время окон считает сервер, чтобы расхождение часов клиентов не влияло
+# на них: sliding_log и token_bucket берут TIME, у fixed_window окно -
+# это PEXPIRE ключа. Все скрипты возвращают {разрешено, остаток}.
+
+FIXED_WINDOW = """
+local count = redis.call('INCRBY', KEYS[1], ARGV[3])
+if count == tonumber(ARGV[3]) then
+    redis.call('PEXPIRE', KEYS[1], ARGV[2])
+end
+local limit = tonumber(ARGV[1])
+if count > limit then
+    return {0, 0}
+end
+return {1, limit - count}
+"""
+
+SLIDING_LOG = """
+local now = redis.call('TIME')
+local now_us = tonumber(now[1]) * 1000000 + tonumber(now[2])
+local window_us = tonumber(ARGV[2]) * 1000
+local limit = tonumber(ARGV[1])
+local cost = tonumber(ARGV[3])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now_us - window_us)
+local count = redis.call('ZCARD', KEYS[1])
+if count + cost > limit then
+    return {0, limit - count}
+end
+for i = 1, cost do
+    redis.call('ZADD', KEYS[1], now_us,
+               now[1] .. now[2] .. ':' .. ARGV[4] .. ':' .. i)
+end
+redis.call('PEXPIRE', KEYS[1], ARGV[2])
+return {1, limit - count - cost}
+"""
+
+TOKEN_BUCKET = """
+local now = redis.call('TIME')
+local now_ms = tonumber(now[1]) * 1000 + math.floor(tonumber(now[2]) / 1000)
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2]) / 1000
+local cost = tonumber(ARGV[3])
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1]) or capacity
+local ts = tonumber(state[2]) or now_ms
+tokens = math.min(capacity, tokens + (now_ms - ts) * rate)
+
+local allowed = 0
+if tokens >= cost then
+    tokens = tokens - cost
+    allowed = 1
+end
+redis.call('HSET', KEYS[1], 'tokens', tokens, 'ts', now_ms)
+redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate))
+return {allowed, math.floor(tokens)}
+"""
+
+ALGORITHMS = {
+    'fixed_window': FIXED_WINDOW,
+    'sliding_log': SLIDING_LOG,
+    'token_bucket': TOKEN_BUCKET,
+}
+
+
+class RateLimiter:
+    """Ограничение частоты запросов за один сетевой проход
+
+    Скрипт регистрируется один раз и вызывается через EVALSHA
+    (redis-py сам загружает его при NOSCRIPT).
+
+    fixed_window: не более limit запросов за окно window секунд.
+    sliding_log: не более limit запросов за любые последние window секунд.
+    token_bucket: ведро на limit токенов, пополняется limit / window
+    токенов в секунду.
+    """
+
+    def __init__(self, client, algorithm: str = 'sliding_log',
+                 limit: int = 5, window: float = 60,
+                 prefix: str = 'ratelimit'):
+        if algorithm not in ALGORITHMS:
+            raise ValueError(f"Неизвестный алгоритм {algorithm}, "
+                             f"есть: {', '.join(ALGORITHMS)}")
+        self.redis = client
+        self.algorithm = algorithm
+        self.limit = limit
+        self.window = window
+        self.prefix = prefix
+        self.script = client.register_script(ALGORITHMS[algorithm])
+        self._id = uuid.uuid4().hex[:12]
+        self._seq = itertools.count()
+
+    def _args(self, cost: int) -> list:
+        if self.algorithm == 'token_bucket':
+            return [self.limit, self.limit / self.window, cost]
+        # Последний аргумент делает элементы журнала уникальными
+        return [self.limit, int(self.window * 1000), cost,
+                f'{self._id}:{next(self._seq)}']
+
+    def _key(self, key) -> str:
+        return f'{self.prefix}:{self.algorithm}:{key}'
+
+    def check(self, key, cost: int = 1) -> Dict[str, int]:
+        allowed, remaining = self.script(keys=[self._key(key)],
+                                         args=self._args(cost))
+        return {'allowed': bool(allowed), 'remaining': int(remaining)}
+
+    def allow(self, key, cost: int = 1) -> bool:
+        return self.check(key, cost)['allowed']
+
+    def allow_many(self, keys: Sequence, cost: int = 1) -> List[bool]:
+        """Решения для многих ключей одним пайплайном EVALSHA"""
+        pipe = self.redis.pipeline(transaction=False)
+        for key in keys:
+            self.script(keys=[self._key(key)], args=self._args(cost),
+                        client=pipe)
+        return [bool(allowed) for allowed, _ in pipe.execute()]
+
+    def reset(self, key):
+        self.redis.delete(self._key(key))
+
+
+def benchmark(client, clients: int = 8, requests: int = 2000,
+              limit: int = 100, batch: int = 50):
+    """Решений в секунду и точность лимита при конкурентных клиентах"""
+    print(f"\n{'Алгоритм':<14}{'решений/сек':>14}{'пакетом/сек':>14}"
+          f"{'разрешено':>11}{'лимит':>8}")
+    for algorithm in ALGORITHMS:
+        # Окно заведомо длиннее теста, чтобы проверить точность лимита
+        limiter = RateLimiter(client, algorithm, limit=limit, window=3600)
+        limiter.reset('bench')
+
+        def worker(_):
+            return sum(limiter.allow('bench')
+                       for _ in range(requests // clients))
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=clients) as pool:
+            allowed = sum(pool.map(worker, range(clients)))
+        single = requests / (time.perf_counter() - start)
+
+        keys = [f'bench:{i % 1000}' for i in range(requests)]
+        start = time.perf_counter()
+        for offset in range(0, requests, batch):
+            limiter.allow_many(keys[offset:offset + batch])
+        batched = requests / (time.perf_counter() - start)
+
+        limiter.reset('bench')
+        for i in range(1000):
+            limiter.reset(f'bench:{i}')
+        print(f"{algorithm:<14}{single:>14.0f}{batched:>14.0f}"
+              f"{allowed:>11}{limit:>8}")
@@ -0,0 +1,151 @@
+import asyncio
+import json
+import time
+from typing import Awaitable, Callable, Dict, Iterable, List, Optional, Tuple
+
+import redis
+
+
+class EventBus:
+    """Шина событий на Redis Streams
+
+    В отличие от PUBLISH события сохраняются в потоке и дожидаются
+    потребителей. Потребители объединяются в группы: каждое событие
+    получает один потребитель группы, неподтвержденные события остаются
+    в списке ожидания. MAXLEN ~ ограничивает память, отбрасывая старые
+    записи целыми узлами потока.
+    """
+
+    def __init__(self, client, stream: str = 'events',
+                 maxlen: Optional[int] = 1000000):
+        self.redis = client
+        self.stream = stream
+        self.maxlen = maxlen
+
+    def publish(self, event: Dict) -> str:
+        return self.redis.xadd(self.stream, {'data': json.dumps(event)},
+                               maxlen=self.maxlen, approximate=True)
+
+    def publish_many(self, events: Iterable[Dict],
+                     batch_size: int = 500) -> int:
+        """Пакетный XADD через пайплайн - один проход на пакет"""
+        total = 0
+        pipe = self.redis.pipeline(transaction=False)
+        for event in events:
+            pipe.xadd(self.stream, {'data': json.dumps(event)},
+                      maxlen=self.maxlen, approximate=True)
+            total += 1
+            if len(pipe) >= batch_size:
+                pipe.execute()
+        if len(pipe):
+            pipe.execute()
+        return total
+
+    def ensure_group(self, group: str, start_id: str = '0'):
+        try:
+            self.redis.xgroup_create(self.stream, group, id=start_id,
+                                     mkstream=True)
+        except redis.ResponseError as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def read(self, group: str, consumer: str, count: int = 100,
+             block: Optional[int] = 1000) -> List[Tuple[str, Dict]]:
+        """Новые события для потребителя группы"""
+        response = self.redis.xreadgroup(group, consumer,
+                                         {self.stream: '>'},
+                                         count=count, block=block)
+        return _decode(response)
+
+    def ack(self, group: str, ids: List[str]) -> int:
+        """Подтверждение пакета событий одной командой XACK"""
+        if not ids:
+            return 0
+        return self.redis.xack(self.stream, group, *ids)
+
+
+def _decode(response) -> List[Tuple[str, Dict]]:
+    events = []
+    for _, entries in response or []:
+        for entry_id, fields in entries:
+            if fields:  # удаленные тримом записи приходят без полей
+                events.append((entry_id, json.loads(fields['data'])))
+    return events
+
+
+async def consume(client, stream: str, group: str, consumer: str,
+                  handler: Callable[[List[Tuple[str, Dict]]], Awaitable],
+                  stop: asyncio.Event, count: int = 500,
+                  block: int = 1000):
+    """Асинхронный потребитель группы (клиент redis.asyncio)
+
+    Сначала дочитывает свои неподтвержденные события (после падения),
+    затем новые. handler получает пакет целиком, подтверждение - одним
+    XACK на пакет.
+    """
+    last_id = '0'
+    while not stop.is_set():
+        response = await client.xreadgroup(group, consumer,
+                                           {stream: last_id},
+                                           count=count, block=block)
+        entries = [entry for _, batch in response or [] for entry in batch]
+        if last_id == '0' and not entries:
+            last_id = '>'  # список ожидания пуст - переходим к новым
+            continue
+        # Записи, удаленные тримом MAXLEN ~, приходят без полей; обработать
+        # их нельзя, но без XACK они навсегда остались бы в списке ожидания
+        trimmed = [entry_id for entry_id, fields in entries
+                   if entry_id is not None and not fields]
+        if trimmed:
+            await client.xack(stream, group, *trimmed)
+        events = _decode(response)
+        if not events:
+            continue
+        await handler(events)
+        await client.xack(stream, group, *[entry_id for entry_id, _ in events])
+
+
+async def benchmark(client, async_client, messages: int = 100000,
+                    consumers: int = 4, batch_size: int = 500,
+                    stream: str = 'bench:events'):
+    """Сообщений в секунду от XADD до XACK при нескольких потребителях
+
+    client - синхронный клиент для публикации, async_client - клиент
+    redis.asyncio для потребителей. Оба с decode_responses=True.
+    """
+    client.delete(stream)
+    bus = EventBus(client, stream, maxlen=messages * 2)
+    bus.ensure_group('bench')
+
+    received = 0
+    done = asyncio.Event()
+    stop = asyncio.Event()
+
+    async def handler(events):
+        nonlocal received
+        received += len(events)
+        if received >= messages:
+            done.set()
+
+    tasks = [asyncio.create_task(
+        consume(async_client, stream, 'bench', f'consumer-{i}', handler,
+                stop, count=batch_size, block=100))
+        for i in range(consumers)]
+
+    start = time.perf_counter()
+    await asyncio.to_thread(
+        bus.publish_many,
+        ({'seq': i, 'ts': time.time()} for i in range(messages)),
+        batch_size)
+    published = time.perf_counter() - start
+
+    await done.wait()
+    elapsed = time.perf_counter() - start
+    stop.set()
+    await asyncio.gather(*tasks)
+    client.delete(stream)
+
+    print(f"Публикация: {messages / published:.0f} сообщений/сек")
+    print(f"От публикации до подтверждения ({consumers} потребителей): "
+          f"{messages / elapsed:.0f} сообщений/сек")
+    return messages / elapsed
@@ -0,0 +1,242 @@
+import math
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+EARTH_RADIUS = 6371008.8  # meters, same mean radius Tile38 uses
+METERS_PER_DEGREE = math.pi * EARTH_RADIUS / 180
+# Tile38 returns at most this many objects when no LIMIT is given
+DEFAULT_LIMIT = 100
+
+
+def haversine(lat: float, lon: float, lats: np.ndarray,
+              lons: np.ndarray) -> np.ndarray:
+    """Distances in meters from one point to arrays of points"""
+    lat1, lon1 = math.radians(lat), math.radians(lon)
+    lat2, lon2 = np.radians(lats), np.radians(lons)
+    a = (np.sin((lat2 - lat1) / 2) ** 2
+         + math.cos(lat1) * np.cos(lat2) * np.sin((lon2 - lon1) / 2) ** 2)
+    return 2 * EARTH_RADIUS * np.arcsin(np.sqrt(np.minimum(a, 1.0)))
+
+
+def _rings(polygon) -> List[np.ndarray]:
+    """GeoJSON Polygon / coordinates / single ring -> list of (n, 2) arrays"""
+    if isinstance(polygon, dict):
+        polygon = polygon['coordinates']
+    rings = [np.asarray(ring, dtype=np.float64) for ring in polygon]
+    if rings and rings[0].ndim == 1:  # a single ring of [lon, lat] pairs
+        rings = [np.asarray(polygon, dtype=np.float64)]
+    return rings
+
+
+def points_in_polygon(lats: np.ndarray, lons: np.ndarray,
+                      polygon) -> np.ndarray:
+    """Even-odd ray casting, vectorized over points
+
+    polygon is a GeoJSON Polygon (the first ring is the shell, the others
+    are holes) or its coordinates, vertices are [lon, lat] as in GeoJSON.
+    """
+    inside = np.zeros(len(lats), dtype=bool)
+    for ring in _rings(polygon):
+        x1, y1 = ring[:, 0], ring[:, 1]
+        x2, y2 = np.roll(x1, -1), np.roll(y1, -1)
+        for ax, ay, bx, by in zip(x1, y1, x2, y2):
+            if ay == by:
+                continue
+            crosses = (ay > lats) != (by > lats)
+            x_cross = ax + (lats - ay) * (bx - ax) / (by - ay)
+            inside ^= crosses & (lons < x_cross)
+    return inside
+
+
+class PointIndex:
+    """In-memory grid index over point coordinates
+
+    Points are bucketed into cells of cell_deg degrees and sorted by cell
+    number (row-major), so each grid row of a query box is one contiguous
+    slice found with searchsorted. Candidates are then filtered exactly
+    with vectorized haversine (nearby) or ray casting (within).
+
+    Results have the shape of tile38_pool.parse_objects (Tile38's
+    asObjects() response as a dict): objects with id, GeoJSON point and
+    fields, paged by limit/cursor with Tile38's default limit of 100.
+    """
+
+    def __init__(self, ids: Sequence[str], lats, lons,
+                 fields: Optional[Sequence[Optional[Dict]]] = None,
+                 cell_deg: float = 0.01):
+        self.cell_deg = cell_deg
+        self.columns = int(math.ceil(360 / cell_deg)) + 1
+
+        lats = np.asarray(lats, dtype=np.float64)
+        lons = np.asarray(lons, dtype=np.float64)
+        cells = self._cell(lats, lons)
+        order = np.argsort(cells, kind='stable')
+
+        self.cells = cells[order]
+        self.lats = lats[order]
+        self.lons = lons[order]
+        self.ids = np.asarray(ids, dtype=object)[order]
+        self.fields = (np.asarray(fields, dtype=object)[order]
+                       if fields is not None else None)
+
+    @classmethod
+    def from_items(cls, items: Dict[str, Tuple], cell_deg: float = 0.01):
+        """Build from {id: (lat, lon[, fields])} as used by proximity_search"""
+        ids = list(items)
+        values = list(items.values())
+        fields = [value[2] if len(value) > 2 else None for value in values]
+        return cls(ids, [value[0] for value in values],
+                   [value[1] for value in values],
+                   fields if any(fields) else None, cell_deg)
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _row_col(self, lats, lons):
+        row = np.floor((np.asarray(lats) + 90) / self.cell_deg)
+        col = np.floor((np.asarray(lons) + 180) / self.cell_deg)
+        return row.astype(np.int64), col.astype(np.int64)
+
+    def _cell(self, lats, lons) -> np.ndarray:
+        row, col = self._row_col(lats, lons)
+        return row * self.columns + col
+
+    def _candidates(self, min_lat: float, min_lon: float, max_lat: float,
+                    max_lon: float) -> np.ndarray:
+        """Positions of points in cells overlapping the bounding box"""
+        (row0, row1), (col0, col1) = self._row_col(
+            [max(min_lat, -90), min(max_lat, 90)],
+            [max(min_lon, -180), min(max_lon, 180)])
+        rows = np.arange(row0, row1 + 1) * self.columns
+        starts = np.searchsorted(self.cells, rows + col0, side='left')
+        ends = np.searchsorted(self.cells, rows + col1, side='right')
+        slices = [np.arange(s, e) for s, e in zip(starts, ends) if e > s]
+        if not slices:
+            return np.empty(0, dtype=np.int64)
+        return np.concatenate(slices)
+
+    def _object(self, position: int) -> Dict:
+        obj = {
+            'id': self.ids[position],
+            'object': {'type': 'Point',
+                       'coordinates': [float(self.lons[position]),
+                                       float(self.lats[position])]},
+        }
+        if self.fields is not None and self.fields[position]:
+            obj['fields'] = self.fields[position]
+        return obj
+
+    def _response(self, positions: np.ndarray, limit: int,
+                  cursor: int) -> Dict:
+        """One page of matches; cursor is 0 on the last page, like Tile38"""
+        page = positions[cursor:cursor + limit]
+        following = cursor + limit if cursor + limit < len(positions) else 0
+        objects = [self._object(position) for position in page]
+        return {'ok': True, 'objects': objects, 'count': len(objects),
+                'cursor': following}
+
+    def nearby(self, lat: float, lon: float, radius: float,
+               limit: int = DEFAULT_LIMIT, cursor: int = 0) -> Dict:
+        """Points within radius meters, nearest first"""
+        dlat = radius / METERS_PER_DEGREE
+        # The circle is widest in longitude at its poleward edge
+        cos_lat = max(math.cos(math.radians(min(abs(lat) + dlat, 90))), 1e-6)
+        dlon = min(dlat / cos_lat, 180)
+        candidates = self._candidates(lat - dlat, lon - dlon,
+                                      lat + dlat, lon + dlon)
+
+        distances = haversine(lat, lon, self.lats[candidates],
+                              self.lons[candidates])
+        mask = distances <= radius
+        candidates, distances = candidates[mask], distances[mask]
+        order = np.argsort(distances, kind='stable')
+        return self._response(candidates[order], limit, cursor)
+
+    def within(self, polygon, limit: int = DEFAULT_LIMIT,
+               cursor: int = 0) -> Dict:
+        """Points inside a GeoJSON polygon"""
+        shell = _rings(polygon)[0]
+        candidates = self._candidates(shell[:, 1].min(), shell[:, 0].min(),
+                                      shell[:, 1].max(), shell[:, 0].max())
+        mask = points_in_polygon(self.lats[candidates],
+                                 self.lons[candidates], polygon)
+        return self._response(candidates[mask], limit, cursor)
+
+
+def synthetic_points(count: int, center: Tuple[float, float] = (52.52, 13.40),
+                     spread: float = 0.5, seed: int = 42):
+    """Ids and coordinates scattered around a city center"""
+    rng = np.random.default_rng(seed)
+    lats = center[0] + rng.uniform(-spread, spread, count)
+    lons = center[1] + rng.uniform(-spread, spread, count)
+    return [f'poi{i}' for i in range(count)], lats, lons
+
+
+async def benchmark(client=None, url: str = 'redis://localhost:9851',
+                    points: int = 1000000, queries: int = 200,
+                    radius: float = 1000, key: str = 'bench:pois',
+                    seed: int = 42) -> Dict[str, float]:
+    """Query latency of the local index vs a brute-force scan and Tile38
+
+    client is a pyle38 Tile38 instance; without it only local queries
+    are measured.
+    """
+    ids, lats, lons = synthetic_points(points, seed=seed)
+    start = time.perf_counter()
+    index = PointIndex(ids, lats, lons)
+    print(f"\nIndex of {points} points built in "
+          f"{time.perf_counter() - start:.2f} s")
+
+    rng = np.random.default_rng(seed + 1)
+    centers = list(zip(52.52 + rng.uniform(-0.4, 0.4, queries),
+                       13.40 + rng.uniform(-0.4, 0.4, queries)))
+    side = radius / METERS_PER_DEGREE
+    boxes = [{'type': 'Polygon', 'coordinates': [[
+        [lon - side, lat - side], [lon + side, lat - side],
+        [lon + side, lat + side], [lon - side, lat + side],
+        [lon - side, lat - side]]]} for lat, lon in centers]
+
+    def timed(func, args_list) -> float:
+        start = time.perf_counter()
+        for args in args_list:
+            func(*args)
+        return (time.perf_counter() - start) * 1000 / len(args_list)
+
+    results = {
+        'local nearby': timed(index.nearby,
+                              [(lat, lon, radius) for lat, lon in centers]),
+        'local within': timed(index.within, [(box,) for box in boxes]),
+        'brute-force nearby': timed(
+            lambda lat, lon: np.flatnonzero(
+                haversine(lat, lon, lats, lons) <= radius),
+            centers[:20]),
+    }
+
+    if client is not None:
+        from tile38_bulk import BulkPositionWriter
+
+        writer = BulkPositionWriter(url, key, batch_size=5000)
+        await writer.redis.execute_command('DROP', key)
+        await writer.update(zip(ids, lats.tolist(), lons.tolist()))
+
+        start = time.perf_counter()
+        for lat, lon in centers:
+            await client.nearby(key).point(lat, lon, radius).asObjects()
+        results['tile38 nearby'] = ((time.perf_counter() - start) * 1000
+                                    / queries)
+
+        start = time.perf_counter()
+        for box in boxes:
+            await client.within(key).object(box).asObjects()
+        results['tile38 within'] = ((time.perf_counter() - start) * 1000
+                                    / queries)
+
+        await writer.redis.execute_command('DROP', key)
+        await writer.close()
+
+    print(f"{'Query':<22}{'ms/query':>12}")
+    for name, ms in results.items():
+        print(f"{name:<22}{ms:>12.3f}")
+    return results
@@ -0,0 +1,128 @@
+import asyncio
+import random
+import time
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import redis.asyncio
+
+# courier_id -> (lat, lon, fields)
+Fix = Tuple[float, float, Optional[Dict]]
+
+
+def set_command(key: str, object_id: str, lat: float, lon: float,
+                fields: Optional[Dict] = None) -> list:
+    """Raw Tile38 SET command for a point with optional fields"""
+    command = ['SET', key, object_id]
+    for name, value in (fields or {}).items():
+        command += ['FIELD', name, value]
+    return command + ['POINT', lat, lon]
+
+
+class BulkPositionWriter:
+    """Pipelined position updates for large fleets
+
+    Tile38 speaks RESP, so SET commands are pipelined over a plain
+    redis.asyncio connection to the same server: one round trip per batch
+    instead of one per fix. Fixes are buffered per courier and only the
+    latest one is sent, batches are written concurrently (at most
+    `concurrency` in flight).
+    """
+
+    def __init__(self, url: str = 'redis://localhost:9851', key: str = 'fleet',
+                 batch_size: int = 500, concurrency: int = 8,
+                 client: Optional[redis.asyncio.Redis] = None):
+        self.redis = client or redis.asyncio.from_url(
+            url, max_connections=concurrency)
+        self.key = key
+        self.batch_size = batch_size
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self.pending: Dict[str, Fix] = {}
+        self.stats = {'received': 0, 'written': 0, 'batches': 0,
+                      'requeued': 0}
+
+    def add(self, courier_id: str, lat: float, lon: float,
+            fields: Optional[Dict] = None):
+        """Buffer a fix, replacing any older unsent fix of the courier"""
+        self.pending[courier_id] = (lat, lon, fields)
+        self.stats['received'] += 1
+
+    def add_many(self, fixes: Iterable[Tuple[str, float, float]]):
+        for courier_id, lat, lon in fixes:
+            self.add(courier_id, lat, lon)
+
+    async def _write(self, batch: List[Tuple[str, Fix]]):
+        try:
+            async with self.semaphore:
+                pipe = self.redis.pipeline(transaction=False)
+                for courier_id, (lat, lon, fields) in batch:
+                    pipe.execute_command(
+                        *set_command(self.key, courier_id, lat, lon, fields))
+                await pipe.execute()
+        except Exception:
+            # Back to the buffer unless a newer fix arrived meanwhile;
+            # SET is idempotent, so resending the written part is harmless
+            for courier_id, fix in batch:
+                self.pending.setdefault(courier_id, fix)
+            self.stats['requeued'] += len(batch)
+            raise
+        self.stats['written'] += len(batch)
+        self.stats['batches'] += 1
+
+    async def flush(self) -> int:
+        """Write all pending fixes, returns the number of SET commands
+
+        Fixes of failed batches stay pending for the next flush; the first
+        error is raised after all batches have finished.
+        """
+        items = list(self.pending.items())
+        self.pending = {}
+        results = await asyncio.gather(*[
+            self._write(items[offset:offset + self.batch_size])
+            for offset in range(0, len(items), self.batch_size)],
+            return_exceptions=True)
+        for result in results:
+            if isinstance(result, BaseException):
+                raise result
+        return len(items)
+
+    async def update(self, fixes: Iterable[Tuple[str, float, float]]) -> int:
+        self.add_many(fixes)
+        return await self.flush()
+
+    async def close(self):
+        await self.redis.aclose()
+
+
+async def benchmark(url: str = 'redis://localhost:9851',
+                    couriers: int = 100000, fixes_per_courier: int = 3,
+                    batch_size: int = 500, concurrency: int = 8,
+                    key: str = 'bench:fleet', seed: int = 42):
+    """Updates/sec: one awaited SET per fix vs coalesced pipelined batches"""
+    rng = random.Random(seed)
+    fixes = [(f'courier{rng.randrange(couriers)}',
+              52.5 + rng.uniform(-0.2, 0.2), 13.4 + rng.uniform(-0.3, 0.3))
+             for _ in range(couriers * fixes_per_courier)]
+
+    writer = BulkPositionWriter(url, key, batch_size, concurrency)
+    await writer.redis.execute_command('DROP', key)
+
+    # The sequential baseline is slow, a sample is enough
+    sample = fixes[:min(len(fixes), 10000)]
+    start = time.perf_counter()
+    for courier_id, lat, lon in sample:
+        await writer.redis.execute_command(
+            *set_command(key, courier_id, lat, lon))
+    sequential = len(sample) / (time.perf_counter() - start)
+
+    start = time.perf_counter()
+    written = await writer.update(fixes)
+    elapsed = time.perf_counter() - start
+
+    print(f"\n{'Mode':<28}{'fixes/sec':>14}{'SET commands':>14}")
+    print(f"{'sequential SET':<28}{sequential:>14.0f}{len(sample):>14}")
+    print(f"{'pipelined + coalesced':<28}{len(fixes) / elapsed:>14.0f}"
+          f"{written:>14}")
+
+    await writer.redis.execute_command('DROP', key)
+    await writer.close()
+    return len(fixes) / elapsed
@@ -0,0 +1,162 @@
+import asyncio
+import itertools
+import json
+import time
+from typing import Any, AsyncIterator, Dict, List, Optional, Sequence, Tuple
+
+import redis.asyncio
+
+from spatial_index import synthetic_points
+from tile38_bulk import BulkPositionWriter
+
+
+def parse_objects(response) -> Dict:
+    """RESP reply of NEARBY/WITHIN/SCAN -> asObjects()-shaped dict"""
+    cursor, items = response
+    objects = []
+    for item in items:
+        obj = {'id': item[0], 'object': json.loads(item[1])}
+        if len(item) > 2 and item[2]:
+            obj['fields'] = dict(zip(item[2][::2], item[2][1::2]))
+        objects.append(obj)
+    return {'ok': True, 'objects': objects, 'count': len(objects),
+            'cursor': int(cursor)}
+
+
+def _paging(cursor: int, limit: Optional[int]) -> list:
+    args = ['CURSOR', cursor] if cursor else []
+    return args + (['LIMIT', limit] if limit else [])
+
+
+class Tile38Pool:
+    """Pooled Tile38 access with leader/follower routing
+
+    Writes go to the leader, reads are spread round-robin over followers
+    (the leader itself when there are none). Each endpoint has a blocking
+    pool of `connections` RESP connections; `concurrency` bounds the number
+    of commands in flight and every call has a timeout, so one slow query
+    cannot hold the fan-out.
+    """
+
+    def __init__(self, leader_url: str = 'redis://localhost:9851',
+                 follower_urls: Sequence[str] = (), connections: int = 16,
+                 concurrency: int = 64, timeout: float = 2.0):
+        self.timeout = timeout
+        self.leader = self._client(leader_url, connections, timeout)
+        self.followers = [self._client(url, connections, timeout)
+                          for url in follower_urls] or [self.leader]
+        self.semaphore = asyncio.Semaphore(concurrency)
+        self._round_robin = itertools.cycle(self.followers)
+
+    @staticmethod
+    def _client(url: str, connections: int, timeout: float):
+        pool = redis.asyncio.BlockingConnectionPool.from_url(
+            url, max_connections=connections, timeout=timeout,
+            decode_responses=True)
+        return redis.asyncio.Redis(connection_pool=pool)
+
+    async def _call(self, client, *command, timeout: Optional[float] = None):
+        async with self.semaphore:
+            return await asyncio.wait_for(client.execute_command(*command),
+                                          timeout or self.timeout)
+
+    async def read(self, *command, timeout: Optional[float] = None):
+        return await self._call(next(self._round_robin), *command,
+                                timeout=timeout)
+
+    async def write(self, *command, timeout: Optional[float] = None):
+        return await self._call(self.leader, *command, timeout=timeout)
+
+    async def set_point(self, key: str, object_id: str, lat: float,
+                        lon: float):
+        return await self.write('SET', key, object_id, 'POINT', lat, lon)
+
+    async def nearby(self, key: str, lat: float, lon: float, radius: float,
+                     limit: Optional[int] = None, cursor: int = 0,
+                     timeout: Optional[float] = None) -> Dict:
+        return parse_objects(await self.read(
+            'NEARBY', key, *_paging(cursor, limit), 'POINT', lat, lon,
+            radius, timeout=timeout))
+
+    async def within(self, key: str, polygon: dict,
+                     limit: Optional[int] = None, cursor: int = 0,
+                     timeout: Optional[float] = None) -> Dict:
+        return parse_objects(await self.read(
+            'WITHIN', key, *_paging(cursor, limit), 'OBJECT',
+            json.dumps(polygon), timeout=timeout))
+
+    async def scan(self, key: str, limit: Optional[int] = None,
+                   cursor: int = 0,
+                   timeout: Optional[float] = None) -> Dict:
+        return parse_objects(await self.read(
+            'SCAN', key, *_paging(cursor, limit), timeout=timeout))
+
+    async def scan_pages(self, key: str,
+                         page_size: int = 1000) -> AsyncIterator[List[Dict]]:
+        """Whole collection page by page (LIMIT/CURSOR)"""
+        cursor = 0
+        while True:
+            page = await self.scan(key, limit=page_size, cursor=cursor)
+            if page['objects']:
+                yield page['objects']
+            cursor = page['cursor']
+            if not cursor:
+                return
+
+    async def fan_out(self, queries: Sequence[Tuple[str, tuple]],
+                      timeout: Optional[float] = None) -> List[Any]:
+        """Run (method, args) queries concurrently
+
+        Results keep the order of queries; a failed or timed out query
+        yields its exception instead of cancelling the others.
+        """
+        return await asyncio.gather(
+            *[getattr(self, method)(*args, timeout=timeout)
+              for method, args in queries],
+            return_exceptions=True)
+
+    async def close(self):
+        await self.leader.aclose()
+        for follower in self.followers:
+            if follower is not self.leader:
+                await follower.aclose()
+
+
+async def benchmark(leader_url: str = 'redis://localhost:9851',
+                    follower_urls: Sequence[str] = (),
+                    levels: Sequence[int] = (1, 4, 16, 64, 256),
+                    queries: int = 5000, points: int = 100000,
+                    radius: float = 1000, key: str = 'bench:pool',
+                    seed: int = 42) -> Dict[int, float]:
+    """NEARBY queries/sec against the concurrency limit"""
+    ids, lats, lons = synthetic_points(points, seed=seed)
+    writer = BulkPositionWriter(leader_url, key, batch_size=5000)
+    await writer.redis.execute_command('DROP', key)
+    await writer.update(zip(ids, lats.tolist(), lons.tolist()))
+    await writer.close()
+
+    centers = list(zip(lats[:queries].tolist(), lons[:queries].tolist()))
+    results = {}
+    print(f"\n{'concurrency':<14}{'queries/sec':>14}{'errors':>8}")
+    for level in levels:
+        pool = Tile38Pool(leader_url, follower_urls,
+                          connections=min(level, 64), concurrency=level)
+        start = time.perf_counter()
+        replies = await pool.fan_out(
+            [('nearby', (key, lat, lon, radius, 100)) for lat, lon in centers])
+        qps = queries / (time.perf_counter() - start)
+        errors = sum(isinstance(reply, Exception) for reply in replies)
+        print(f"{level:<14}{qps:>14.0f}{errors:>8}")
+        results[level] = qps
+        await pool.close()
+
+    pool = Tile38Pool(leader_url, follower_urls)
+    start = time.perf_counter()
+    streamed = 0
+    async for page in pool.scan_pages(key, page_size=5000):
+        streamed += len(page)
+    print(f"SCAN by pages of 5000: {streamed} objects in "
+          f"{time.perf_counter() - start:.2f} s")
+    await pool.write('DROP', key)
+    await pool.close()
+    return results